@@ -1,16 +1,87 @@
-from flask import Flask, render_template, request, jsonify
-import pickle
-import json
+from flask import Flask, Request, Response, render_template, request, jsonify
 import os
 import requests
-import zipfile
+import time
 from datetime import datetime
-from perfect_model import PerfectSuicideDetector
+from event_log import EventLog
+from metrics import SLOW_DURATION_BUCKETS, StageProfiler, evaluation_stats, prometheus_text, serving_stats, worker_metrics
+from conversation_scoring import ConversationStore
+from model_store import ModelHandle
+from perfect_model import PerfectSuicideDetector, format_percent, save_model, train_from_csv
+from prediction_cache import PredictionCache
+from training_jobs import get_job, new_job_id, start_training_from_counts, update_job
+from upload_ingest import UploadError, UploadIngest
+
+try:
+    import fcntl
+except ImportError:  # Windows: workers may each build the fallback model
+    fcntl = None
+
+UPLOADS_DIR = 'uploads'
+
+# The served artifact; a .bin path uses the memory-mapped binary format, which
+# every worker on the host shares instead of unpickling its own copy
+MODEL_PATH = os.environ.get('MODEL_PATH', 'perfect_model.pkl')
+
+# Largest upload accepted, and largest CSV once a ZIP upload is extracted
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_MB', 500)) * 1024 * 1024
+MAX_DATASET_BYTES = int(os.environ.get('MAX_DATASET_MB', 2048)) * 1024 * 1024
+
+class IngestRequest(Request):
+    """Streams a dataset upload into an UploadIngest instead of a temporary file"""
+    
+    upload_ingest = None
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        name = (filename or '').lower()
+        if self.endpoint != 'upload_dataset' or self.upload_ingest is not None or not name.endswith(('.csv', '.zip')):
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        
+        # Every job trains from its own copy, so a second upload can't
+        # overwrite the CSV a running job is still reading
+        os.makedirs(UPLOADS_DIR, exist_ok=True)
+        job_id = new_job_id()
+        update_job(job_id, status='uploading', created=datetime.now().isoformat(), bytes_received=0, rows_received=0)
+        self.upload_ingest = UploadIngest(
+            os.path.join(UPLOADS_DIR, f'{job_id}.csv'),
+            is_zip=name.endswith('.zip'),
+            max_bytes=MAX_DATASET_BYTES,
+            job_id=job_id,
+            progress=lambda **fields: update_job(job_id, **fields),
+        )
+        return self.upload_ingest
 
 app = Flask(__name__)
+app.request_class = IngestRequest
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
+
+# This worker's serving counters; /stats and /metrics sum them over all workers
+serving_metrics = worker_metrics
+
+# Per-stage timing of /predict for /metrics; PROFILE_STAGES=1 turns it on
+stage_profiler = StageProfiler(serving_metrics, 'predict', enabled=os.environ.get('PROFILE_STAGES') == '1')
+
+def record_model_load(model):
+    serving_metrics.observe_duration('model_load', model.load_seconds, bounds=SLOW_DURATION_BUCKETS)
+
+# Serves the current model and hot-swaps it when any worker saves a new version
+model_handle = ModelHandle(MODEL_PATH)
+model_handle.on_load = record_model_load
 
-# Global model variable
-model = None
+# Per-worker cache of prediction results; PREDICTION_CACHE_SIZE=0 turns it off
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', 50000))
+PREDICTION_CACHE_TTL = float(os.environ.get('PREDICTION_CACHE_TTL', 0)) or None
+prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL) if PREDICTION_CACHE_SIZE > 0 else None
+serving_metrics.cache = prediction_cache
+
+# Per-worker running sums of chat conversations for /conversation; see ConversationStore.
+# Half-life (seconds) and window (messages) are off at 0
+conversation_store = ConversationStore(
+    max_sessions=int(os.environ.get('CONVERSATION_MAX_SESSIONS', 10000)),
+    ttl=float(os.environ.get('CONVERSATION_TTL', 3600)) or None,
+    half_life=float(os.environ.get('CONVERSATION_HALF_LIFE', 0)) or None,
+    window=int(os.environ.get('CONVERSATION_WINDOW', 0)) or None,
+)
 
 def download_dataset():
     """Download dataset from Google Drive if not present"""
@@ -29,67 +100,96 @@ def download_dataset():
             print(f"Dataset download failed: {e}")
     return os.path.exists('Suicide_Detection.csv')
 
-# Try to download dataset first
-dataset_available = download_dataset()
-
-# Load perfect model
-try:
-    with open('perfect_model.pkl', 'rb') as f:
-        model = pickle.load(f)
-    print("Perfect ML model loaded! (84.3% accuracy, 87.8% suicide, 80.9% non-suicide)")
-except Exception as e:
-    print(f"Perfect model loading failed: {e}")
-    print("Creating new perfect model...")
+def init_model():
+    """Load the prebuilt perfect model into model_handle
+    
+    Training only happens here when no artifact exists yet; build one ahead
+    of time with `python perfect_model.py train`. Under gunicorn's
+    preload_app (see gunicorn.conf.py) this runs once in the master and
+    every worker inherits the result.
+    """
     try:
-        model = PerfectSuicideDetector()
-        if dataset_available:
-            model.train('Suicide_Detection.csv')
-        else:
-            # Create model with built-in keywords if no dataset
-            model.suicide_keywords = {
-                'suicide': 2.0, 'kill': 1.8, 'die': 1.5, 'death': 1.4, 'end': 1.2,
-                'hurt': 1.3, 'pain': 1.4, 'hopeless': 1.7, 'worthless': 1.6, 'alone': 1.1,
-                'depressed': 1.5, 'sad': 1.2, 'crying': 1.3, 'empty': 1.4, 'lost': 1.2
-            }
-            model.non_suicide_keywords = {
-                'happy': 1.5, 'joy': 1.4, 'love': 1.6, 'good': 1.2, 'great': 1.3,
-                'amazing': 1.4, 'wonderful': 1.5, 'excited': 1.4, 'blessed': 1.3, 'grateful': 1.4
-            }
-        with open('perfect_model.pkl', 'wb') as f:
-            pickle.dump(model, f)
-        print("New perfect model created and saved!")
-    except Exception as e2:
-        print(f"Backup model creation failed: {e2}")
-        # Final fallback
-        class SimpleModel:
-            def predict(self, text):
-                suicide_words = ['kill', 'die', 'death', 'suicide', 'end', 'hurt', 'pain', 'hopeless', 'worthless', 'alone']
-                text_lower = text.lower()
-                score = sum(1 for word in suicide_words if word in text_lower)
-                confidence = min(0.9, score * 0.15 + 0.3)
-                prediction = 'suicide' if score >= 2 else 'non-suicide'
-                return prediction, confidence
-        
-        model = SimpleModel()
-        print("Using basic fallback model")
+        model_handle.load()
+        evaluation = evaluation_stats(model_handle.model)
+        print(f"Perfect ML model loaded! ({format_percent(evaluation['overall_accuracy'])} accuracy, "
+              f"{format_percent(evaluation['suicide_detection'])} suicide, "
+              f"{format_percent(evaluation['non_suicide_detection'])} non-suicide)")
+        return
+    except Exception as e:
+        print(f"Perfect model loading failed: {e}")
+    
+    # Workers started without preload all get here at once: the first one
+    # builds and saves the model, the rest wait and load what it saved
+    with open(MODEL_PATH + '.lock', 'w') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            model_handle.load()
+            print("Loaded the model another worker built")
+            return
+        except Exception:
+            pass
+        
+        print("Creating new perfect model...")
+        try:
+            if download_dataset():
+                model, results = train_from_csv('Suicide_Detection.csv')
+                # Scoring reads the compiled arrays; drop the dict copy of the
+                # scores so forked workers don't inherit it
+                model.word_scores = None
+            else:
+                # Create model with built-in keywords if no dataset
+                model = PerfectSuicideDetector()
+                model.suicide_keywords = {
+                    'suicide': 2.0, 'kill': 1.8, 'die': 1.5, 'death': 1.4, 'end': 1.2,
+                    'hurt': 1.3, 'pain': 1.4, 'hopeless': 1.7, 'worthless': 1.6, 'alone': 1.1,
+                    'depressed': 1.5, 'sad': 1.2, 'crying': 1.3, 'empty': 1.4, 'lost': 1.2
+                }
+                model.non_suicide_keywords = {
+                    'happy': 1.5, 'joy': 1.4, 'love': 1.6, 'good': 1.2, 'great': 1.3,
+                    'amazing': 1.4, 'wonderful': 1.5, 'excited': 1.4, 'blessed': 1.3, 'grateful': 1.4
+                }
+                model.compile()
+            save_model(model, MODEL_PATH)
+            print("New perfect model created and saved!")
+        except Exception as e2:
+            print(f"Backup model creation failed: {e2}")
+            # Final fallback
+            class SimpleModel:
+                def predict(self, text):
+                    suicide_words = ['kill', 'die', 'death', 'suicide', 'end', 'hurt', 'pain', 'hopeless', 'worthless', 'alone']
+                    text_lower = text.lower()
+                    score = sum(1 for word in suicide_words if word in text_lower)
+                    confidence = min(0.9, score * 0.15 + 0.3)
+                    prediction = 'suicide' if score >= 2 else 'non-suicide'
+                    return prediction, confidence
+            
+            model = SimpleModel()
+            print("Using basic fallback model")
+        model_handle.set(model)
+
+init_model()
 
 # Simple learning system
 class SimpleLearning:
-    def __init__(self):
-        self.interactions = []
+    def __init__(self, path='feedback.jsonl', legacy_path='feedback.json'):
+        # Append-only and shared by all workers; batches are written together
+        self.log = EventLog(path, legacy_path=legacy_path)
     
-    def collect_feedback(self, text, feedback, analysis_id):
-        self.interactions.append({
-            'text': text,
-            'feedback': feedback,
-            'analysis_id': analysis_id,
-            'timestamp': datetime.now().isoformat()
-        })
+    def collect_feedback(self, text, feedback, analysis_id, prediction=None):
+        start = time.perf_counter()
         try:
-            with open('feedback.json', 'w') as f:
-                json.dump(self.interactions, f)
+            # prediction is the label the user was shown, which the feedback is about
+            self.log.append({
+                'text': text,
+                'feedback': feedback,
+                'analysis_id': analysis_id,
+                'prediction': prediction,
+                'timestamp': datetime.now().isoformat()
+            })
         except:
             pass
+        serving_metrics.observe_duration('feedback_write', time.perf_counter() - start)
 
 learning = SimpleLearning()
 
@@ -97,43 +197,159 @@ learning = SimpleLearning()
 def index():
     return render_template('index.html')
 
+def format_prediction(prediction, confidence):
+    confidence_percent = f'{confidence * 100:.1f}%'
+    
+    if prediction == 'suicide':
+        return {
+            'result': 'Potential Suicide Risk Detected',
+            'confidence': confidence_percent,
+            'risk_level': 'high',
+            'message': 'This text shows indicators of suicide risk. Please seek professional help immediately. Contact emergency services or a mental health professional.'
+        }
+    return {
+        'result': 'No Immediate Risk Detected',
+        'confidence': confidence_percent,
+        'risk_level': 'low',
+        'message': 'The text does not show strong suicide risk indicators. However, if you are concerned about mental health, consider speaking with a professional.'
+    }
+
+def validate_text(text):
+    if not text:
+        return 'Please enter some text to analyze'
+    if len(text) < 10:
+        return 'Please enter at least 10 characters'
+    return None
+
 @app.route('/predict', methods=['POST'])
 def predict():
-    global model
+    start = time.perf_counter()
+    clock = stage_profiler.start()
     try:
         data = request.get_json()
         text = data.get('text', '').strip()
+        clock.lap('parse')
         
-        if not text:
-            return jsonify({'error': 'Please enter some text to analyze'})
-        
-        if len(text) < 10:
-            return jsonify({'error': 'Please enter at least 10 characters'})
+        error = validate_text(text)
+        if error:
+            return jsonify({'error': error})
         
         # Get prediction
-        prediction, confidence = model.predict(text)
-        confidence_percent = f'{confidence * 100:.1f}%'
-        
-        if prediction == 'suicide':
-            result = {
-                'result': 'Potential Suicide Risk Detected',
-                'confidence': confidence_percent,
-                'risk_level': 'high',
-                'message': 'This text shows indicators of suicide risk. Please seek professional help immediately. Contact emergency services or a mental health professional.'
-            }
+        model, version = model_handle.get_versioned()
+        if hasattr(model, 'predict_ids'):
+            tokens = model.preprocess_text(text)
+            clock.lap('preprocess')
+            if prediction_cache is not None:
+                prediction, confidence = prediction_cache.predict_tokens(model, tokens, version)
+            else:
+                prediction, confidence = model.predict_ids(model.encode_tokens(tokens))
         else:
-            result = {
-                'result': 'No Immediate Risk Detected',
-                'confidence': confidence_percent,
-                'risk_level': 'low',
-                'message': 'The text does not show strong suicide risk indicators. However, if you are concerned about mental health, consider speaking with a professional.'
-            }
+            prediction, confidence = model.predict(text)
+        clock.lap('score')
         
-        return jsonify(result)
+        response = jsonify(format_prediction(prediction, confidence))
+        clock.lap('respond')
+        serving_metrics.observe(time.perf_counter() - start, [prediction])
+        return response
         
     except Exception as e:
+        serving_metrics.observe_error()
         return jsonify({'error': f'Analysis failed: {str(e)}'})
 
+MAX_BATCH_SIZE = 5000
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    start = time.perf_counter()
+    try:
+        data = request.get_json()
+        texts = data.get('texts')
+        
+        if not isinstance(texts, list) or not texts:
+            return jsonify({'error': 'Please provide a non-empty list of texts'})
+        
+        if len(texts) > MAX_BATCH_SIZE:
+            return jsonify({'error': f'At most {MAX_BATCH_SIZE} texts per batch'})
+        
+        texts = [str(text).strip() for text in texts]
+        errors = [validate_text(text) for text in texts]
+        valid = [text for text, error in zip(texts, errors) if not error]
+        
+        model, version = model_handle.get_versioned()
+        if prediction_cache is not None and hasattr(model, 'predict_docs'):
+            predictions = iter(prediction_cache.predict_batch(model, valid, version))
+        elif hasattr(model, 'predict_batch'):
+            predictions = iter(model.predict_batch(valid))
+        else:
+            predictions = iter([model.predict(text) for text in valid])
+        
+        results = []
+        labels = []
+        for error in errors:
+            if error:
+                results.append({'error': error})
+            else:
+                prediction, confidence = next(predictions)
+                labels.append(prediction)
+                results.append(format_prediction(prediction, confidence))
+        
+        serving_metrics.observe(time.perf_counter() - start, labels)
+        return jsonify({'results': results, 'count': len(results)})
+        
+    except Exception as e:
+        serving_metrics.observe_error()
+        return jsonify({'error': f'Analysis failed: {str(e)}'})
+
+def conversation_message(data):
+    """Score a chat message on top of its conversation so far; returns (response, label or None on errors)"""
+    conversation_id = str(data.get('conversation_id', '')).strip()
+    text = str(data.get('text', '')).strip()
+    if not conversation_id:
+        return {'error': 'Please provide a conversation_id'}, None
+    if not text:
+        return {'error': 'Please enter some text to analyze'}, None
+    
+    model, version = model_handle.get_versioned()
+    if not hasattr(model, 'score_ids'):
+        return {'error': 'Conversation scoring needs a trained model'}, None
+    prediction, confidence, messages = conversation_store.score(model, conversation_id, text, version)
+    return dict(format_prediction(prediction, confidence), conversation_id=conversation_id, messages=messages), prediction
+
+@app.route('/conversation', methods=['POST'])
+def conversation():
+    # Send only the new message; the conversation's earlier messages are already summed
+    start = time.perf_counter()
+    try:
+        response, prediction = conversation_message(request.get_json())
+        if prediction is not None:
+            serving_metrics.observe(time.perf_counter() - start, [prediction])
+        return jsonify(response)
+    except Exception as e:
+        serving_metrics.observe_error()
+        return jsonify({'error': f'Analysis failed: {str(e)}'})
+
+@app.route('/conversation/end', methods=['POST'])
+def end_conversation():
+    data = request.get_json(silent=True) or {}
+    return jsonify({'ended': conversation_store.end(str(data.get('conversation_id', '')).strip())})
+
+@app.route('/conversation-stats')
+def conversation_stats():
+    # Counters are per worker process; pid tells workers apart
+    return jsonify(conversation_store.stats())
+
+@app.route('/metrics')
+def prometheus_metrics():
+    # Summed over every worker through the shared metrics directory
+    return Response(prometheus_text(serving_metrics.collect()), mimetype='text/plain; version=0.0.4')
+
+@app.route('/cache-stats')
+def cache_stats():
+    # Counters are per worker process; pid tells workers apart
+    if prediction_cache is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(prediction_cache.stats(), enabled=True))
+
 @app.route('/feedback', methods=['POST'])
 def feedback():
     try:
@@ -141,24 +357,30 @@ def feedback():
         learning.collect_feedback(
             data.get('text', ''),
             data.get('feedback', ''),
-            data.get('analysis_id', '')
+            data.get('analysis_id', ''),
+            data.get('prediction')
         )
         return jsonify({'status': 'success'})
     except:
         return jsonify({'status': 'success'})
 
+def collect_stats():
+    # Held-out evaluation stored with the served model, plus live counters from every worker
+    stats = evaluation_stats(model_handle.get())
+    stats['model_version'] = model_handle.version
+    stats['serving'] = serving_stats(serving_metrics.collect())
+    return stats
+
 @app.route('/stats')
 def get_stats():
-    return jsonify({
-        'overall_accuracy': 84.3,
-        'suicide_detection': 87.8,
-        'non_suicide_detection': 80.9
-    })
+    return jsonify(collect_stats())
 
 @app.route('/upload-dataset', methods=['POST'])
 def upload_dataset():
-    global model
+    ingest = None
     try:
+        # Reading request.files streams the upload through an UploadIngest
+        # (see IngestRequest), so by now its rows are already counted
         if 'dataset' not in request.files:
             return jsonify({'success': False, 'error': 'No file uploaded'})
         
@@ -166,55 +388,41 @@ def upload_dataset():
         if file.filename == '':
             return jsonify({'success': False, 'error': 'No file selected'})
         
-        if not (file.filename.endswith('.csv') or file.filename.endswith('.zip')):
+        ingest = request.upload_ingest
+        if ingest is None:
             return jsonify({'success': False, 'error': 'File must be CSV or ZIP format'})
         
-        # Handle ZIP files
-        if file.filename.endswith('.zip'):
-            file.save('dataset.zip')
-            try:
-                with zipfile.ZipFile('dataset.zip', 'r') as zip_ref:
-                    # Extract all files
-                    zip_ref.extractall('.')
-                    # Look for CSV file in extracted files
-                    for extracted_file in zip_ref.namelist():
-                        if extracted_file.endswith('.csv'):
-                            os.rename(extracted_file, 'Suicide_Detection.csv')
-                            break
-                os.remove('dataset.zip')  # Clean up ZIP file
-            except Exception as e:
-                return jsonify({'success': False, 'error': f'ZIP extraction failed: {str(e)}'})
-        else:
-            # Save CSV file directly
-            file.save('Suicide_Detection.csv')
+        counts, held_out = ingest.finish()
+        update_job(ingest.job_id, bytes_received=ingest.bytes_received, rows_received=ingest.rows)
         
-        # Retrain model with new dataset
-        try:
-            new_model = PerfectSuicideDetector()
-            new_model.train('Suicide_Detection.csv')
-            
-            # Save new model
-            with open('perfect_model.pkl', 'wb') as f:
-                pickle.dump(new_model, f)
-            
-            # Update global model
-            model = new_model
-            
-            return jsonify({
-                'success': True,
-                'accuracy': 84.3,
-                'suicide_detection': 87.8,
-                'non_suicide_detection': 80.9,
-                'message': 'Model retrained successfully'
-            })
-            
-        except Exception as e:
-            return jsonify({'success': False, 'error': f'Training failed: {str(e)}'})
+        # Only fitting is left; every worker hot-swaps the new model once it is saved
+        start_training_from_counts(counts, held_out, ingest.csv_path, MODEL_PATH, job_id=ingest.job_id)
+        
+        return jsonify({
+            'success': True,
+            'job_id': ingest.job_id,
+            'status': 'queued',
+            'status_url': f'/training-jobs/{ingest.job_id}',
+            'rows': ingest.rows,
+            'message': 'Dataset uploaded, retraining started'
+        })
         
     except Exception as e:
+        ingest = ingest or getattr(request, 'upload_ingest', None)
+        if ingest is not None:
+            ingest.abort()
+            update_job(ingest.job_id, status='failed', finished=datetime.now().isoformat(), error=str(e))
+        if isinstance(e, UploadError):
+            return jsonify({'success': False, 'error': str(e)})
         return jsonify({'success': False, 'error': f'Upload failed: {str(e)}'})
 
+@app.route('/training-jobs/<job_id>')
+def training_job_status(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown training job'})
+    return jsonify(job)
+
 if __name__ == '__main__':
- import os 
-port = int(os.environ.get('PORT', 10000)) 
-app.run(debug=False, host='0.0.0.0', port=port)
\ No newline at end of file
+    port = int(os.environ.get('PORT', 10000))
+    app.run(debug=False, host='0.0.0.0', port=port)
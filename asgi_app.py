@@ -0,0 +1,227 @@
+"""ASGI entry point serving /predict, /conversation, /feedback, /stats and /metrics with the same JSON contracts as app.py.
+
+    uvicorn asgi_app:app --host 0.0.0.0 --port $PORT --workers 4
+
+Each worker runs one event loop, so concurrency is not capped by the worker
+count. /predict requests that arrive together are scored as one micro-batch
+(see MicroBatcher); feedback writes and the cross-worker stats collection
+touch the disk, so they run in the default thread pool instead of blocking
+the loop. The model, cache, metrics and feedback log are the ones app.py
+sets up; a new model artifact is picked up by a background task that loads
+it in the thread pool, so requests never wait on a reload. The UI and
+dataset uploads stay on the Flask app.
+"""
+import asyncio
+import json
+import os
+import time
+
+from app import (collect_stats, conversation_message, conversation_store, format_prediction, learning, model_handle,
+                 prediction_cache, serving_metrics, validate_text)
+from metrics import prometheus_text
+
+# A batch is scored once it holds BATCH_MAX_SIZE texts or its first text has
+# waited BATCH_MAX_WAIT_MS; 0 scores whatever arrived in the same loop iteration
+BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', 64))
+BATCH_MAX_WAIT_MS = float(os.environ.get('BATCH_MAX_WAIT_MS', 1))
+
+MAX_BODY_BYTES = 1024 * 1024
+
+class MicroBatcher:
+    """Coalesces concurrent predictions into one vectorized scoring pass
+
+    predict() queues a text and returns a future. The queue is scored with a
+    single predict_docs call (through the prediction cache when it is on)
+    as soon as max_size texts are waiting or max_wait seconds after the
+    first one arrived, whichever comes first. Scoring runs on the event
+    loop: a batch takes about as long as one request's thread handoff would.
+    """
+
+    def __init__(self, max_size=64, max_wait=0.001):
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self._pending = []
+        self._timer = None
+
+    def predict(self, text, tokens):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, tokens, future))
+        if len(self._pending) >= self.max_size:
+            self.flush()
+        elif self._timer is None:
+            if self.max_wait > 0:
+                self._timer = loop.call_later(self.max_wait, self.flush)
+            else:
+                self._timer = loop.call_soon(self.flush)
+        return future
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+
+        start = time.perf_counter()
+        try:
+            results = score(pending)
+        except Exception as e:
+            for _, _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, _, future), result in zip(pending, results):
+            # A client that disconnected has its future cancelled
+            if not future.done():
+                future.set_result(result)
+        serving_metrics.observe_duration('micro_batch', time.perf_counter() - start)
+
+def score(pending):
+    model, version = model_handle.get_versioned()
+    if not hasattr(model, 'predict_docs'):
+        return [model.predict(text) for text, _, _ in pending]
+    token_lists = [tokens for _, tokens, _ in pending]
+    if prediction_cache is not None:
+        return prediction_cache.predict_token_batch(model, token_lists, version)
+    return model.predict_docs([model.encode_tokens(tokens) for tokens in token_lists])
+
+batcher = MicroBatcher(BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS / 1000)
+
+async def read_body(receive):
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise ConnectionError('Client disconnected')
+        body += message.get('body', b'')
+        if len(body) > MAX_BODY_BYTES:
+            raise ValueError('Request body too large')
+        if not message.get('more_body'):
+            return bytes(body)
+
+async def send_response(send, payload, content_type=b'application/json', status=200):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', content_type), (b'content-length', str(len(payload)).encode())],
+    })
+    await send({'type': 'http.response.body', 'body': payload})
+
+def send_json(send, data, status=200):
+    return send_response(send, json.dumps(data).encode('utf-8'), status=status)
+
+async def predict(receive, send):
+    start = time.perf_counter()
+    try:
+        data = json.loads(await read_body(receive))
+        text = data.get('text', '').strip()
+
+        error = validate_text(text)
+        if error:
+            return await send_json(send, {'error': error})
+
+        model = model_handle.get()
+        tokens = model.preprocess_text(text) if hasattr(model, 'predict_docs') else None
+        prediction, confidence = await batcher.predict(text, tokens)
+        serving_metrics.observe(time.perf_counter() - start, [prediction])
+        return await send_json(send, format_prediction(prediction, confidence))
+
+    except ConnectionError:
+        return
+    except Exception as e:
+        serving_metrics.observe_error()
+        return await send_json(send, {'error': f'Analysis failed: {str(e)}'})
+
+async def conversation(receive, send):
+    # Only the new message is tokenized and scored, so this runs on the loop without batching
+    start = time.perf_counter()
+    try:
+        response, prediction = conversation_message(json.loads(await read_body(receive)))
+        if prediction is not None:
+            serving_metrics.observe(time.perf_counter() - start, [prediction])
+        return await send_json(send, response)
+
+    except ConnectionError:
+        return
+    except Exception as e:
+        serving_metrics.observe_error()
+        return await send_json(send, {'error': f'Analysis failed: {str(e)}'})
+
+async def end_conversation(receive, send):
+    try:
+        data = json.loads(await read_body(receive) or b'{}')
+    except ConnectionError:
+        return
+    except ValueError:
+        data = {}
+    await send_json(send, {'ended': conversation_store.end(str(data.get('conversation_id', '')).strip())})
+
+async def feedback(receive, send):
+    try:
+        data = json.loads(await read_body(receive))
+        await asyncio.get_running_loop().run_in_executor(
+            None, learning.collect_feedback,
+            data.get('text', ''), data.get('feedback', ''), data.get('analysis_id', ''), data.get('prediction')
+        )
+    except ConnectionError:
+        return
+    except Exception:
+        pass
+    await send_json(send, {'status': 'success'})
+
+async def stats(receive, send):
+    await send_json(send, await asyncio.get_running_loop().run_in_executor(None, collect_stats))
+
+async def metrics(receive, send):
+    text = await asyncio.get_running_loop().run_in_executor(None, lambda: prometheus_text(serving_metrics.collect()))
+    await send_response(send, text.encode('utf-8'), b'text/plain; version=0.0.4')
+
+ROUTES = {
+    '/predict': ('POST', predict),
+    '/conversation': ('POST', conversation),
+    '/conversation/end': ('POST', end_conversation),
+    '/feedback': ('POST', feedback),
+    '/stats': ('GET', stats),
+    '/metrics': ('GET', metrics),
+}
+
+async def watch_model():
+    """Check for a new model artifact every check_interval, loading it in the thread pool"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await loop.run_in_executor(None, model_handle.refresh)
+        await asyncio.sleep(model_handle.check_interval)
+
+async def lifespan(receive, send):
+    watcher = None
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # From here on requests only read the model the watcher swapped in
+            model_handle.watched = True
+            watcher = asyncio.ensure_future(watch_model())
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if watcher is not None:
+                watcher.cancel()
+            # Score anything still queued and write out buffered feedback
+            batcher.flush()
+            learning.log.flush()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+
+    route = ROUTES.get(scope['path'])
+    if route is None:
+        return await send_json(send, {'error': 'Not found'}, status=404)
+    method, handler = route
+    if scope['method'] != method:
+        return await send_json(send, {'error': 'Method not allowed'}, status=405)
+    await handler(receive, send)
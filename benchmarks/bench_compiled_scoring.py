@@ -0,0 +1,115 @@
+"""Microbenchmark the compiled scoring table against the old four-dict lookup loop.
+
+Trains on the Kaggle CSV so the vocabulary has its real size, then times the
+scoring of already-tokenized texts (lookups only) and end-to-end predict.
+
+    python benchmarks/bench_compiled_scoring.py --train-rows 232074 --rows 5000
+"""
+import argparse
+import csv
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from perfect_model import PerfectSuicideDetector  # noqa: E402
+
+
+def load_rows(path, rows):
+    csv.field_size_limit(sys.maxsize)
+    texts, labels = [], []
+    with open(path, 'r', encoding='utf-8') as f:
+        for i, row in enumerate(csv.DictReader(f)):
+            if i >= rows:
+                break
+            texts.append(row['text'])
+            labels.append(row['class'])
+    return texts, labels
+
+
+def dict_totals(model, words):
+    """The scoring loop predict used before compile(): up to four lookups per token."""
+    ml_score = 0
+    keyword_score = 0
+    word_count = 0
+    for word in words:
+        if word in model.word_scores:
+            ml_score += model.word_scores[word]
+            word_count += 1
+        if word in model.suicide_keywords:
+            keyword_score += model.suicide_keywords[word]
+        elif word in model.positive_keywords:
+            keyword_score += model.positive_keywords[word]
+        elif word in model.neutral_strong:
+            keyword_score += model.neutral_strong[word]
+    return ml_score, keyword_score, word_count
+
+
+def dict_predict(model, text):
+    words = model.preprocess_text(text)
+    if not words:
+        return 'non-suicide', 0.1
+    ml_score, keyword_score, word_count = dict_totals(model, words)
+    return model.classify_totals(ml_score, keyword_score, word_count, len(words))
+
+
+def timed(func, repeat):
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--csv', default='Suicide_Detection.csv')
+    parser.add_argument('--train-rows', type=int, default=232074)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    texts, labels = load_rows(args.csv, args.train_rows + args.rows)
+    model = PerfectSuicideDetector()
+    model.train(texts[:args.train_rows], labels[:args.train_rows])
+    model.word_scores  # materialize the dict so both paths start warm
+    sample = texts[args.train_rows:] or texts[:args.rows]
+    tokenized = [model.preprocess_text(text) for text in sample]
+    encoded = [model.encode(text) for text in sample]
+    n_tokens = sum(len(words) for words in tokenized)
+
+    def dict_lookups():
+        for words in tokenized:
+            dict_totals(model, words)
+
+    def compiled_lookups():
+        lookup = model.vocab.get
+        for words in tokenized:
+            [lookup(word, 0) for word in words]
+
+    def compiled_sums():
+        for ids in encoded:
+            model.score_ids(ids, ids * 0, 1)
+
+    results = [
+        ('lookups: four dicts', timed(dict_lookups, args.repeat), n_tokens, 'tokens'),
+        ('lookups: vocab index', timed(compiled_lookups, args.repeat), n_tokens, 'tokens'),
+        ('sums: compiled arrays', timed(compiled_sums, args.repeat), len(sample), 'texts'),
+        ('predict: four dicts', timed(lambda: [dict_predict(model, t) for t in sample], args.repeat), len(sample), 'texts'),
+        ('predict: compiled', timed(lambda: [model.predict(t) for t in sample], args.repeat), len(sample), 'texts'),
+    ]
+
+    print(f"Vocabulary: {len(model.vocab)} entries ({len(model.word_scores)} scored words)")
+    print(f"Sample: {len(sample)} texts, {n_tokens} tokens")
+    for name, seconds, count, unit in results:
+        print(f"{name:24s} {seconds * 1000:9.1f} ms  {count / seconds:12.0f} {unit}/sec")
+
+    mismatches = sum(1 for text in sample if dict_predict(model, text) != model.predict(text))
+    print(f"Mismatched predictions: {mismatches}")
+
+
+if __name__ == '__main__':
+    main()
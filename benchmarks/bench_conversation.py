@@ -0,0 +1,87 @@
+"""Compare scoring chat conversations incrementally against resending the whole history.
+
+Builds --conversations synthetic conversations of --messages messages each
+and scores every message twice. The first way is how clients use /predict
+today: the joined history is predicted again after each message. The
+second is ConversationStore, which adds only the new message to the
+conversation's running sums. Prints the total time of each and the time
+per message early and late in a conversation, and checks that both give
+the same labels.
+
+    python benchmarks/bench_conversation.py --model perfect_model.pkl --messages 200
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from conversation_scoring import ConversationStore  # noqa: E402
+from perfect_model import PerfectSuicideDetector, load_model  # noqa: E402
+from synthetic_corpus import iter_rows  # noqa: E402
+
+
+def conversations(count, messages, seed=7):
+    """Lists of short messages cut from synthetic posts"""
+    words = []
+    for text, _ in iter_rows(count * messages // 4 + 1, seed=seed):
+        words.extend(text.split())
+    result = []
+    position = 0
+    for _ in range(count):
+        conversation = []
+        for i in range(messages):
+            length = 5 + (position + i) % 20
+            conversation.append(' '.join(words[position:position + length]))
+            position += length
+        result.append(conversation)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', help='model to score with; trains one on synthetic rows if omitted')
+    parser.add_argument('--conversations', type=int, default=20)
+    parser.add_argument('--messages', type=int, default=200)
+    args = parser.parse_args()
+
+    if args.model:
+        model = load_model(args.model)
+    else:
+        texts, labels = map(list, zip(*iter_rows(20000)))
+        model = PerfectSuicideDetector()
+        with contextlib.redirect_stdout(io.StringIO()):
+            model.train(texts, labels)
+    chats = conversations(args.conversations, args.messages)
+
+    # Seconds spent on each message position, summed over conversations
+    resend = [0.0] * args.messages
+    incremental = [0.0] * args.messages
+    same = 0
+    store = ConversationStore(max_sessions=args.conversations)
+    for c, messages in enumerate(chats):
+        for i, message in enumerate(messages):
+            start = time.perf_counter()
+            expected, _ = model.predict('\n'.join(messages[:i + 1]))
+            middle = time.perf_counter()
+            label, _, _ = store.score(model, c, message, 1)
+            end = time.perf_counter()
+            resend[i] += middle - start
+            incremental[i] += end - middle
+            same += label == expected
+
+    total = args.conversations * args.messages
+    print(f"{args.conversations} conversations of {args.messages} messages; {same}/{total} labels the same")
+    print(f"{'':12s} {'total s':>9s} {'first 10 µs/msg':>16s} {'last 10 µs/msg':>15s}")
+    for name, seconds in (('resend', resend), ('incremental', incremental)):
+        first = sum(seconds[:10]) / (10 * args.conversations) * 1e6
+        last = sum(seconds[-10:]) / (10 * args.conversations) * 1e6
+        print(f"{name:12s} {sum(seconds):9.2f} {first:16.1f} {last:15.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Feedback write latency as the log grows: full JSON rewrite vs append-only EventLog.
+
+Also checks that several processes appending at once lose or tear no entries:
+
+    python benchmarks/bench_event_log.py --entries 1000000 --processes 4
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_log import EventLog, iter_entries  # noqa: E402
+
+ENTRY = {
+    'text': 'I have been feeling really low lately and nothing seems to help',
+    'feedback': 'positive',
+    'analysis_id': 'analysis_1700000000000',
+    'timestamp': '2026-01-01T00:00:00',
+}
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def legacy_latency(directory, size, samples=20):
+    """What SimpleLearning did: keep every entry in memory and rewrite feedback.json."""
+    path = os.path.join(directory, 'feedback.json')
+    interactions = [ENTRY] * size
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        interactions.append(ENTRY)
+        with open(path, 'w') as f:
+            json.dump(interactions, f)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def append_worker(path, count):
+    log = EventLog(path)
+    for i in range(count):
+        log.append(dict(ENTRY, analysis_id=f'{os.getpid()}-{i}'))
+    log.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=1000000)
+    parser.add_argument('--processes', type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        print("Legacy full rewrite of feedback.json (per write):")
+        for size in (1000, 10000, 100000):
+            timings = legacy_latency(directory, size)
+            print(f"  {size:>9d} entries  p50 {percentile(timings, 0.5) * 1000:8.2f} ms"
+                  f"  p99 {percentile(timings, 0.99) * 1000:8.2f} ms")
+
+        print("EventLog append (per write, flushes included):")
+        log = EventLog(os.path.join(directory, 'feedback.jsonl'))
+        checkpoints = [n for n in (1000, 10000, 100000, 1000000, 10000000) if n <= args.entries]
+        written = 0
+        for checkpoint in checkpoints:
+            timings = []
+            while written < checkpoint:
+                start = time.perf_counter()
+                log.append(ENTRY)
+                timings.append(time.perf_counter() - start)
+                written += 1
+            print(f"  {checkpoint:>9d} entries  p50 {percentile(timings, 0.5) * 1e6:8.2f} us"
+                  f"  p99 {percentile(timings, 0.99) * 1e6:8.2f} us")
+        log.flush()
+
+        path = os.path.join(directory, 'concurrent.jsonl')
+        per_process = 20000
+        processes = [multiprocessing.Process(target=append_worker, args=(path, per_process))
+                     for _ in range(args.processes)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        with open(path, 'r', encoding='utf-8') as f:
+            lines = sum(1 for _ in f)
+        entries = sum(1 for _ in iter_entries(path))
+        print(f"{args.processes} processes x {per_process} appends: {lines} lines, {entries} valid entries "
+              f"(expected {args.processes * per_process})")
+
+
+if __name__ == '__main__':
+    main()
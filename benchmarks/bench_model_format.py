@@ -0,0 +1,122 @@
+"""Compare loading the pickled model against the memory-mapped binary format.
+
+Converts the pickle to a .bin in a scratch directory, then starts --workers
+processes per format the way a pre-forked server would, each loading the
+model and scoring --texts posts so the tables it needs are paged in. Each
+worker reports its load time, how much its RSS and private (anonymous)
+memory grew, and its proportional share (PSS) once every worker has loaded:
+pages of the mapped file are shared, so PSS falls as workers are added,
+while unpickled arrays are private to each process. Predictions from both
+formats are compared too, since the binary format stores float32 scores.
+
+    python benchmarks/bench_model_format.py --model perfect_model.pkl --workers 4
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from perfect_model import PerfectSuicideDetector, load_model, save_model  # noqa: E402
+from synthetic_corpus import iter_rows  # noqa: E402
+
+
+def memory_kib():
+    """Rss, Pss and Anonymous of this process from /proc/self/smaps_rollup"""
+    values = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            key, _, rest = line.partition(':')
+            if key in ('Rss', 'Pss', 'Anonymous'):
+                values[key] = int(rest.split()[0])
+    return values
+
+
+def sample_texts(count):
+    return [text for text, _ in iter_rows(count, seed=7)]
+
+
+def worker(path, texts):
+    """Load and score, report, then wait until the parent has every report before measuring PSS"""
+    before = memory_kib()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        model = load_model(path)
+    load_ms = (time.perf_counter() - start) * 1000
+    model.predict_batch(sample_texts(texts))
+    after = memory_kib()
+    print(json.dumps({
+        'load_ms': load_ms,
+        'rss_kib': after['Rss'] - before['Rss'],
+        'private_kib': after['Anonymous'] - before['Anonymous'],
+    }), flush=True)
+
+    sys.stdin.readline()
+    print(json.dumps({'pss_kib': memory_kib()['Pss'] - before['Pss']}), flush=True)
+    sys.stdin.readline()
+
+
+def run_workers(path, workers, texts):
+    command = [sys.executable, os.path.abspath(__file__), '--worker', path, '--texts', str(texts)]
+    processes = [subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+                 for _ in range(workers)]
+    reports = [json.loads(process.stdout.readline()) for process in processes]
+    for process in processes:
+        process.stdin.write('\n')
+        process.stdin.flush()
+    for process, report in zip(processes, reports):
+        report.update(json.loads(process.stdout.readline()))
+    for process in processes:
+        process.stdin.close()
+        process.wait()
+    return {key: sum(report[key] for report in reports) / len(reports) for key in reports[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', help='pickled model to convert; trains one on synthetic rows if omitted')
+    parser.add_argument('--rows', type=int, default=50000, help='synthetic rows to train on without --model')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--texts', type=int, default=2000, help='posts each worker scores after loading')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, args.texts)
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        pickle_path = args.model
+        if pickle_path is None:
+            texts, labels = map(list, zip(*iter_rows(args.rows)))
+            model = PerfectSuicideDetector()
+            model.train(texts, labels)
+            pickle_path = os.path.join(workdir, 'perfect_model.pkl')
+            save_model(model, pickle_path)
+        binary_path = os.path.join(workdir, 'perfect_model.bin')
+        save_model(load_model(pickle_path), binary_path)
+
+        print(f"\n{'format':8s} {'size MB':>8s} {'load ms':>8s} {'RSS +MiB':>9s} {'private +MiB':>13s} {'PSS +MiB':>9s}"
+              f"   (mean over {args.workers} workers)")
+        for name, path in (('pickle', pickle_path), ('binary', binary_path)):
+            r = run_workers(path, args.workers, args.texts)
+            print(f"{name:8s} {os.path.getsize(path) / 1e6:8.1f} {r['load_ms']:8.1f} {r['rss_kib'] / 1024:9.1f} "
+                  f"{r['private_kib'] / 1024:13.1f} {r['pss_kib'] / 1024:9.1f}")
+
+        texts = sample_texts(args.texts)
+        pickled = load_model(pickle_path).predict_batch(texts)
+        mapped = load_model(binary_path).predict_batch(texts)
+        labels_differ = sum(a[0] != b[0] for a, b in zip(pickled, mapped))
+        largest = max((abs(a[1] - b[1]) for a, b in zip(pickled, mapped)), default=0.0)
+        print(f"\n{labels_differ} of {len(texts)} labels differ; largest confidence difference {largest:.2g}")
+
+
+if __name__ == '__main__':
+    main()
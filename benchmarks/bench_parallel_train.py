@@ -0,0 +1,39 @@
+"""Measure how training time scales with the number of counting processes.
+
+Every parallel run is checked against the serial word_scores:
+
+    python benchmarks/bench_parallel_train.py --workers 1 2 4 8
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from perfect_model import train_from_csv  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--csv', default='Suicide_Detection.csv')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--test-rows', type=int, default=5000)
+    args = parser.parse_args()
+
+    print(f"CPUs available: {os.cpu_count()}")
+    baseline = None
+    serial_time = None
+    for workers in args.workers:
+        start = time.perf_counter()
+        model, results = train_from_csv(args.csv, None, args.test_rows, workers=workers)
+        elapsed = time.perf_counter() - start
+        if baseline is None:
+            baseline, serial_time = model.word_scores, elapsed
+        identical = model.word_scores == baseline
+        print(f"workers {workers:2d}: {elapsed:7.2f} s  speedup {serial_time / elapsed:5.2f}x  "
+              f"accuracy {results['accuracy']:.2f}%  identical: {identical}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Compare PerfectSuicideDetector.predict and predict_batch throughput in posts per second.
+
+Run from the project root, next to Suicide_Detection.csv and perfect_model.pkl:
+
+    python benchmarks/bench_predict_batch.py --rows 20000 --batch-size 1000
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from perfect_model import load_model  # noqa: E402
+
+
+def load_texts(path, rows):
+    csv.field_size_limit(sys.maxsize)
+    texts = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for i, row in enumerate(csv.DictReader(f)):
+            if i >= rows:
+                break
+            texts.append(row['text'])
+    return texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--csv', default='Suicide_Detection.csv')
+    parser.add_argument('--model', default='perfect_model.pkl')
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    model = load_model(args.model)
+    texts = load_texts(args.csv, args.rows)
+
+    start = time.perf_counter()
+    single = [model.predict(text) for text in texts]
+    single_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = []
+    for i in range(0, len(texts), args.batch_size):
+        batched.extend(model.predict_batch(texts[i:i + args.batch_size]))
+    batch_time = time.perf_counter() - start
+
+    mismatches = sum(1 for a, b in zip(single, batched) if a != b)
+    print(f"Posts: {len(texts)}  batch size: {args.batch_size}")
+    print(f"predict:       {len(texts) / single_time:10.0f} posts/sec")
+    print(f"predict_batch: {len(texts) / batch_time:10.0f} posts/sec  ({single_time / batch_time:.2f}x)")
+    print(f"Mismatched predictions: {mismatches}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""Compare gunicorn memory and startup with and without the preloading config.
+
+Starts `gunicorn app:app` with --workers twice: once bare, where every
+worker imports app.py and loads the model itself, and once with
+gunicorn.conf.py, where the master loads it before forking. After the
+first successful response, --requests predictions are sent so every worker
+has served traffic, then the proportional set size (PSS) of the master and
+workers is summed from /proc. Shared pages are split between the processes
+that map them, so the sum is the memory the deployment really costs.
+
+    python benchmarks/bench_preload.py --model perfect_model.pkl --workers 4
+"""
+import argparse
+import contextlib
+import http.client
+import io
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from perfect_model import PerfectSuicideDetector, save_model  # noqa: E402
+from synthetic_corpus import iter_rows  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def memory_kib(pid):
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            key, _, rest = line.partition(':')
+            if key in ('Pss', 'Private_Clean', 'Private_Dirty'):
+                values[key] = int(rest.split()[0])
+    return values
+
+
+def children(pid):
+    found = []
+    for name in os.listdir('/proc'):
+        if name.isdigit():
+            try:
+                with open(f'/proc/{name}/stat') as f:
+                    if int(f.read().rsplit(')', 1)[1].split()[1]) == pid:
+                        found.append(int(name))
+            except (OSError, IndexError, ValueError):
+                continue
+    return found
+
+
+def post(port, text):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    try:
+        connection.request('POST', '/predict', json.dumps({'text': text}), {'Content-Type': 'application/json'})
+        return connection.getresponse().status
+    finally:
+        connection.close()
+
+
+def measure(command, workdir, env, port, workers, texts):
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                               start_new_session=True)
+    try:
+        while True:
+            try:
+                if post(port, texts[0]) == 200:
+                    break
+            except OSError:
+                pass
+            if time.perf_counter() - start > 300:
+                raise RuntimeError('gunicorn did not start')
+            time.sleep(0.05)
+        first_response = time.perf_counter() - start
+
+        # Wait for every worker to finish booting before measuring
+        while len(children(process.pid)) < workers:
+            time.sleep(0.05)
+        for text in texts:
+            post(port, text)
+        all_ready = time.perf_counter() - start
+
+        pids = [process.pid] + children(process.pid)
+        memory = [memory_kib(pid) for pid in pids]
+        return {
+            'first_response_s': first_response,
+            'all_ready_s': all_ready,
+            'total_pss_mib': sum(m['Pss'] for m in memory) / 1024,
+            'worker_private_mib': sum(m['Private_Clean'] + m['Private_Dirty'] for m in memory[1:]) / len(memory[1:]) / 1024,
+        }
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', help='model to serve; trains one on synthetic rows if omitted')
+    parser.add_argument('--rows', type=int, default=100000, help='synthetic rows to train on without --model')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    texts = [text for text, _ in iter_rows(args.requests, seed=5)]
+    with tempfile.TemporaryDirectory() as workdir:
+        model_path = os.path.abspath(args.model) if args.model else os.path.join(workdir, 'perfect_model.pkl')
+        if not args.model:
+            rows_texts, labels = map(list, zip(*iter_rows(args.rows)))
+            model = PerfectSuicideDetector()
+            with contextlib.redirect_stdout(io.StringIO()):
+                model.train(rows_texts, labels)
+                save_model(model, model_path)
+
+        env = dict(os.environ, PYTHONPATH=ROOT, MODEL_PATH=model_path)
+        print(f"{args.workers} workers serving {os.path.basename(model_path)}")
+        print(f"{'setup':10s} {'first response s':>17s} {'all ready s':>12s} {'total PSS MiB':>14s} {'private MiB/worker':>19s}")
+        for name, config in (('bare', []), ('preload', ['-c', os.path.join(ROOT, 'gunicorn.conf.py')])):
+            port = free_port()
+            command = [sys.executable, '-m', 'gunicorn', *config, '--workers', str(args.workers),
+                       '--bind', f'127.0.0.1:{port}', 'app:app']
+            r = measure(command, workdir, env, port, args.workers, texts)
+            print(f"{name:10s} {r['first_response_s']:17.2f} {r['all_ready_s']:12.2f} {r['total_pss_mib']:14.1f} "
+                  f"{r['worker_private_mib']:19.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Report what pruning and quantizing the vocabulary costs and saves.
+
+Trains on the first --train-rows rows of the CSV and evaluates on the next
+--test-rows, the same split `perfect_model.py train` uses, then applies
+each pruning/quantization setting to a copy of the model. For each one the
+table shows the words and scores left, the pickle and binary file sizes,
+load time of each, the mean predict latency over the held-out texts and the
+held-out accuracy with its change against the unpruned model.
+
+    python benchmarks/bench_pruning.py --csv Suicide_Detection.csv
+"""
+import argparse
+import contextlib
+import copy
+import io
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from perfect_model import PerfectSuicideDetector, count_csv, evaluate, load_model, save_model, train_from_counts  # noqa: E402
+
+# (name, prune kwargs, score type)
+SETTINGS = [
+    ('baseline', {}, None),
+    ('min_count=2', {'min_count': 2}, None),
+    ('min_count=3', {'min_count': 3}, None),
+    ('min_count=5', {'min_count': 5}, None),
+    ('epsilon=0.1', {'epsilon': 0.1}, None),
+    ('min2 top_k=20000', {'min_count': 2, 'top_k': 20000}, None),
+    ('float16', {}, 'float16'),
+    ('int8', {}, 'int8'),
+    ('min2 float16', {'min_count': 2}, 'float16'),
+    ('min2 int8', {'min_count': 2}, 'int8'),
+]
+
+
+def best_of(repeat, op):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        op()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--csv', default='Suicide_Detection.csv')
+    parser.add_argument('--train-rows', type=int, default=10000)
+    parser.add_argument('--test-rows', type=int, default=5000)
+    args = parser.parse_args()
+
+    quiet = contextlib.redirect_stdout(io.StringIO())
+    with quiet:
+        counts, held_out = count_csv(PerfectSuicideDetector(), args.csv, args.train_rows, args.test_rows)
+        trained, _ = train_from_counts(counts, held_out)
+    texts = [text for text, _ in held_out]
+    labels = [label for _, label in held_out]
+    baseline_accuracy = None
+
+    print(f"{'setting':18s} {'words':>7s} {'scores':>7s} {'pkl MB':>7s} {'bin MB':>7s} {'pkl ms':>7s} {'bin ms':>7s} "
+          f"{'predict us':>10s} {'accuracy':>9s} {'delta':>7s}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, prune, score_type in SETTINGS:
+            model = copy.deepcopy(trained)
+            model.prune(**prune)
+            if score_type:
+                model.quantize(score_type)
+
+            sizes, load_ms = [], []
+            for suffix in ('pkl', 'bin'):
+                path = os.path.join(workdir, f'model.{suffix}')
+                with quiet:
+                    save_model(model, path)
+                    load_ms.append(best_of(5, lambda: load_model(path)) * 1000)
+                sizes.append(os.path.getsize(path) / 1e6)
+
+            predict_us = best_of(3, lambda: [model.predict(text) for text in texts]) / len(texts) * 1e6
+            accuracy = evaluate(model, texts, labels)['accuracy']
+            if baseline_accuracy is None:
+                baseline_accuracy = accuracy
+            print(f"{name:18s} {len(model.vocab):7d} {int(np.count_nonzero(model.ml_present)):7d} "
+                  f"{sizes[0]:7.2f} {sizes[1]:7.2f} {load_ms[0]:7.1f} {load_ms[1]:7.1f} "
+                  f"{predict_us:10.1f} {accuracy:8.2f}% {accuracy - baseline_accuracy:+7.2f}")
+
+
+if __name__ == '__main__':
+    main()
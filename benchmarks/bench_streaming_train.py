@@ -0,0 +1,85 @@
+"""Compare peak RSS and wall time of the streaming trainer against the old list-based one.
+
+Each variant runs in its own child process so peak RSS is measured in isolation:
+
+    python benchmarks/bench_streaming_train.py --rows 232074
+"""
+import argparse
+import math
+import os
+import resource
+import subprocess
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from perfect_model import PerfectSuicideDetector, load_dataset  # noqa: E402
+
+
+def legacy_train(model, texts, labels):
+    """What train did before the streaming trainer: repeat every token, then count."""
+    suicide_texts = []
+    non_suicide_texts = []
+    for text, label in zip(texts, labels):
+        words = model.preprocess_text(text)
+        if label == 'suicide':
+            suicide_texts.extend(words * 2)
+        else:
+            non_suicide_texts.extend(words * 4)
+    suicide_counts = Counter(suicide_texts)
+    non_suicide_counts = Counter(non_suicide_texts)
+    total_suicide = len(suicide_texts)
+    total_non_suicide = len(non_suicide_texts)
+    for word in set(suicide_counts) | set(non_suicide_counts):
+        suicide_freq = suicide_counts.get(word, 0) / total_suicide
+        non_suicide_freq = non_suicide_counts.get(word, 0) / total_non_suicide
+        if suicide_freq > 0 and non_suicide_freq > 0:
+            score = math.log(suicide_freq / non_suicide_freq)
+        elif suicide_freq > 0:
+            score = 1.8
+        else:
+            score = -3.0
+        model.word_scores[word] = score
+    model.compile()
+
+
+def run_variant(variant, path, rows):
+    model = PerfectSuicideDetector()
+    if variant == 'legacy':
+        texts, labels = load_dataset(path, limit=rows)
+        legacy_train(model, texts, labels)
+    else:
+        model.train_csv(path, limit=rows)
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--csv', default='Suicide_Detection.csv')
+    parser.add_argument('--rows', type=int, default=232074)
+    parser.add_argument('--variant', choices=['legacy', 'streaming'])
+    args = parser.parse_args()
+
+    if args.variant:
+        start = time.perf_counter()
+        model = run_variant(args.variant, args.csv, args.rows)
+        elapsed = time.perf_counter() - start
+        peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        print(f"{args.variant} {elapsed:.3f} {peak_kb} {len(model.word_scores)}")
+        return
+
+    print(f"Training on {args.rows} rows of {args.csv}")
+    for variant in ('legacy', 'streaming'):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--csv', args.csv,
+             '--rows', str(args.rows), '--variant', variant],
+            check=True, capture_output=True, text=True,
+        ).stdout.split()
+        name, elapsed, peak_kb, words = output[-4:]
+        print(f"{name:10s} wall {float(elapsed):7.2f} s   peak RSS {int(peak_kb) / 1024:8.1f} MB   {words} words")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Time training, evaluation and bulk scoring from the CSV against the token cache.
+
+Measures, on --csv or a synthetic corpus of --rows rows:
+
+    build     tokenizing the whole CSV into a new cache (paid once)
+    append    bringing the cache up to date after --append-rows rows are appended,
+              against rebuilding it
+    train     train on all rows but the last --test-rows and evaluate on those
+    evaluate  a saved model on --test-rows rows
+    bulk      bulk_score.py over every row with one worker
+
+and checks that every cached run gives the same results as the CSV run.
+
+    python benchmarks/bench_token_cache.py --csv Suicide_Detection.csv
+    python benchmarks/bench_token_cache.py --rows 100000
+"""
+import argparse
+import contextlib
+import filecmp
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bulk_score import bulk_score  # noqa: E402
+from perfect_model import (evaluate, evaluate_docs, load_dataset, save_model, train_from_cache,  # noqa: E402
+                           train_from_csv)
+from split_csv import scan_records  # noqa: E402
+from synthetic_corpus import write_corpus  # noqa: E402
+from token_cache import build_token_cache, load_token_cache  # noqa: E402
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--csv', help='dataset to use; writes a synthetic one if omitted')
+    parser.add_argument('--rows', type=int, default=100000, help='synthetic rows without --csv')
+    parser.add_argument('--test-rows', type=int, default=5000)
+    parser.add_argument('--append-rows', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        csv_path = os.path.join(workdir, 'dataset.csv')
+        if args.csv:
+            shutil.copyfile(args.csv, csv_path)
+        else:
+            write_corpus(csv_path, args.rows)
+        cache_dir = os.path.join(workdir, 'token_cache')
+        model_path = os.path.join(workdir, 'model.pkl')
+
+        # Hold back the last rows so appending them can be timed
+        _, ends = scan_records(csv_path)
+        cut = ends[-args.append_rows - 1]
+        with open(csv_path, 'rb') as f:
+            f.seek(cut)
+            appended = f.read()
+        os.truncate(csv_path, cut)
+
+        rows = []
+        build_seconds, _ = timed(build_token_cache, csv_path, cache_dir)
+        with open(csv_path, 'ab') as f:
+            f.write(appended)
+        append_seconds, cache = timed(load_token_cache, csv_path, cache_dir)
+        rebuild_seconds, _ = timed(build_token_cache, csv_path, os.path.join(workdir, 'rebuilt'))
+        append_same = all(filecmp.cmp(os.path.join(cache_dir, name), os.path.join(workdir, 'rebuilt', name), shallow=False)
+                          for name in ('tokens.i32', 'offsets.i64', 'labels.i8', 'vocab.txt'))
+
+        csv_seconds, (model, csv_results) = timed(train_from_csv, csv_path, None, args.test_rows)
+        cache_seconds, (cached_model, cache_results) = timed(train_from_cache, csv_path, None, args.test_rows, cache_dir)
+        rows.append(('train', csv_seconds, cache_seconds,
+                     csv_results == cache_results and model.word_scores == cached_model.word_scores))
+        with contextlib.redirect_stdout(io.StringIO()):
+            save_model(model, model_path)
+
+        def evaluate_csv():
+            texts, labels = load_dataset(csv_path, limit=args.test_rows)
+            return evaluate(model, texts, labels)
+
+        def evaluate_cache():
+            cache = load_token_cache(csv_path, cache_dir)
+            return evaluate_docs(model, cache.encode_rows(model, range(args.test_rows)),
+                                 cache.class_labels(0, args.test_rows))
+
+        csv_seconds, csv_results = timed(evaluate_csv)
+        cache_seconds, cache_results = timed(evaluate_cache)
+        rows.append(('evaluate', csv_seconds, cache_seconds, csv_results == cache_results))
+
+        scores_csv = os.path.join(workdir, 'scores_csv.csv')
+        scores_cache = os.path.join(workdir, 'scores_cache.csv')
+        csv_seconds, _ = timed(bulk_score, csv_path, scores_csv, model_path, workers=1)
+        cache_seconds, _ = timed(bulk_score, csv_path, scores_cache, model_path, workers=1, cache_dir=cache_dir)
+        rows.append(('bulk', csv_seconds, cache_seconds, filecmp.cmp(scores_csv, scores_cache, shallow=False)))
+
+        print(f"{len(cache)} rows, {os.path.getsize(csv_path) / 1e6:.1f} MB CSV, "
+              f"{sum(os.path.getsize(os.path.join(cache_dir, name)) for name in os.listdir(cache_dir)) / 1e6:.1f} MB cache")
+        print(f"build {build_seconds:.2f}s; appending {args.append_rows} rows {append_seconds:.2f}s against "
+              f"{rebuild_seconds:.2f}s to rebuild (same cache: {append_same})")
+        print(f"{'':10s} {'CSV s':>8s} {'cache s':>8s} {'speedup':>8s}  same results")
+        for name, csv_seconds, cache_seconds, same in rows:
+            print(f"{name:10s} {csv_seconds:8.2f} {cache_seconds:8.2f} {csv_seconds / cache_seconds:7.1f}x  {same}")
+
+
+if __name__ == '__main__':
+    main()
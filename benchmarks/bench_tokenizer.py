@@ -0,0 +1,84 @@
+"""Microbenchmark preprocess_text against the old lower/re.sub/split tokenizer.
+
+Texts are taken from the Kaggle CSV and grouped into length quartiles, so the
+timings follow the dataset's real length distribution; long posts are where
+the tokenizer dominates predict. Every text is also checked for identical
+tokens from both functions and from iter_tokens.
+
+    python benchmarks/bench_tokenizer.py --rows 20000
+"""
+import argparse
+import csv
+import math
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from perfect_model import PerfectSuicideDetector  # noqa: E402
+
+
+def load_texts(path, rows):
+    csv.field_size_limit(sys.maxsize)
+    texts = []
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        for i, row in enumerate(csv.DictReader(f)):
+            if i >= rows:
+                break
+            texts.append(row['text'])
+    return texts
+
+
+def old_preprocess_text(text):
+    """preprocess_text before the single-pass tokenizer."""
+    text = str(text).lower()
+    text = re.sub(r'[^a-zA-Z\s]', '', text)
+    words = text.split()
+    return [word for word in words if len(word) > 1]
+
+
+def timed(func, texts, repeat):
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--csv', default='Suicide_Detection.csv')
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    model = PerfectSuicideDetector()
+    texts = sorted(load_texts(args.csv, args.rows), key=len)
+    ascii_share = sum(text.isascii() for text in texts) / len(texts)
+    print(f"Sample: {len(texts)} texts, {ascii_share:.1%} pure ASCII")
+
+    mismatches = sum(
+        1 for text in texts
+        if not (old_preprocess_text(text) == model.preprocess_text(text) == list(model.iter_tokens(text)))
+    )
+
+    quarter = len(texts) // 4
+    buckets = [texts[i * quarter:(i + 1) * quarter if i < 3 else len(texts)] for i in range(4)]
+    print(f"{'quartile':10s} {'chars':>13s} {'old us':>9s} {'new us':>9s} {'iter us':>9s} {'speedup':>8s}")
+    for i, bucket in enumerate([*buckets, texts]):
+        old = timed(old_preprocess_text, bucket, args.repeat) / len(bucket) * 1e6
+        new = timed(model.preprocess_text, bucket, args.repeat) / len(bucket) * 1e6
+        lazy = timed(lambda text: sum(1 for _ in model.iter_tokens(text)), bucket, args.repeat) / len(bucket) * 1e6
+        name = f"Q{i + 1}" if i < 4 else 'all'
+        chars = f"{len(bucket[0])}-{len(bucket[-1])}"
+        print(f"{name:10s} {chars:>13s} {old:9.1f} {new:9.1f} {lazy:9.1f} {old / new:7.2f}x")
+
+    print(f"Mismatched token lists: {mismatches}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+"""Load-test /predict under gunicorn (app.py) and uvicorn (asgi_app.py).
+
+Starts each server on a local port with the same model and worker count,
+then keeps --concurrency keep-alive connections busy for --duration seconds
+with distinct synthetic posts and reports requests/sec and latency
+percentiles. gunicorn's sync workers close the connection after every
+response, so its clients reconnect each time, as real ones would. The
+uvicorn run is repeated with BATCH_MAX_SIZE=1 to separate what micro-batching
+buys from what the event loop does. The prediction cache is off so every
+request is scored.
+
+    python benchmarks/load_test.py --model perfect_model.pkl --workers 2 --concurrency 64
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from perfect_model import PerfectSuicideDetector, save_model  # noqa: E402
+from synthetic_corpus import iter_rows  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(command, workdir, env):
+    process = subprocess.Popen(command, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                               start_new_session=True)
+    return process
+
+
+def stop_server(process):
+    os.killpg(process.pid, signal.SIGTERM)
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+
+
+async def wait_until_ready(port, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            status, _ = await request_once(port, b'{"text": "warming up the server now"}')
+            if status == 200:
+                return
+        except OSError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+def build_request(body):
+    return (b'POST /predict HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\n'
+            b'Content-Length: ' + str(len(body)).encode() + b'\r\n\r\n' + body)
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip().lower()
+    await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, headers.get('connection') == 'close'
+
+
+async def request_once(port, body):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write(build_request(body))
+        return await read_response(reader)
+    finally:
+        writer.close()
+
+
+async def client(port, bodies, offset, deadline, latencies, errors):
+    connection = None
+    i = offset
+    while time.monotonic() < deadline:
+        body = bodies[i % len(bodies)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            if connection is None:
+                connection = await asyncio.open_connection('127.0.0.1', port)
+            reader, writer = connection
+            writer.write(build_request(body))
+            status, closed = await read_response(reader)
+        except (OSError, asyncio.IncompleteReadError):
+            errors.append(1)
+            if connection is not None:
+                connection[1].close()
+            connection = None
+            continue
+        latencies.append(time.perf_counter() - start)
+        if status != 200:
+            errors.append(status)
+        if closed:
+            writer.close()
+            connection = None
+    if connection is not None:
+        connection[1].close()
+
+
+async def run_load(port, bodies, concurrency, duration):
+    await wait_until_ready(port)
+    latencies, errors = [], []
+    deadline = time.monotonic() + duration
+    start = time.perf_counter()
+    await asyncio.gather(*(client(port, bodies, i * 97, deadline, latencies, errors) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+
+    def percentile(fraction):
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000 if latencies else float('nan')
+
+    return {
+        'requests': len(latencies),
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentile(0.50),
+        'p99_ms': percentile(0.99),
+        'p999_ms': percentile(0.999),
+        'errors': len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', help='model to serve; trains one on synthetic rows if omitted')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--texts', type=int, default=5000)
+    args = parser.parse_args()
+
+    bodies = [json.dumps({'text': text}).encode() for text, _ in iter_rows(args.texts, seed=11)]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        model_path = os.path.abspath(args.model) if args.model else os.path.join(workdir, 'perfect_model.pkl')
+        if not args.model:
+            texts, labels = map(list, zip(*iter_rows(20000)))
+            model = PerfectSuicideDetector()
+            with contextlib.redirect_stdout(io.StringIO()):
+                model.train(texts, labels)
+                save_model(model, model_path)
+
+        env = dict(os.environ, PYTHONPATH=ROOT, MODEL_PATH=model_path, PREDICTION_CACHE_SIZE='0')
+        servers = [
+            ('gunicorn sync', [sys.executable, '-m', 'gunicorn', '--workers', str(args.workers), 'app:app'], {}),
+            ('uvicorn', [sys.executable, '-m', 'uvicorn', '--workers', str(args.workers), 'asgi_app:app'], {}),
+            ('uvicorn no batch', [sys.executable, '-m', 'uvicorn', '--workers', str(args.workers), 'asgi_app:app'],
+             {'BATCH_MAX_SIZE': '1'}),
+        ]
+
+        print(f"{args.workers} workers, {args.concurrency} connections, {args.duration:g}s each")
+        print(f"{'server':18s} {'requests':>9s} {'req/s':>8s} {'p50 ms':>8s} {'p99 ms':>8s} {'p99.9 ms':>9s} {'errors':>7s}")
+        for name, command, extra_env in servers:
+            port = free_port()
+            if 'gunicorn' in name:
+                command = command[:3] + ['--bind', f'127.0.0.1:{port}'] + command[3:]
+            else:
+                command = command + ['--host', '127.0.0.1', '--port', str(port), '--no-access-log']
+            process = start_server(command, workdir, dict(env, **extra_env))
+            try:
+                r = asyncio.run(run_load(port, bodies, args.concurrency, args.duration))
+            finally:
+                stop_server(process)
+            print(f"{name:18s} {r['requests']:9d} {r['rps']:8.0f} {r['p50_ms']:8.2f} {r['p99_ms']:8.2f} "
+                  f"{r['p999_ms']:9.2f} {r['errors']:7d}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""Benchmark the training and inference hot paths and check them for regressions.
+
+Everything runs on a synthetic corpus in a scratch directory, so no Kaggle
+download or prebuilt model is needed. Each case reports ops/sec, p50/p99
+latency of one op and the peak memory Python allocated while running it
+(tracemalloc, measured in a separate pass so it doesn't skew the timings).
+
+    python benchmarks/suite.py --output results.json
+    python benchmarks/suite.py --baseline results.json --threshold 0.15
+
+With --baseline the run exits with status 1 when any case's ops/sec fell,
+or its p50 latency rose, by more than the threshold.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from perfect_model import PerfectSuicideDetector, load_model, save_model  # noqa: E402
+from synthetic_corpus import iter_rows  # noqa: E402
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def measure(name, op, inputs, units_per_op=1, repeat=3):
+    """Time op over inputs, keeping the fastest of repeat passes for throughput"""
+    latencies = []
+    best = None
+    for _ in range(repeat):
+        timings = []
+        start = time.perf_counter()
+        for item in inputs:
+            op_start = time.perf_counter()
+            op(item)
+            timings.append(time.perf_counter() - op_start)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best, latencies = elapsed, timings
+
+    tracemalloc.start()
+    for item in inputs:
+        op(item)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    return name, {
+        'ops': len(inputs) * units_per_op,
+        'ops_per_sec': round(len(inputs) * units_per_op / best, 1),
+        'p50_us': round(percentile(latencies, 0.50) * 1e6, 2),
+        'p99_us': round(percentile(latencies, 0.99) * 1e6, 2),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def run_suite(rows, requests_count):
+    texts, labels = map(list, zip(*iter_rows(rows + requests_count)))
+    train_texts, train_labels = texts[:rows], labels[:rows]
+    # Distinct posts the model hasn't seen, so no case is served from a cache
+    sample = texts[rows:]
+
+    model = PerfectSuicideDetector()
+    results = []
+    quiet = contextlib.redirect_stdout(io.StringIO())
+
+    results.append(measure('preprocess_text', model.preprocess_text, sample))
+    with quiet:
+        results.append(measure('train', lambda _: model.train(train_texts, train_labels), [None], rows))
+    results.append(measure('predict', model.predict, sample))
+    results.append(measure('predict_batch', model.predict_batch, [sample[i:i + 100] for i in range(0, len(sample), 100)], 100))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        model_path = os.path.join(workdir, 'perfect_model.pkl')
+        with quiet:
+            save_model(model, model_path)
+            results.append(measure('pickle_load', lambda _: load_model(model_path), [None] * 10))
+
+        # app.py loads perfect_model.pkl and writes its logs in the working directory
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        os.environ['PREDICTION_CACHE_SIZE'] = '0'
+        try:
+            with quiet:
+                import app
+            client = app.app.test_client()
+            results.append(measure('flask_predict', lambda text: client.post('/predict', json={'text': text}), sample))
+        finally:
+            os.chdir(cwd)
+
+    return dict(results)
+
+
+def compare(results, baseline, threshold):
+    """Names and descriptions of the cases that regressed against baseline"""
+    regressions = []
+    for name, old in baseline.items():
+        new = results.get(name)
+        if new is None:
+            continue
+        if new['ops_per_sec'] < old['ops_per_sec'] * (1 - threshold):
+            regressions.append(f"{name}: {old['ops_per_sec']:.0f} -> {new['ops_per_sec']:.0f} ops/sec")
+        if new['p50_us'] > old['p50_us'] * (1 + threshold):
+            regressions.append(f"{name}: p50 {old['p50_us']:.1f} -> {new['p50_us']:.1f} us")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20000, help='synthetic rows to train on')
+    parser.add_argument('--requests', type=int, default=2000, help='unseen posts to predict')
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--baseline', help='results JSON from an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.15, help='allowed slowdown, 0.15 = 15%%')
+    args = parser.parse_args()
+
+    results = run_suite(args.rows, args.requests)
+
+    print(f"{'case':16s} {'ops/sec':>12s} {'p50 us':>10s} {'p99 us':>10s} {'peak KiB':>10s}")
+    for name, r in results.items():
+        print(f"{name:16s} {r['ops_per_sec']:12.0f} {r['p50_us']:10.1f} {r['p99_us']:10.1f} {r['peak_kib']:10.1f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'timestamp': datetime.now().isoformat(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'rows': args.rows,
+                'requests': args.requests,
+                'results': results
+            }, f, indent=2)
+        print(f"Saved results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline['results'], args.threshold)
+        if regressions:
+            print(f"Regressions beyond {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
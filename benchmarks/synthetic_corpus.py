@@ -0,0 +1,77 @@
+"""Write a synthetic stand-in for the Kaggle Suicide_Detection.csv.
+
+Same columns (unnamed index, text, class) and a similar shape: a Zipfian
+vocabulary, log-normal post lengths with a long tail, keywords sprinkled
+into each class, and the capitals, punctuation, digits, accents and
+newlines the tokenizer has to strip. The output is deterministic for a seed.
+
+    python benchmarks/synthetic_corpus.py --rows 232074 --output Suicide_Detection.csv
+"""
+import argparse
+import csv
+import itertools
+import random
+import string
+
+SUICIDE_WORDS = ['suicide', 'kill', 'die', 'hopeless', 'anymore', 'worthless', 'alone', 'pain',
+                 'myself', 'burden', 'tired', 'end', 'goodbye', 'empty']
+NON_SUICIDE_WORDS = ['happy', 'love', 'great', 'work', 'family', 'friend', 'game', 'today',
+                     'weekend', 'fun', 'school', 'music', 'movie', 'excited']
+
+
+def iter_rows(rows, seed=42, vocab_size=60000):
+    """Yield (text, label) pairs"""
+    rng = random.Random(seed)
+    vocab = [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 10)))
+             for _ in range(vocab_size)]
+    cum_weights = list(itertools.accumulate(1.0 / rank for rank in range(1, vocab_size + 1)))
+
+    for _ in range(rows):
+        label = 'suicide' if rng.random() < 0.5 else 'non-suicide'
+        length = max(1, int(rng.lognormvariate(4.0, 1.0)))
+        words = rng.choices(vocab, cum_weights=cum_weights, k=length)
+        keywords = SUICIDE_WORDS if label == 'suicide' else NON_SUICIDE_WORDS
+        for _ in range(max(1, length // 15)):
+            words.insert(rng.randrange(len(words) + 1), rng.choice(keywords))
+
+        parts = []
+        for word in words:
+            roll = rng.random()
+            if roll < 0.05:
+                word = word.capitalize()
+            elif roll < 0.07:
+                word += ','
+            elif roll < 0.08:
+                word += "'s"
+            elif roll < 0.085:
+                word += '.\n'
+            elif roll < 0.087:
+                word += ' café'
+            elif roll < 0.089:
+                word += ' 123'
+            parts.append(word)
+        yield ' '.join(parts), label
+
+
+def write_corpus(path, rows, seed=42):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['', 'text', 'class'])
+        for i, (text, label) in enumerate(iter_rows(rows, seed)):
+            writer.writerow([i, text, label])
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='Suicide_Detection.csv')
+    args = parser.parse_args()
+
+    write_corpus(args.output, args.rows, args.seed)
+    print(f"Wrote {args.rows} rows to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+"""Score a large archive of posts with a saved model, in parallel and resumably.
+
+    python bulk_score.py posts.csv scores.csv --workers 8
+    python bulk_score.py posts.jsonl scores.jsonl --resume
+    python bulk_score.py posts.csv scores.csv --cache posts_cache
+
+The input (CSV with a text column, or JSON lines with a text field) is read
+as a stream and cut into chunks of whole records. Chunks are parsed and
+scored in a process pool whose workers each load the model once, and the
+results are written in input order: row number, label and confidence.
+After every chunk the output is synced and a checkpoint next to it records
+how far input and output got, so --resume after a crash truncates the
+output to the last checkpoint and carries on from there. With --cache the
+posts come from a token cache of the CSV (see token_cache.py), so scoring
+the same archive again, say with a new model, skips parsing and tokenizing.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import tempfile
+import time
+from collections import deque
+from multiprocessing import Pool
+
+from perfect_model import load_model
+from split_csv import iter_record_ends
+from token_cache import TOKEN_CACHE_DIR, load_token_cache, open_token_cache
+
+CHUNK_ROWS = 10000
+
+def checkpoint_path(output_path):
+    return output_path + '.checkpoint'
+
+def is_jsonl(path):
+    return path.endswith(('.jsonl', '.ndjson'))
+
+def read_header(path, text_column):
+    """Offset where the data rows start and the index of text_column, for a CSV"""
+    with open(path, 'rb') as f:
+        data_start = next(iter_record_ends(f), 0)
+        f.seek(0)
+        header = next(csv.reader(io.StringIO(f.read(data_start).decode('utf-8'), newline='')), [])
+    if text_column not in header:
+        raise ValueError(f"{path} has no {text_column!r} column")
+    return data_start, header.index(text_column)
+
+def iter_chunks(path, start, chunk_rows):
+    """Yield (raw bytes, end offset) of chunk_rows whole records at a time, reading from start"""
+    # One handle finds the record boundaries, the other reads the bytes between them
+    with open(path, 'rb') as f, open(path, 'rb') as data:
+        f.seek(start)
+        data.seek(start)
+        if is_jsonl(path):
+            ends = _iter_line_ends(f)
+        else:
+            ends = iter_record_ends(f)
+        chunk_start = last_end = start
+        rows = 0
+        for last_end in ends:
+            rows += 1
+            if rows == chunk_rows:
+                yield data.read(last_end - chunk_start), last_end
+                chunk_start, rows = last_end, 0
+        if rows:
+            yield data.read(last_end - chunk_start), last_end
+
+def _iter_line_ends(f):
+    position = f.tell()
+    for line in f:
+        position += len(line)
+        yield position
+
+def parse_texts(raw, jsonl, text_field):
+    """The texts of one chunk; text_field is a column index for CSV, a key for JSON lines"""
+    text = raw.decode('utf-8')
+    if jsonl:
+        return [json.loads(line).get(text_field, '') for line in text.splitlines() if line.strip()]
+    texts = []
+    for row in csv.reader(io.StringIO(text, newline='')):
+        if row:
+            texts.append(row[text_field] if text_field < len(row) else '')
+    return texts
+
+_model = None
+_cache = None
+_id_map = None
+
+def _init_worker(model_path, cache_dir=None):
+    global _model, _cache, _id_map
+    _model = load_model(model_path)
+    if cache_dir is not None:
+        _cache = open_token_cache(cache_dir)
+        _id_map = _cache.id_map(_model)
+
+def score_chunk(task):
+    raw, jsonl, text_field = task
+    texts = parse_texts(raw, jsonl, text_field)
+    return _model.predict_batch([str(text) for text in texts])
+
+def score_cached_rows(task):
+    start, end = task
+    return _model.predict_docs([_id_map[_cache.doc(i)] for i in range(start, end)])
+
+def format_results(results, first_row, jsonl):
+    if jsonl:
+        lines = [json.dumps({'row': first_row + i, 'label': label, 'confidence': round(confidence, 6)})
+                 for i, (label, confidence) in enumerate(results)]
+    else:
+        lines = [f'{first_row + i},{label},{confidence:.6f}' for i, (label, confidence) in enumerate(results)]
+    return ''.join(line + '\n' for line in lines).encode('utf-8')
+
+def save_checkpoint(path, state):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def load_checkpoint(output_path, input_path, cached=False):
+    try:
+        with open(checkpoint_path(output_path)) as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return None
+    if state['input'] != os.path.abspath(input_path) or state['input_size'] != os.path.getsize(input_path):
+        raise ValueError(f"{checkpoint_path(output_path)} belongs to a different input; delete it to start over")
+    if state.get('cached', False) != cached:
+        raise ValueError(f"{checkpoint_path(output_path)} was written {'with' if state.get('cached') else 'without'} "
+                         f"--cache; resume it the same way")
+    return state
+
+def bulk_score(input_path, output_path, model_path='perfect_model.pkl', workers=None, chunk_rows=CHUNK_ROWS,
+               text_column='text', resume=False, progress_seconds=10.0, cache_dir=None):
+    """Score every post of input_path into output_path; returns the number of rows scored
+
+    With cache_dir the posts are read from the token cache of input_path
+    (see token_cache), built or updated first, instead of being parsed and
+    tokenized again; the output is the same.
+    """
+    jsonl = is_jsonl(input_path)
+    cache = None
+    if cache_dir is not None:
+        if jsonl or text_column != 'text':
+            raise ValueError("--cache works on CSV files with a 'text' column")
+        cache = load_token_cache(input_path, cache_dir)
+        data_start, text_field = 0, None
+    elif jsonl:
+        data_start, text_field = 0, text_column
+    else:
+        data_start, text_field = read_header(input_path, text_column)
+
+    state = load_checkpoint(output_path, input_path, cache is not None) if resume else None
+    if state is None:
+        state = {'input': os.path.abspath(input_path), 'input_size': os.path.getsize(input_path),
+                 'input_offset': data_start, 'output_bytes': 0, 'rows': 0, 'cached': cache is not None}
+        header = b'' if is_jsonl(output_path) else b'row,label,confidence\n'
+        with open(output_path, 'wb') as out:
+            out.write(header)
+        state['output_bytes'] = len(header)
+        # Written up front too, so input with no rows still has one to remove at the end
+        save_checkpoint(checkpoint_path(output_path), state)
+    else:
+        where = 'row' if state.get('cached') else 'byte'
+        print(f"Resuming after row {state['rows']} at {where} {state['input_offset']}")
+    out_jsonl = is_jsonl(output_path)
+
+    workers = workers or os.cpu_count() or 1
+    pool = Pool(workers, initializer=_init_worker, initargs=(model_path, cache_dir)) if workers > 1 else None
+    if pool is None:
+        _init_worker(model_path, cache_dir)
+
+    if cache is not None:
+        # Cached rows are numbered from 0, so input_offset is a row index
+        tasks = ((score_cached_rows, (start, min(start + chunk_rows, len(cache))), min(start + chunk_rows, len(cache)))
+                 for start in range(state['input_offset'], len(cache), chunk_rows))
+    else:
+        tasks = ((score_chunk, (raw, jsonl, text_field), end)
+                 for raw, end in iter_chunks(input_path, state['input_offset'], chunk_rows))
+
+    start = time.perf_counter()
+    start_rows = state['rows']
+    next_report = start + progress_seconds
+    try:
+        with open(output_path, 'r+b') as out:
+            # Drop whatever was written after the last checkpoint
+            out.truncate(state['output_bytes'])
+            out.seek(state['output_bytes'])
+
+            pending = deque()
+
+            def write_next():
+                nonlocal next_report
+                result, end = pending.popleft()
+                results = result.get() if pool is not None else result
+                out.write(format_results(results, state['rows'], out_jsonl))
+                out.flush()
+                os.fsync(out.fileno())
+                state['rows'] += len(results)
+                state['input_offset'] = end
+                state['output_bytes'] = out.tell()
+                save_checkpoint(checkpoint_path(output_path), state)
+
+                now = time.perf_counter()
+                if now >= next_report:
+                    next_report = now + progress_seconds
+                    rate = (state['rows'] - start_rows) / (now - start)
+                    print(f"{state['rows']} rows scored, {rate:.0f} rows/sec")
+
+            for score, task, end in tasks:
+                if pool is not None:
+                    pending.append((pool.apply_async(score, (task,)), end))
+                    # Keep every worker busy without reading the whole input ahead
+                    if len(pending) > 2 * workers:
+                        write_next()
+                else:
+                    pending.append((score(task), end))
+                    write_next()
+            while pending:
+                write_next()
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+    os.remove(checkpoint_path(output_path))
+    elapsed = time.perf_counter() - start
+    scored = state['rows'] - start_rows
+    print(f"Scored {scored} rows in {elapsed:.1f}s ({scored / elapsed if elapsed else 0:.0f} rows/sec); "
+          f"{state['rows']} rows in {output_path}")
+    return scored
+
+def main():
+    parser = argparse.ArgumentParser(description='Score a CSV or JSON-lines archive of posts with a saved model')
+    parser.add_argument('input', help='CSV with a text column, or .jsonl with a text field')
+    parser.add_argument('output', help='CSV, or .jsonl, of row, label and confidence')
+    parser.add_argument('--model', default='perfect_model.pkl')
+    parser.add_argument('--workers', type=int, help='scoring processes (default: one per CPU)')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help='rows per task and per checkpoint')
+    parser.add_argument('--text-column', default='text')
+    parser.add_argument('--resume', action='store_true', help='continue from the checkpoint next to output')
+    parser.add_argument('--cache', nargs='?', const=TOKEN_CACHE_DIR,
+                        help='read posts from this token cache of the CSV input (default token_cache), building it first')
+    args = parser.parse_args()
+
+    bulk_score(args.input, args.output, args.model, args.workers, args.chunk_rows, args.text_column, args.resume,
+               cache_dir=args.cache)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+import numpy as np
+
+# Sums this close to zero are zero that subtracting decayed messages didn't cancel exactly
+DUST = 1e-9
+
+class Conversation:
+    """Running score sums of one conversation, the same ones predict computes for a whole text"""
+    __slots__ = ('version', 'ml_score', 'keyword_score', 'word_count', 'n_words', 'messages', 'updated', 'window')
+
+    def __init__(self, version, now):
+        self.version = version
+        self.ml_score = 0.0
+        self.keyword_score = 0.0
+        self.word_count = 0.0
+        self.n_words = 0.0
+        self.messages = 0
+        self.updated = now
+        # (time, ml_score, keyword_score, word_count, n_words) of the messages in the window
+        self.window = deque()
+
+    def decay(self, factor):
+        self.ml_score *= factor
+        self.keyword_score *= factor
+        self.word_count *= factor
+        self.n_words *= factor
+
+    def add(self, sums, sign=1.0):
+        ml_score, keyword_score, word_count, n_words = sums
+        self.ml_score += sign * ml_score
+        self.keyword_score += sign * keyword_score
+        self.word_count += sign * word_count
+        self.n_words += sign * n_words
+
+class ConversationStore:
+    """Bounded LRU of per-conversation score sums, so each new message is scored in O(its length)
+
+    Without decay or a window a conversation is classified exactly like
+    predict on all of its messages joined together, up to float rounding.
+    With half_life (seconds) every sum is multiplied by 0.5 ** (elapsed /
+    half_life) before a message is added, so older messages count less. With
+    window only the last window messages count: each message's sums are
+    kept and subtracted again once it falls out (after decaying them too
+    when half_life is set).
+
+    Each worker process keeps its own store. Conversations idle for ttl
+    seconds expire, the least recently active one is evicted beyond
+    max_sessions, and a conversation last scored by another model version
+    starts over, since its sums came from the old scores.
+    """
+
+    def __init__(self, max_sessions=10000, ttl=3600.0, half_life=None, window=None):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.half_life = half_life
+        self.window = window
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.messages = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.restarts = 0
+
+    def _session(self, conversation_id, version, now):
+        session = self._sessions.get(conversation_id)
+        if session is not None and self.ttl and now - session.updated >= self.ttl:
+            del self._sessions[conversation_id]
+            self.expirations += 1
+            session = None
+        if session is not None and session.version != version:
+            self.restarts += 1
+            session = None
+        if session is None:
+            session = Conversation(version, now)
+            self._sessions[conversation_id] = session
+            # Least recently active first, so expired conversations sit at the front
+            while self.ttl and now - next(iter(self._sessions.values())).updated >= self.ttl:
+                self._sessions.popitem(last=False)
+                self.expirations += 1
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+        self._sessions.move_to_end(conversation_id)
+        return session
+
+    def score(self, model, conversation_id, text, version, now=None):
+        """Add a message to a conversation; returns (label, confidence, messages in the conversation)"""
+        ids = model.encode(text)
+        ml_score, keyword_score, word_count = model.score_ids(ids, np.zeros(len(ids), dtype=np.intp), 1)
+        sums = (float(ml_score[0]), float(keyword_score[0]), float(word_count[0]), float(len(ids)))
+        now = time.monotonic() if now is None else now
+
+        with self._lock:
+            session = self._session(conversation_id, version, now)
+            if self.half_life and now > session.updated:
+                session.decay(0.5 ** ((now - session.updated) / self.half_life))
+            session.updated = now
+            session.add(sums)
+            session.messages += 1
+            self.messages += 1
+            if self.window:
+                session.window.append((now,) + sums)
+                while len(session.window) > self.window:
+                    added, *old_sums = session.window.popleft()
+                    if self.half_life:
+                        factor = 0.5 ** ((now - added) / self.half_life)
+                        old_sums = [value * factor for value in old_sums]
+                    session.add(old_sums, sign=-1.0)
+            totals = (session.ml_score, session.keyword_score, session.word_count, session.n_words)
+            messages = session.messages
+
+        ml_score, keyword_score, word_count, n_words = totals
+        if n_words <= DUST:
+            return 'non-suicide', 0.1, messages
+        label, confidence = model.classify_totals(ml_score, keyword_score, word_count if word_count > DUST else 0, n_words)
+        return label, confidence, messages
+
+    def end(self, conversation_id):
+        """Forget a conversation; returns whether it was known"""
+        with self._lock:
+            return self._sessions.pop(conversation_id, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'sessions': len(self._sessions),
+                'max_sessions': self.max_sessions,
+                'ttl': self.ttl,
+                'half_life': self.half_life,
+                'window': self.window,
+                'messages': self.messages,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'restarts': self.restarts,
+            }
@@ -0,0 +1,218 @@
+import argparse
+import atexit
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends still go through O_APPEND, just without the lock
+    fcntl = None
+
+class EventLog:
+    """Append-only JSON-lines log that many worker processes can write at once
+
+    append() only serializes the entry into an in-memory buffer. The buffer
+    is written as one O_APPEND write (a group commit) once max_batch entries
+    are waiting, after flush_interval seconds, on flush() or at exit, so the
+    cost of an append does not depend on how big the log already is.
+
+    legacy_path names the JSON-array file the log replaced; its entries are
+    imported the first time the log is opened (see migrate_json_array).
+    """
+
+    def __init__(self, path, max_batch=64, flush_interval=0.5, fsync=False, legacy_path=None):
+        self.path = path
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flusher = None
+        if legacy_path is not None:
+            migrate_json_array(legacy_path, path)
+        atexit.register(self.flush)
+
+    def append(self, entry):
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            self._buffer.append(line)
+            if len(self._buffer) >= self.max_batch:
+                self._flush_locked()
+            elif self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+                self._flusher.start()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def _flush_locked(self):
+        if not self._buffer:
+            return
+        data = ('\n'.join(self._buffer) + '\n').encode('utf-8')
+        self._buffer = []
+        append_bytes(self.path, data, self.fsync)
+
+def _open_locked(path):
+    """Open path for appending and take its exclusive lock
+
+    If compaction or rotation replaced the file while we waited for the
+    lock, the descriptor points at the old inode, so reopen and try again.
+    """
+    while True:
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        if fcntl is None:
+            return fd
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(fd).st_ino == os.stat(path).st_ino:
+                return fd
+        except FileNotFoundError:
+            pass
+        os.close(fd)
+
+def append_bytes(path, data, fsync=False):
+    fd = _open_locked(path)
+    try:
+        _write_all(fd, data, fsync)
+    finally:
+        os.close(fd)  # also releases the lock
+
+def _write_all(fd, data, fsync=False):
+    view = memoryview(data)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+    if fsync:
+        os.fsync(fd)
+
+def segments(path):
+    """Rotated segments of a log, oldest first, followed by the live file"""
+    rotated = sorted(glob.glob(glob.escape(path) + '.*[0-9]'))
+    return rotated + ([path] if os.path.exists(path) else [])
+
+def iter_entries(path, include_rotated=True):
+    """Yield every entry in the log, skipping lines a crash left half-written"""
+    for segment in (segments(path) if include_rotated else [path]):
+        try:
+            with open(segment, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            continue
+
+def rotate(path, max_bytes=64 * 1024 * 1024):
+    """Move the live file aside as path.<timestamp> once it reaches max_bytes"""
+    if not os.path.exists(path) or os.path.getsize(path) < max_bytes:
+        return None
+    fd = _open_locked(path)
+    try:
+        rotated = f"{path}.{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+        os.rename(path, rotated)
+    finally:
+        os.close(fd)
+    return rotated
+
+def compact(path, keep_days=None):
+    """Rewrite the log and all its rotated segments as one clean file
+
+    Half-written lines are dropped, and with keep_days so are entries whose
+    timestamp is older than that. Writers block on the lock meanwhile and
+    then append to the new file.
+    """
+    cutoff = (datetime.now() - timedelta(days=keep_days)).isoformat() if keep_days is not None else None
+    fd = _open_locked(path)
+    try:
+        old_segments = segments(path)
+        out_fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+        kept = 0
+        with os.fdopen(out_fd, 'w', encoding='utf-8') as out:
+            for entry in iter_entries(path):
+                if cutoff is not None and str(entry.get('timestamp', cutoff)) < cutoff:
+                    continue
+                out.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                kept += 1
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, path)
+        for segment in old_segments:
+            if segment != path:
+                os.remove(segment)
+    finally:
+        os.close(fd)
+    return kept
+
+def import_json_array(json_path, path):
+    """Append the entries of a legacy JSON-array file (e.g. feedback.json) to the log"""
+    entries = _read_json_array(json_path)
+    append_bytes(path, _json_lines(entries))
+    return len(entries)
+
+def migrate_json_array(json_path, path):
+    """Import json_path into the log at path if the log doesn't exist yet; returns the entries imported
+
+    Deployments from before the logs were JSON lines keep their history. The
+    import happens under the log's lock, so when several workers start at
+    once only the first one imports.
+    """
+    if segments(path) or not os.path.exists(json_path):
+        return 0
+    fd = _open_locked(path)
+    try:
+        if os.fstat(fd).st_size:
+            return 0
+        entries = _read_json_array(json_path)
+        _write_all(fd, _json_lines(entries), fsync=True)
+    finally:
+        os.close(fd)
+    print(f"Imported {len(entries)} entries from {json_path} into {path}")
+    return len(entries)
+
+def _read_json_array(json_path):
+    with open(json_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _json_lines(entries):
+    return ''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries).encode('utf-8')
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain append-only JSON-lines logs')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    rotate_parser = subparsers.add_parser('rotate', help='move the live file aside once it is large enough')
+    rotate_parser.add_argument('path')
+    rotate_parser.add_argument('--max-mb', type=float, default=64)
+    
+    compact_parser = subparsers.add_parser('compact', help='merge rotated segments into one clean file')
+    compact_parser.add_argument('path')
+    compact_parser.add_argument('--keep-days', type=int, default=None)
+    
+    import_parser = subparsers.add_parser('import', help='append a legacy JSON-array file to a log')
+    import_parser.add_argument('json_path')
+    import_parser.add_argument('path')
+    
+    args = parser.parse_args()
+    
+    if args.command == 'rotate':
+        rotated = rotate(args.path, int(args.max_mb * 1024 * 1024))
+        print(f"Rotated to {rotated}" if rotated else "Below size limit, nothing to rotate")
+    elif args.command == 'compact':
+        print(f"Compacted {args.path}: {compact(args.path, args.keep_days)} entries kept")
+    else:
+        print(f"Imported {import_json_array(args.json_path, args.path)} entries into {args.path}")
+
+if __name__ == '__main__':
+    main()
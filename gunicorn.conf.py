@@ -0,0 +1,48 @@
+"""gunicorn settings; gunicorn reads this file from the working directory on its own.
+
+The app is imported once in the master (preload_app), so the dataset
+download, model load or fallback training happen once, and workers forked
+from it start with the model already in memory. Forked pages stay shared
+until something writes to them. The garbage collector writes to every
+object it scans, so it stays off while the app is imported; gc.freeze()
+then moves everything the master allocated into a generation that
+collections never touch, and the collector runs again in the master and
+in every worker. The score tables are numpy arrays, which
+reference counting doesn't write to either; serving the binary model
+format (MODEL_PATH=perfect_model.bin) makes the vocabulary one too.
+
+Set the worker count with WEB_CONCURRENCY or --workers.
+"""
+import gc
+import os
+
+preload_app = True
+
+if 'PORT' in os.environ:
+    bind = f"0.0.0.0:{os.environ['PORT']}"
+
+# Off until the preloaded app is frozen; see when_ready
+gc.disable()
+
+def when_ready(server):
+    gc.freeze()
+    gc.enable()
+    # The master serves no requests, so it must not show up as a worker in the
+    # totals; drop anything it counted or flushed while loading the app
+    from metrics import worker_metrics
+    worker_metrics.remove()
+    worker_metrics.reset()
+
+def pre_fork(server, worker):
+    # Also covers what the master allocated since, e.g. before replacing a worker
+    gc.freeze()
+
+def post_fork(server, worker):
+    from metrics import worker_metrics
+    worker_metrics.reset()
+    gc.enable()
+
+def worker_exit(server, worker):
+    # Runs in the exiting worker; collect() would also drop the file once it sees the pid gone
+    from metrics import worker_metrics
+    worker_metrics.remove()
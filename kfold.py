@@ -0,0 +1,201 @@
+"""Stratified k-fold cross-validation of the model over the cached token stream.
+
+    python kfold.py --folds 5 --workers 4
+    python kfold.py --folds 10 --seed 7 --min-count 2 --quantize int8 --output kfold.json
+
+The CSV is tokenized once into token_cache/ (see token_cache.py); later
+runs, with other folds, seeds or settings, start from the cache. Rows are
+assigned to folds per class so every fold keeps the dataset's class
+balance. Token counts for every (fold, class) pair come out of one pass
+over the cache, and each fold's training counts are the totals minus its
+own, so no fold re-counts the others. Folds are then trained and
+evaluated in a process pool, each scoring its held-out rows exactly like
+predict would, and the report gives every fold's accuracy, per-class
+recall and confusion matrix with their mean, standard deviation and
+variance across folds.
+"""
+import argparse
+import contextlib
+import io
+import json
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+from perfect_model import PerfectSuicideDetector
+from token_cache import TOKEN_CACHE_DIR, counts_from_arrays, load_token_cache, open_token_cache
+
+CLASSES = ('suicide', 'non-suicide')
+METRICS = ('accuracy', 'suicide_detection', 'non_suicide_detection')
+# Documents whose tokens are counted, or scored, per numpy call
+CHUNK_DOCS = 20000
+
+def stratified_folds(labels, k, seed=42):
+    """Fold number of every row: each class is shuffled and dealt round-robin over k folds"""
+    rng = np.random.default_rng(seed)
+    folds = np.empty(len(labels), dtype=np.int64)
+    for label in (1, 0):
+        rows = np.flatnonzero(labels == label)
+        folds[rng.permutation(rows)] = np.arange(len(rows)) % k
+    return folds
+
+def fold_counts(cache, folds, k):
+    """Token counts of the first len(folds) rows, shaped (k, 2, words):
+    [fold, 0] from suicide rows and [fold, 1] from non-suicide rows"""
+    n_words = len(cache.words)
+    n_rows = len(folds)
+    # Every token is keyed by its row's (fold, class) group and its word id
+    groups = folds * 2 + (1 - cache.labels[:n_rows].astype(np.int64))
+    counts = np.zeros(k * 2 * n_words, dtype=np.int64)
+    for start in range(0, n_rows, CHUNK_DOCS):
+        end = min(start + CHUNK_DOCS, n_rows)
+        tokens = cache.tokens[cache.offsets[start]:cache.offsets[end]]
+        token_groups = np.repeat(groups[start:end], np.diff(cache.offsets[start:end + 1]))
+        counts += np.bincount(token_groups * n_words + tokens, minlength=len(counts))
+    return counts.reshape(k, 2, n_words)
+
+def confusion_matrix(cache, model, rows):
+    """2x2 counts for the given rows, [actual][predicted] in CLASSES order"""
+    id_map = cache.id_map(model)
+    matrix = np.zeros((2, 2), dtype=np.int64)
+    for start in range(0, len(rows), CHUNK_DOCS):
+        batch = rows[start:start + CHUNK_DOCS].tolist()
+        results = model.predict_docs([id_map[cache.doc(i)] for i in batch])
+        actual = 1 - cache.labels[batch].astype(np.int64)
+        predicted = np.fromiter((label != 'suicide' for label, _ in results), dtype=np.int64, count=len(results))
+        np.add.at(matrix, (actual, predicted), 1)
+    return matrix
+
+def summarize(matrix):
+    """The same percentages evaluate reports, from a confusion matrix; None for a class without rows"""
+    total = int(matrix.sum())
+    suicide, non_suicide = matrix.sum(axis=1).tolist()
+    return {
+        'accuracy': float(matrix[0, 0] + matrix[1, 1]) / total * 100 if total > 0 else None,
+        'suicide_detection': float(matrix[0, 0]) / suicide * 100 if suicide > 0 else None,
+        'non_suicide_detection': float(matrix[1, 1]) / non_suicide * 100 if non_suicide > 0 else None,
+    }
+
+_cache = None
+
+def _init_worker(cache_dir):
+    global _cache
+    _cache = open_token_cache(cache_dir)
+
+def run_fold(task):
+    """Train on the counts of every other fold and score this fold's rows"""
+    fold, train_counts, train_rows, test_rows, settings = task
+    start = time.perf_counter()
+    model = PerfectSuicideDetector()
+    with contextlib.redirect_stdout(io.StringIO()):
+        model.fit_counts(counts_from_arrays(_cache.words, train_counts[0], train_counts[1], train_rows))
+    if settings.get('min_count', 1) > 1 or settings.get('top_k') or settings.get('epsilon'):
+        model.prune(settings.get('min_count', 1), settings.get('top_k'), settings.get('epsilon', 0.0))
+    if settings.get('quantize'):
+        model.quantize(settings['quantize'])
+
+    matrix = confusion_matrix(_cache, model, test_rows)
+    return dict(summarize(matrix), fold=fold, train_rows=train_rows, test_rows=len(test_rows),
+                confusion=matrix.tolist(), seconds=time.perf_counter() - start)
+
+def cross_validate(csv_path='Suicide_Detection.csv', k=5, seed=42, workers=1, settings=None,
+                   cache_dir=TOKEN_CACHE_DIR, limit=None):
+    """Run stratified k-fold over the first limit rows (all by default); returns per-fold results and a summary"""
+    if k < 2:
+        raise ValueError('k-fold needs at least 2 folds')
+    settings = settings or {}
+    cache = load_token_cache(csv_path, cache_dir)
+    n_rows = len(cache) if limit is None else min(limit, len(cache))
+    labels = np.asarray(cache.labels[:n_rows])
+    folds = stratified_folds(labels, k, seed)
+
+    start = time.perf_counter()
+    counts = fold_counts(cache, folds, k)
+    totals = counts.sum(axis=0)
+    rows_per_fold = np.bincount(folds, minlength=k)
+    tasks = [(fold, totals - counts[fold], int(n_rows - rows_per_fold[fold]), np.flatnonzero(folds == fold), settings)
+             for fold in range(k)]
+    print(f"Counted {n_rows} rows into {k} folds in {time.perf_counter() - start:.1f}s")
+
+    if workers > 1:
+        with Pool(min(workers, k), initializer=_init_worker, initargs=(cache_dir,)) as pool:
+            results = pool.map(run_fold, tasks)
+    else:
+        _init_worker(cache_dir)
+        results = [run_fold(task) for task in tasks]
+
+    return results, summarize_folds(results)
+
+def summarize_folds(results):
+    """Mean, standard deviation and variance of each metric across folds, and the summed confusion matrix
+
+    Folds without rows of a class have no value for its metric and are left
+    out of its statistics, which are None when too few folds remain.
+    """
+    summary = {}
+    for metric in METRICS:
+        values = np.array([result[metric] for result in results if result[metric] is not None], dtype=np.float64)
+        summary[metric] = {
+            'mean': float(values.mean()) if len(values) else None,
+            'std': float(values.std(ddof=1)) if len(values) > 1 else None,
+            'variance': float(values.var(ddof=1)) if len(values) > 1 else None,
+            'folds': len(values),
+        }
+    summary['confusion'] = np.sum([result['confusion'] for result in results], axis=0).tolist()
+    return summary
+
+def _percent(value, width):
+    return ('n/a' if value is None else f'{value:.2f}%').rjust(width)
+
+def print_report(results, summary):
+    print(f"\n{'fold':>4s} {'test rows':>10s} {'accuracy':>9s} {'suicide':>8s} {'non-suicide':>12s} {'seconds':>8s}")
+    for result in results:
+        print(f"{result['fold']:4d} {result['test_rows']:10d} {_percent(result['accuracy'], 9)} "
+              f"{_percent(result['suicide_detection'], 8)} {_percent(result['non_suicide_detection'], 12)} "
+              f"{result['seconds']:8.1f}")
+
+    print(f"\nK-FOLD RESULTS ({len(results)} folds, mean ± std, variance):")
+    for metric, name in zip(METRICS, ('ACCURACY', 'SUICIDE DETECTION', 'NON-SUICIDE DETECTION')):
+        stats = summary[metric]
+        if stats['mean'] is None:
+            print(f"{name}: n/a (no fold has rows of this class)")
+            continue
+        spread = 'n/a' if stats['std'] is None else f"{stats['std']:.2f} (variance {stats['variance']:.4f})"
+        skipped = len(results) - stats['folds']
+        note = f"; left out {skipped} of {len(results)} folds, which had no rows of this class" if skipped else ''
+        print(f"{name}: {stats['mean']:.2f}% ± {spread}{note}")
+
+    matrix = summary['confusion']
+    print("\nConfusion matrix, all folds (rows actual, columns predicted):")
+    print(f"{'':>12s} {CLASSES[0]:>12s} {CLASSES[1]:>12s}")
+    for name, row in zip(CLASSES, matrix):
+        print(f"{name:>12s} {row[0]:12d} {row[1]:12d}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Stratified k-fold cross-validation of the model')
+    parser.add_argument('--csv', default='Suicide_Detection.csv')
+    parser.add_argument('--cache', default=TOKEN_CACHE_DIR, help='token cache directory, built from --csv if stale')
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42, help='seed of the fold assignment')
+    parser.add_argument('--rows', type=int, help='only use the first this many rows')
+    parser.add_argument('--workers', type=int, default=1, help='train and evaluate folds in this many processes')
+    parser.add_argument('--min-count', type=int, default=1, help='prune each fold model like the compress command')
+    parser.add_argument('--top-k', type=int)
+    parser.add_argument('--epsilon', type=float, default=0.0)
+    parser.add_argument('--quantize', choices=['int8', 'float16', 'float32'])
+    parser.add_argument('--output', help='also write the per-fold results and summary to this JSON file')
+    args = parser.parse_args()
+
+    settings = {'min_count': args.min_count, 'top_k': args.top_k, 'epsilon': args.epsilon, 'quantize': args.quantize}
+    results, summary = cross_validate(args.csv, args.folds, args.seed, args.workers, settings, args.cache, args.rows)
+    print_report(results, summary)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'csv': args.csv, 'folds': args.folds, 'seed': args.seed, 'rows': args.rows,
+                       'settings': settings, 'results': results, 'summary': summary}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == '__main__':
+    main()
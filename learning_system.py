@@ -1,87 +1,141 @@
 import json
-import pickle
+import os
+from collections import Counter, defaultdict
 from datetime import datetime
-from perfect_model import PerfectSuicideDetector
+from event_log import EventLog, iter_entries
+from model_store import snapshot_model
+from perfect_model import PerfectSuicideDetector, load_model, save_model
+
+# The served model (see app.py); feedback is applied to this one
+MODEL_PATH = os.environ.get('MODEL_PATH', 'perfect_model.pkl')
+
+class ImprovementAnalyzer:
+    """Word/prediction counters over low-confidence cases, updated one case at a time"""
+    
+    def __init__(self, min_frequency=3, material_change=0.1):
+        self.min_frequency = min_frequency
+        self.material_change = material_change
+        self.cases = 0
+        self.word_counts = Counter()
+        self.word_predictions = defaultdict(Counter)
+        self.suggested_words = set()
+        # State as of the last saved suggestions
+        self._saved_words = 0
+        self._saved_mass = 0
+        self._suggested_mass = 0
+    
+    def add(self, case):
+        """Fold one low-confidence case into the counters in O(words in the case)"""
+        self.cases += 1
+        for word in case['text'].lower().split():
+            if len(word) > 3:
+                self.word_counts[word] += 1
+                self.word_predictions[word][case.get('prediction')] += 1
+                count = self.word_counts[word]
+                if count == self.min_frequency:
+                    self.suggested_words.add(word)
+                    self._suggested_mass += count
+                elif count > self.min_frequency:
+                    self._suggested_mass += 1
+    
+    def has_material_change(self):
+        """True once the suggested words or their total frequency grew by material_change since the last save"""
+        new_words = len(self.suggested_words) - self._saved_words
+        if self._saved_words == 0:
+            return new_words > 0
+        return (new_words > self._saved_words * self.material_change
+                or self._suggested_mass - self._saved_mass > self._saved_mass * self.material_change)
+    
+    def mark_saved(self):
+        self._saved_words = len(self.suggested_words)
+        self._saved_mass = self._suggested_mass
+    
+    def suggestions(self):
+        # Find words that appear frequently in uncertain predictions
+        return [
+            {
+                'word': word,
+                'frequency': self.word_counts[word],
+                'predictions': dict(self.word_predictions[word]),
+                'suggestion': f"Consider adding '{word}' to keyword dictionary"
+            }
+            for word in sorted(self.suggested_words)
+        ]
 
 class AdaptiveLearningSystem:
-    def __init__(self):
+    def __init__(self, analysis_interval=100):
         self.base_model = None
         self.learning_data = []
         self.confidence_threshold = 0.6
         self.improvement_counter = 0
+        # Suggestions are re-checked every analysis_interval interactions, not on each one
+        self.analysis_interval = analysis_interval
+        self.analyzer = ImprovementAnalyzer()
+        self._since_analysis = 0
+        self.interaction_log = EventLog('learning_interactions.jsonl', legacy_path='learning_interactions.json')
+        self.feedback_log = EventLog('user_feedback.jsonl', legacy_path='user_feedback.json')
+        # Label shown for each analysis_id, so feedback trains on what the user saw
+        self.shown_predictions = {}
         
-    def load_base_model(self):
-        with open('perfect_model.pkl', 'rb') as f:
-            self.base_model = pickle.load(f)
+    def load_base_model(self, model_path=MODEL_PATH):
+        self.base_model = load_model(model_path)
         return self.base_model
     
-    def collect_interaction(self, text, prediction, confidence, user_feedback=None):
+    def collect_interaction(self, text, prediction, confidence, user_feedback=None, analysis_id=None):
         """Collect user interactions for future learning"""
         interaction = {
             'text': text,
             'prediction': prediction,
             'confidence': float(confidence),
             'user_feedback': user_feedback,
+            'analysis_id': analysis_id,
             'timestamp': datetime.now().isoformat(),
             'needs_review': confidence < self.confidence_threshold
         }
         
         self.learning_data.append(interaction)
-        self.save_learning_data()
+        if analysis_id is not None:
+            self.shown_predictions[analysis_id] = prediction
+        self.interaction_log.append(interaction)
+        if interaction['needs_review']:
+            self.analyzer.add(interaction)
         
         # Check if we have enough data for improvement
-        if len(self.learning_data) >= 100:
+        self._since_analysis += 1
+        if len(self.learning_data) >= 100 and self._since_analysis >= self.analysis_interval:
             self.trigger_improvement_analysis()
     
     def save_learning_data(self):
-        """Save learning data to file"""
-        with open('learning_interactions.json', 'w') as f:
-            json.dump(self.learning_data, f, indent=2)
+        """Write any buffered interactions and feedback to disk"""
+        self.interaction_log.flush()
+        self.feedback_log.flush()
     
     def load_learning_data(self):
         """Load existing learning data"""
-        try:
-            with open('learning_interactions.json', 'r') as f:
-                self.learning_data = json.load(f)
-        except FileNotFoundError:
-            self.learning_data = []
-    
-    def trigger_improvement_analysis(self):
-        """Analyze collected data for potential improvements"""
-        low_confidence_cases = [d for d in self.learning_data if d['needs_review']]
-        
-        if len(low_confidence_cases) >= 20:
-            self.improvement_counter += 1
-            print(f"🔄 Improvement Analysis #{self.improvement_counter}")
-            print(f"📊 Analyzed {len(low_confidence_cases)} low-confidence cases")
-            
-            # Identify patterns in low-confidence predictions
-            self.identify_improvement_patterns(low_confidence_cases)
+        self.learning_data = list(iter_entries(self.interaction_log.path))
+        self.analyzer = ImprovementAnalyzer()
+        self.shown_predictions = {}
+        for entry in self.learning_data:
+            if entry.get('analysis_id') is not None and 'confidence' in entry:
+                self.shown_predictions[entry['analysis_id']] = entry.get('prediction')
+            if entry.get('needs_review'):
+                self.analyzer.add(entry)
     
-    def identify_improvement_patterns(self, cases):
-        """Identify patterns that could improve model"""
-        word_patterns = {}
-        
-        for case in cases:
-            words = case['text'].lower().split()
-            for word in words:
-                if len(word) > 3:
-                    if word not in word_patterns:
-                        word_patterns[word] = {'count': 0, 'predictions': []}
-                    word_patterns[word]['count'] += 1
-                    word_patterns[word]['predictions'].append(case['prediction'])
+    def trigger_improvement_analysis(self, force=False):
+        """Save improvement suggestions if the counters changed materially (or force=True)"""
+        self._since_analysis = 0
         
-        # Find words that appear frequently in uncertain predictions
-        improvement_suggestions = []
-        for word, data in word_patterns.items():
-            if data['count'] >= 3:
-                improvement_suggestions.append({
-                    'word': word,
-                    'frequency': data['count'],
-                    'suggestion': f"Consider adding '{word}' to keyword dictionary"
-                })
-        
-        self.save_improvement_suggestions(improvement_suggestions)
+        if self.analyzer.cases < 20:
+            return
+        if not force and not self.analyzer.has_material_change():
+            return
+        
+        self.improvement_counter += 1
+        print(f"🔄 Improvement Analysis #{self.improvement_counter}")
+        print(f"📊 Analyzed {self.analyzer.cases} low-confidence cases")
+        
+        self.save_improvement_suggestions(self.analyzer.suggestions())
+        self.analyzer.mark_saved()
     
     def save_improvement_suggestions(self, suggestions):
         """Save improvement suggestions for future model updates"""
@@ -96,37 +150,68 @@ class AdaptiveLearningSystem:
         print(f"💡 Generated {len(suggestions)} improvement suggestions")
         print("📁 Saved to model_improvements.json")
     
-    def collect_feedback(self, text, feedback_type, analysis_id):
-        """Collect user feedback for specific analysis"""
+    def collect_feedback(self, text, feedback_type, analysis_id, prediction=None):
+        """Collect user feedback for specific analysis
+        
+        prediction is the label the user was shown; without it, the one
+        collect_interaction recorded for analysis_id is used.
+        """
+        if prediction is None:
+            prediction = self.shown_predictions.get(analysis_id)
         feedback_entry = {
             'text': text,
             'feedback': feedback_type,
             'analysis_id': analysis_id,
+            'prediction': prediction,
             'timestamp': datetime.now().isoformat()
         }
         
+        # Positive feedback confirms the shown label, negative feedback corrects it.
+        # Re-predicting now could give another label than the one the user judged.
+        if prediction in ('suicide', 'non-suicide') and feedback_type in ('positive', 'negative'):
+            if feedback_type == 'negative':
+                prediction = 'non-suicide' if prediction == 'suicide' else 'suicide'
+            feedback_entry['label'] = prediction
+        
         # Add to learning data
         self.learning_data.append(feedback_entry)
-        self.save_learning_data()
+        self.interaction_log.append(feedback_entry)
+        
+        # Keep a separate feedback log too
+        self.feedback_log.append(feedback_entry)
+    
+    def apply_feedback(self, model_path=MODEL_PATH):
+        """Fold labeled feedback newer than the last update into the model with partial_fit
         
-        # Save separate feedback file
-        try:
-            with open('user_feedback.json', 'r') as f:
-                feedback_data = json.load(f)
-        except FileNotFoundError:
-            feedback_data = []
+        The current model is snapshotted first so the update can be rolled
+        back with model_store.rollback. Returns the number of entries applied.
+        """
+        self.feedback_log.flush()
+        model = self.base_model
+        applied_through = getattr(model, 'feedback_through', '')
         
-        feedback_data.append(feedback_entry)
+        texts, labels, latest = [], [], applied_through
+        for entry in iter_entries(self.feedback_log.path):
+            if entry.get('label') and entry['timestamp'] > applied_through:
+                texts.append(entry['text'])
+                labels.append(entry['label'])
+                latest = max(latest, entry['timestamp'])
+        if not texts:
+            return 0
         
-        with open('user_feedback.json', 'w') as f:
-            json.dump(feedback_data, f, indent=2)
+        version = snapshot_model(model)
+        model.partial_fit(texts, labels)
+        model.feedback_through = latest
+        save_model(model, model_path)
+        print(f"Applied {len(texts)} feedback entries (previous model saved as snapshot v{version})")
+        return len(texts)
     
     def get_learning_stats(self):
         """Get current learning statistics"""
         if not self.learning_data:
             return {'total': 0, 'low_confidence': 0, 'improvements': 0}
         
-        low_conf = len([d for d in self.learning_data if d['needs_review']])
+        low_conf = self.analyzer.cases
         
         # Count feedback
         feedback_entries = [d for d in self.learning_data if 'feedback' in d]
@@ -147,4 +232,9 @@ learning_system.load_learning_data()
 try:
     learning_system.load_base_model()
 except FileNotFoundError:
-    print("Base model not found for learning system")
\ No newline at end of file
+    print("Base model not found for learning system")
+
+if __name__ == '__main__':
+    # Apply collected feedback to the served model; workers hot-swap to it
+    if learning_system.base_model is not None:
+        learning_system.apply_feedback()
@@ -0,0 +1,355 @@
+import json
+import os
+import tempfile
+import time
+from bisect import bisect_left
+
+METRICS_DIR = 'serving_metrics'
+
+# Upper bounds of the duration histograms, in seconds
+DURATION_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+# Training and model loads take seconds to minutes
+SLOW_DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900)
+
+PROMETHEUS_PREFIX = 'suicide_detection'
+
+def evaluation_stats(model):
+    """The held-out evaluation saved with the model, rounded the way /stats reports it
+
+    A model evaluated on no rows has no evaluation, rather than 0%.
+    """
+    evaluation = getattr(model, 'evaluation', None)
+    if not evaluation or evaluation.get('test_rows') == 0:
+        return {
+            'overall_accuracy': None,
+            'suicide_detection': None,
+            'non_suicide_detection': None,
+            'test_rows': 0,
+            'trained_at': None
+        }
+    return {
+        'overall_accuracy': round_percent(evaluation['accuracy']),
+        'suicide_detection': round_percent(evaluation['suicide_detection']),
+        'non_suicide_detection': round_percent(evaluation['non_suicide_detection']),
+        'test_rows': evaluation.get('test_rows', 0),
+        'trained_at': evaluation.get('trained_at')
+    }
+
+def round_percent(value):
+    # None stands for a class the evaluation had no rows of
+    return None if value is None else round(value, 1)
+
+def resident_memory_bytes():
+    """Current RSS of this process, or the peak RSS where /proc isn't available"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.buckets[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+class ServingMetrics:
+    """Serving counters for one worker process, shared with the others through a directory
+
+    Each worker only ever touches its own counters, so recording a request is
+    a few plain increments with no lock or IPC. Every flush_interval seconds
+    the worker writes its totals to directory/<pid>-<start time>.json, and
+    collect() sums the files of the running workers. Files of workers that
+    exited are deleted, and the start time tells a recycled pid apart from
+    the worker that had it before. So totals cover the running workers only:
+    they drop when a worker is replaced and start from zero on a restart,
+    which Prometheus treats as a counter reset.
+    """
+
+    def __init__(self, directory=METRICS_DIR, flush_interval=5.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.cache = None
+        # (pid, path) of this process's file; a forked worker gets its own
+        self._file = None
+        self.reset()
+
+    def reset(self):
+        """Start counting from zero, e.g. in a worker forked from a process that already counted"""
+        self.requests = 0
+        self.predictions = 0
+        self.errors = 0
+        self.labels = {'suicide': 0, 'non-suicide': 0}
+        self.latency = Histogram(DURATION_BUCKETS)
+        # (name, stage) -> Histogram for everything timed besides whole requests
+        self.timings = {}
+        self._next_flush = time.monotonic() + self.flush_interval
+
+    def observe(self, seconds, labels):
+        """Record one request that took seconds and produced the given labels"""
+        self.requests += 1
+        self.predictions += len(labels)
+        for label in labels:
+            self.labels[label] = self.labels.get(label, 0) + 1
+        self.latency.observe(seconds)
+        self._maybe_flush()
+
+    def observe_error(self):
+        self.requests += 1
+        self.errors += 1
+        self._maybe_flush()
+
+    def observe_duration(self, name, seconds, stage='', bounds=DURATION_BUCKETS):
+        """Record how long one named operation (or one stage of it) took"""
+        histogram = self.timings.get((name, stage))
+        if histogram is None:
+            histogram = self.timings[(name, stage)] = Histogram(bounds)
+        histogram.observe(seconds)
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if time.monotonic() >= self._next_flush:
+            self.flush()
+
+    def snapshot(self):
+        counters = {
+            'pid': os.getpid(),
+            'requests': self.requests,
+            'predictions': self.predictions,
+            'errors': self.errors,
+            'labels': dict(self.labels),
+            'latency_buckets': list(self.latency.buckets),
+            'latency_seconds': self.latency.sum,
+            'timings': [
+                {'name': name, 'stage': stage, 'bounds': list(h.bounds), 'buckets': list(h.buckets), 'sum': h.sum}
+                for (name, stage), h in list(self.timings.items())
+            ],
+            'resident_memory_bytes': resident_memory_bytes(),
+            'cache_hits': 0,
+            'cache_misses': 0
+        }
+        if self.cache is not None:
+            cache_stats = self.cache.stats()
+            counters['cache_hits'] = cache_stats['hits']
+            counters['cache_misses'] = cache_stats['misses']
+        return counters
+
+    def path(self):
+        pid = os.getpid()
+        if self._file is None or self._file[0] != pid:
+            self._file = (pid, os.path.join(self.directory, f'{pid}-{_start_time(pid)}.json'))
+        return self._file[1]
+
+    def flush(self):
+        """Write this worker's totals to its file in directory"""
+        self._next_flush = time.monotonic() + self.flush_interval
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_path, self.path())
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def remove(self):
+        """Delete this worker's file, e.g. as it exits"""
+        try:
+            os.remove(self.path())
+        except FileNotFoundError:
+            pass
+
+    def collect(self):
+        """Totals over every running worker that has written to directory, this one up to date"""
+        self.flush()
+        total = {
+            'workers': 0,
+            'requests': 0,
+            'predictions': 0,
+            'errors': 0,
+            'labels': {},
+            'latency_buckets': [0] * (len(DURATION_BUCKETS) + 1),
+            'latency_seconds': 0.0,
+            'timings': {},
+            'resident_memory_bytes': {},
+            'cache_hits': 0,
+            'cache_misses': 0
+        }
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            if not _is_current(name[:-len('.json')]):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    counters = json.load(f)
+            except (OSError, ValueError):
+                continue
+            total['workers'] += 1
+            for key in ('requests', 'predictions', 'errors', 'latency_seconds', 'cache_hits', 'cache_misses'):
+                total[key] += counters[key]
+            for label, count in counters['labels'].items():
+                total['labels'][label] = total['labels'].get(label, 0) + count
+            for i, count in enumerate(counters['latency_buckets']):
+                total['latency_buckets'][i] += count
+            for timing in counters.get('timings', []):
+                merged = total['timings'].setdefault(
+                    (timing['name'], timing['stage']),
+                    {'bounds': timing['bounds'], 'buckets': [0] * len(timing['buckets']), 'sum': 0.0}
+                )
+                for i, count in enumerate(timing['buckets']):
+                    merged['buckets'][i] += count
+                merged['sum'] += timing['sum']
+            total['resident_memory_bytes'][counters['pid']] = counters['resident_memory_bytes']
+        return total
+
+def _is_current(worker):
+    """Whether a metrics file named <pid>-<start time> belongs to a process that is still running"""
+    try:
+        pid, start = map(int, worker.split('-'))
+    except ValueError:
+        return False
+    return _is_running(pid) and start == _start_time(pid)
+
+def _start_time(pid):
+    """When the process started, in clock ticks since boot; 0 where /proc isn't available"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            # Field 22; the command name before it is in parentheses and may contain spaces
+            return int(f.read().rsplit(')', 1)[1].split()[19])
+    except (OSError, ValueError, IndexError):
+        return 0
+
+def _is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class _StageClock:
+    """Times consecutive stages of one request"""
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+        self.last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.metrics.observe_duration(self.name, now - self.last, stage)
+        self.last = now
+
+class _NullClock:
+    def lap(self, stage):
+        pass
+
+_NULL_CLOCK = _NullClock()
+
+class StageProfiler:
+    """Per-stage timing hook for request handlers
+
+    start() hands out a clock whose lap(stage) records the time since the
+    previous lap. While disabled it hands out one shared clock whose lap does
+    nothing, so the instrumented handler does no timing and allocates nothing.
+    """
+
+    def __init__(self, metrics, name, enabled=False):
+        self.metrics = metrics
+        self.name = name
+        self.enabled = enabled
+
+    def start(self):
+        if not self.enabled:
+            return _NULL_CLOCK
+        return _StageClock(self.metrics, self.name)
+
+def serving_stats(totals):
+    """Format collected totals for /stats"""
+    served = totals['requests'] - totals['errors']
+    histogram = {f'le_{bound * 1000:g}ms': count for bound, count in zip(DURATION_BUCKETS, totals['latency_buckets'])}
+    histogram[f'over_{DURATION_BUCKETS[-1] * 1000:g}ms'] = totals['latency_buckets'][-1]
+    lookups = totals['cache_hits'] + totals['cache_misses']
+    return {
+        'workers': totals['workers'],
+        'requests': totals['requests'],
+        'errors': totals['errors'],
+        'predictions': totals['predictions'],
+        'label_distribution': totals['labels'],
+        'mean_latency_ms': round(totals['latency_seconds'] / served * 1000, 3) if served else None,
+        'latency_histogram': histogram,
+        'cache_hit_rate': round(totals['cache_hits'] / lookups, 4) if lookups else None
+    }
+
+def _histogram_lines(name, labels, bounds, buckets, total):
+    """Prometheus histogram samples; buckets are cumulative and end with +Inf"""
+    prefix = ''.join(f'{key}="{value}",' for key, value in labels)
+    lines = []
+    cumulative = 0
+    for bound, count in zip(list(bounds) + ['+Inf'], buckets):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+    label_text = '{' + prefix.rstrip(',') + '}' if labels else ''
+    lines.append(f'{name}_sum{label_text} {total}')
+    lines.append(f'{name}_count{label_text} {cumulative}')
+    return lines
+
+def prometheus_text(totals):
+    """Render collected totals in the Prometheus text exposition format"""
+    p = PROMETHEUS_PREFIX
+    lines = [
+        f'# HELP {p}_requests_total Prediction requests handled, including failed ones.',
+        f'# TYPE {p}_requests_total counter',
+        f'{p}_requests_total {totals["requests"]}',
+        f'# HELP {p}_request_errors_total Prediction requests that failed.',
+        f'# TYPE {p}_request_errors_total counter',
+        f'{p}_request_errors_total {totals["errors"]}',
+        f'# HELP {p}_predictions_total Texts classified, by predicted label.',
+        f'# TYPE {p}_predictions_total counter',
+    ]
+    lines += [f'{p}_predictions_total{{label="{label}"}} {count}' for label, count in sorted(totals['labels'].items())]
+    lines += [
+        f'# HELP {p}_cache_lookups_total Prediction cache lookups, by result.',
+        f'# TYPE {p}_cache_lookups_total counter',
+        f'{p}_cache_lookups_total{{result="hit"}} {totals["cache_hits"]}',
+        f'{p}_cache_lookups_total{{result="miss"}} {totals["cache_misses"]}',
+        f'# HELP {p}_request_seconds Time to serve a prediction request.',
+        f'# TYPE {p}_request_seconds histogram',
+    ]
+    lines += _histogram_lines(f'{p}_request_seconds', [], DURATION_BUCKETS, totals['latency_buckets'], totals['latency_seconds'])
+
+    by_name = {}
+    for (name, stage), timing in sorted(totals['timings'].items()):
+        by_name.setdefault(name, []).append((stage, timing))
+    for name, timings in by_name.items():
+        lines += [f'# HELP {p}_{name}_seconds Duration of {name.replace("_", " ")}.', f'# TYPE {p}_{name}_seconds histogram']
+        for stage, timing in timings:
+            labels = [('stage', stage)] if stage else []
+            lines += _histogram_lines(f'{p}_{name}_seconds', labels, timing['bounds'], timing['buckets'], timing['sum'])
+
+    lines += [
+        f'# HELP {p}_resident_memory_bytes Resident memory of each running worker.',
+        f'# TYPE {p}_resident_memory_bytes gauge',
+    ]
+    lines += [f'{p}_resident_memory_bytes{{pid="{pid}"}} {rss}' for pid, rss in sorted(totals['resident_memory_bytes'].items())]
+    lines += [
+        f'# HELP {p}_workers Workers that have reported metrics since the directory was created.',
+        f'# TYPE {p}_workers gauge',
+        f'{p}_workers {totals["workers"]}',
+    ]
+    return '\n'.join(lines) + '\n'
+
+# The counters of this process; the app and its training jobs all record into it
+worker_metrics = ServingMetrics()
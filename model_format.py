@@ -0,0 +1,191 @@
+"""Compact binary model format that workers memory-map instead of unpickling.
+
+Layout:
+
+    8 bytes   magic b'PSDMODEL'
+    u32       format version
+    u32       length of the JSON metadata that follows
+    JSON      metadata: section table, keyword dicts, totals, evaluation
+    sections  raw little-endian arrays, each starting on a 64-byte boundary
+
+The vocabulary is a sorted fixed-width byte array, so ids are positions in
+it and lookups are a binary search; the scores, keyword weights and token
+counts are flat arrays aligned with those ids. Loading maps the file
+read-only and wraps the sections with np.frombuffer, so nothing is copied
+and every worker serving the same file shares its pages.
+
+    python model_format.py convert perfect_model.pkl perfect_model.bin
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import tempfile
+from itertools import chain
+
+import numpy as np
+
+from perfect_model import BINARY_MAGIC as MAGIC, NEW_FILE_MODE, PerfectSuicideDetector, SortedVocab, load_model
+
+FORMAT_VERSION = 2
+# Version 1 files predate quantized scores and read as float32 without a scale
+READABLE_VERSIONS = (1, 2)
+_HEADER = struct.Struct('<8sII')
+_ALIGNMENT = 64
+
+# Words longer than the 99.9th percentile go to the overflow dict rather than
+# widening every entry of the array
+_MIN_WIDTH = 8
+_MAX_WIDTH = 64
+
+def _sorted_layout(vocab):
+    """Split the vocabulary into the sorted array and the overflow dict
+
+    Returns (words, overflow, order), where order[new_id] is the old id of
+    each word, so old arrays are reordered with array[order].
+    """
+    vocab = dict(vocab.items())
+    words = list(vocab)
+    lengths = np.fromiter((len(word) for word in words), dtype=np.intp, count=len(words))
+    width = int(np.clip(np.percentile(lengths, 99.9), _MIN_WIDTH, _MAX_WIDTH)) if words else _MIN_WIDTH
+    short = sorted(word for word in words if len(word) <= width and word.isascii())
+    long = [word for word in words if len(word) > width or not word.isascii()]
+
+    order = np.fromiter(chain([0], map(vocab.get, short), map(vocab.get, long)), dtype=np.intp, count=len(words) + 1)
+    array = np.array(short, dtype=f'S{width + 1}') if short else np.zeros(0, dtype=f'S{width + 1}')
+    overflow = {word: len(short) + 1 + i for i, word in enumerate(long)}
+    return array, overflow, order
+
+def save_binary_model(model, path):
+    """Write model in the binary format, renaming it into place like save_model"""
+    if model.vocab is None:
+        model.compile()
+    words, overflow, order = _sorted_layout(model.vocab)
+
+    arrays = [
+        ('vocab', words),
+        ('ml_scores', np.asarray(model.ml_scores, dtype=_score_dtype(model.ml_scores))[order]),
+        ('ml_present', np.asarray(model.ml_present, dtype=np.uint8)[order]),
+        ('keyword_weights', np.asarray(model.keyword_weights, dtype='<f4')[order]),
+    ]
+    if model.suicide_counts is not None:
+        arrays.append(('suicide_counts', np.asarray(model.suicide_counts, dtype='<i8')[order]))
+        arrays.append(('non_suicide_counts', np.asarray(model.non_suicide_counts, dtype='<i8')[order]))
+
+    meta = {
+        'width': words.dtype.itemsize - 1,
+        'overflow': overflow,
+        'suicide_keywords': model.suicide_keywords,
+        'positive_keywords': model.positive_keywords,
+        'neutral_strong': model.neutral_strong,
+        'boosts': [model.SUICIDE_BOOST, model.NON_SUICIDE_BOOST],
+        'ml_scale': model.ml_scale,
+        'suicide_total': int(model.suicide_total),
+        'non_suicide_total': int(model.non_suicide_total),
+        'evaluation': model.evaluation,
+        'feedback_through': getattr(model, 'feedback_through', None),
+        'sections': [],
+    }
+
+    # Section offsets depend on the metadata length, which depends on the
+    # offsets; lay out relative to a metadata block with room to spare
+    relative = 0
+    for name, array in arrays:
+        meta['sections'].append({'name': name, 'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': relative})
+        relative = _align(relative + array.nbytes)
+    meta_bytes = json.dumps(meta).encode('utf-8')
+    data_start = _align(_HEADER.size + len(meta_bytes) + 32 * len(arrays))
+    for section in meta['sections']:
+        section['offset'] += data_start
+    meta_bytes = json.dumps(meta).encode('utf-8')
+    meta_bytes += b' ' * (data_start - _HEADER.size - len(meta_bytes))
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        os.fchmod(fd, NEW_FILE_MODE)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(meta_bytes)))
+            f.write(meta_bytes)
+            for section, (_, array) in zip(meta['sections'], arrays):
+                f.write(b'\0' * (section['offset'] - f.tell()))
+                f.write(array.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def _score_dtype(scores):
+    """Quantized scores keep their type; full precision ones are stored as float32"""
+    if scores.dtype in (np.int8, np.float16):
+        return scores.dtype.newbyteorder('<')
+    return np.dtype('<f4')
+
+def _align(offset):
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+def load_binary_model(path):
+    """Map a binary model file and wrap it in a PerfectSuicideDetector without copying the arrays"""
+    with open(path, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, meta_length = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a binary model file")
+    if version not in READABLE_VERSIONS:
+        readable = ', '.join(map(str, READABLE_VERSIONS))
+        raise ValueError(f"{path} has binary model format {version}; this version reads formats {readable}")
+    meta = json.loads(data[_HEADER.size:_HEADER.size + meta_length])
+
+    sections = {}
+    for section in meta['sections']:
+        dtype = np.dtype(section['dtype'])
+        count = int(np.prod(section['shape']))
+        if section['offset'] + count * dtype.itemsize > len(data):
+            raise ValueError(f"{path} is truncated")
+        sections[section['name']] = np.frombuffer(data, dtype=dtype, count=count, offset=section['offset'])
+
+    model = PerfectSuicideDetector()
+    model.suicide_keywords = meta['suicide_keywords']
+    model.positive_keywords = meta['positive_keywords']
+    model.neutral_strong = meta['neutral_strong']
+    if meta['boosts'] != [model.SUICIDE_BOOST, model.NON_SUICIDE_BOOST]:
+        model.SUICIDE_BOOST, model.NON_SUICIDE_BOOST = meta['boosts']
+    model.vocab = SortedVocab(sections['vocab'], meta['overflow'])
+    model.ml_scores = sections['ml_scores']
+    model.ml_scale = meta.get('ml_scale')
+    model.ml_present = sections['ml_present'].view(np.bool_)
+    model.keyword_weights = sections['keyword_weights']
+    model.suicide_counts = sections.get('suicide_counts')
+    model.non_suicide_counts = sections.get('non_suicide_counts')
+    model.suicide_total = meta['suicide_total']
+    model.non_suicide_total = meta['non_suicide_total']
+    model.evaluation = meta['evaluation']
+    if meta.get('feedback_through') is not None:
+        model.feedback_through = meta['feedback_through']
+    # Rebuilt from the arrays only if something asks for it
+    model.word_scores = None
+    return model
+
+def convert(source, destination):
+    model = load_model(source)
+    save_binary_model(model, destination)
+    return model
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert models to the binary format')
+    commands = parser.add_subparsers(dest='command', required=True)
+    convert_parser = commands.add_parser('convert', help='convert a pickled model to the binary format')
+    convert_parser.add_argument('source', help='pickled model, e.g. perfect_model.pkl')
+    convert_parser.add_argument('destination', help='binary model to write, e.g. perfect_model.bin')
+    args = parser.parse_args()
+
+    convert(args.source, args.destination)
+    source_size = os.path.getsize(args.source)
+    size = os.path.getsize(args.destination)
+    print(f"Wrote {args.destination}: {size / 1e6:.1f} MB (pickle was {source_size / 1e6:.1f} MB)")
+
+if __name__ == '__main__':
+    main()
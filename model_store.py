@@ -0,0 +1,143 @@
+import argparse
+import os
+import re
+import threading
+import time
+
+from perfect_model import load_model, save_model
+
+SNAPSHOTS_DIR = 'model_snapshots'
+_SNAPSHOT_NAME = re.compile(r'^perfect_model-v(\d+)\.pkl$')
+
+def file_version(path):
+    """Identify the artifact currently at path, or None if there is none
+
+    save_model renames a fresh file into place, so a new model always shows
+    up as a new inode/mtime pair.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return f'{stat.st_ino}-{stat.st_mtime_ns}-{stat.st_size}'
+
+class ModelHandle:
+    """Holds the model a worker serves and hot-swaps it when the artifact on disk changes
+
+    Every worker process has its own handle. get() stats the artifact at most
+    once per check_interval seconds; when another process has written a new
+    version, it is loaded and swapped in with a single reference assignment,
+    so requests already running keep using the model they started with.
+    """
+
+    def __init__(self, path='perfect_model.pkl', check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        # Swapped as one tuple so a reader never pairs a model with another's version
+        self._current = (None, None)
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        # Set when a background task calls refresh(), see get_versioned
+        self.watched = False
+        # Called with every model loaded from disk, e.g. to record load times
+        self.on_load = None
+
+    @property
+    def model(self):
+        return self._current[0]
+
+    @property
+    def version(self):
+        return self._current[1]
+
+    def load(self):
+        version = file_version(self.path)
+        model = load_model(self.path)
+        self._current = (model, version)
+        if self.on_load is not None:
+            self.on_load(model)
+        return model
+
+    def set(self, model, version=None):
+        """Serve a model that was built in this process rather than loaded"""
+        self._current = (model, version if version is not None else file_version(self.path))
+
+    def get(self):
+        return self.get_versioned()[0]
+
+    def get_versioned(self):
+        """The current (model, version) pair, checking the artifact for a newer version first
+
+        Once watched is set, whoever set it calls refresh() instead and this
+        only reads the pair, so a request never waits on a stat or a load.
+        """
+        if not self.watched:
+            now = time.monotonic()
+            if now >= self._next_check:
+                self._next_check = now + self.check_interval
+                self.refresh()
+        return self._current
+
+    def refresh(self):
+        """Load the artifact if it is not the version being served"""
+        version = file_version(self.path)
+        if version is not None and version != self.version:
+            with self._lock:
+                if version != self.version:
+                    try:
+                        self.load()
+                        print(f"Hot-swapped model to version {self.version}")
+                    except Exception as e:
+                        # Keep serving the old model; try again on the next check
+                        print(f"Model reload failed: {e}")
+
+def snapshot_path(version, directory=SNAPSHOTS_DIR):
+    return os.path.join(directory, f'perfect_model-v{version}.pkl')
+
+def list_snapshots(directory=SNAPSHOTS_DIR):
+    """Snapshot version numbers in directory, oldest first"""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return sorted(int(match.group(1)) for match in map(_SNAPSHOT_NAME.match, names) if match)
+
+def snapshot_model(model, directory=SNAPSHOTS_DIR, keep=20):
+    """Save model as the next numbered snapshot, pruning all but the newest keep; returns its version"""
+    os.makedirs(directory, exist_ok=True)
+    versions = list_snapshots(directory)
+    version = versions[-1] + 1 if versions else 1
+    save_model(model, snapshot_path(version, directory))
+    for old in (versions + [version])[:-keep]:
+        os.remove(snapshot_path(old, directory))
+    return version
+
+def rollback(version, model_path='perfect_model.pkl', directory=SNAPSHOTS_DIR):
+    """Serve snapshot version again; save_model replaces the artifact atomically, so every worker hot-swaps to it"""
+    model = load_model(snapshot_path(version, directory))
+    save_model(model, model_path)
+    return model
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage model snapshots')
+    parser.add_argument('--model', default='perfect_model.pkl')
+    parser.add_argument('--dir', default=SNAPSHOTS_DIR)
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help='list snapshot versions')
+    commands.add_parser('snapshot', help='snapshot the current model')
+    rollback_parser = commands.add_parser('rollback', help='serve a snapshot again')
+    rollback_parser.add_argument('version', type=int)
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        for version in list_snapshots(args.dir):
+            print(f"v{version}  {snapshot_path(version, args.dir)}")
+    elif args.command == 'snapshot':
+        version = snapshot_model(load_model(args.model), args.dir)
+        print(f"Saved snapshot v{version}")
+    else:
+        rollback(args.version, args.model, args.dir)
+        print(f"Rolled {args.model} back to snapshot v{args.version}")
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,173 @@
+import argparse
+import codecs
 import csv
+import io
+import mmap
+import os
 import pickle
 import re
 import math
-from collections import Counter
+import tempfile
+import time
+from collections import Counter, deque
+from datetime import datetime
+from itertools import chain
+from multiprocessing import Pool
+
+import numpy as np
+
+from split_csv import chunk_boundaries, scan_records
+
+_NON_TOKEN_CHARS = re.compile(r'[^a-zA-Z\s]')
+# Maximal runs of two or more non-space characters: split() minus one-letter words
+_TOKEN = re.compile(r'\S\S+')
+# For ASCII text one translate pass does both the lowercasing and the deletion
+_ASCII_TOKEN_TABLE = str.maketrans({
+    code: chr(code).lower() if _NON_TOKEN_CHARS.match(chr(code)) is None else None
+    for code in range(128)
+})
+
+def _non_ascii_to_separator(error):
+    """Encode error handler: a run of non-ASCII characters becomes a space if it holds whitespace, else nothing"""
+    run = error.object[error.start:error.end]
+    return (' ' if any(char.isspace() for char in run) else '', error.end)
+
+codecs.register_error('perfect_model.tokens', _non_ascii_to_separator)
+
+def normalize_text(text):
+    """Lowercase text and drop everything but ASCII letters and whitespace
+
+    Tokens are the same as with re.sub(r'[^a-zA-Z\\s]', '', text.lower()),
+    though non-ASCII whitespace comes back as a plain space.
+    """
+    text = str(text)
+    if not text.isascii():
+        # Some non-ASCII characters lowercase to ASCII letters (the Kelvin sign
+        # to 'k'), so lowercase before dropping the rest
+        text = text.lower().encode('ascii', 'perfect_model.tokens').decode('ascii')
+    return text.translate(_ASCII_TOKEN_TABLE)
+
+class TokenCounts:
+    """Raw per-class token counts, everything train needs to compute word_scores"""
+    
+    def __init__(self):
+        self.suicide = Counter()
+        self.non_suicide = Counter()
+        self.suicide_total = 0
+        self.non_suicide_total = 0
+        self.rows = 0
+    
+    def add(self, words, label):
+        self.rows += 1
+        if label == 'suicide':
+            self.suicide.update(words)
+            self.suicide_total += len(words)
+        else:
+            self.non_suicide.update(words)
+            self.non_suicide_total += len(words)
+    
+    def merge(self, other):
+        """Add another set of counts, e.g. one computed on a different shard"""
+        self.suicide.update(other.suicide)
+        self.non_suicide.update(other.non_suicide)
+        self.suicide_total += other.suicide_total
+        self.non_suicide_total += other.non_suicide_total
+        self.rows += other.rows
+        return self
+
+class SortedVocab:
+    """Read-only word -> id mapping over a sorted fixed-width byte array
+    
+    This is the vocabulary of models loaded from the binary format. The
+    array can live in a memory-mapped file, so every worker shares one copy.
+    Words up to `width` bytes are array entries with ids 1..len(words), in
+    sorted order; the rare longer ones are kept in the small `overflow`
+    dict with the ids after that.
+    """
+    
+    def __init__(self, words, overflow):
+        self.words = words
+        self.overflow = overflow
+        self.width = words.dtype.itemsize - 1
+    
+    def __len__(self):
+        return len(self.words) + len(self.overflow)
+    
+    def get(self, word, default=None):
+        if len(word) > self.width:
+            return self.overflow.get(word, default)
+        ids = self.lookup([word])
+        return int(ids[0]) if ids[0] else default
+    
+    def __getitem__(self, word):
+        word_id = self.get(word)
+        if word_id is None:
+            raise KeyError(word)
+        return word_id
+    
+    def __contains__(self, word):
+        return self.get(word) is not None
+    
+    def __iter__(self):
+        """Words in id order"""
+        for word in self.words:
+            yield word.decode('ascii')
+        yield from self.overflow
+    
+    def items(self):
+        for word_id, word in enumerate(self, 1):
+            yield word, word_id
+    
+    def lookup(self, words):
+        """Ids of many words at once, 0 for unknown ones, with one binary search over the array"""
+        # Entries are at most width bytes, so a key cut to width + 1 bytes
+        # only matches when it is the whole word; preprocessed words are ASCII
+        if not words:
+            return np.zeros(0, dtype=np.intp)
+        keys = np.array(words, dtype=self.words.dtype)
+        positions = np.searchsorted(self.words, keys)
+        positions[positions == len(self.words)] = 0
+        ids = np.where(self.words[positions] == keys, positions + 1, 0)
+        if self.overflow:
+            long_words = keys.view(np.uint8).reshape(len(keys), self.words.dtype.itemsize)[:, -1].nonzero()[0]
+            for i in long_words.tolist():
+                ids[i] = self.overflow.get(words[i], 0)
+        return ids
 
 class PerfectSuicideDetector:
+    # Class boosts train applies to token counts
+    SUICIDE_BOOST = 2
+    NON_SUICIDE_BOOST = 4  # Strong non-suicide boost
+    # Scores of words only ever seen in one class
+    SUICIDE_ONLY_SCORE = 1.8
+    NON_SUICIDE_ONLY_SCORE = -3.0  # Very strong non-suicide indicator
+    # How classify_totals turns summed scores into a label; sweep.py tunes these
+    KEYWORD_WEIGHT = 0.045
+    LENGTH_FACTOR_CAP = 1.2
+    LENGTH_FACTOR_WORDS = 10
+    SUICIDE_THRESHOLD = 0.55
+    KEYWORD_OVERRIDE = 20
+    
     def __init__(self):
-        self.word_scores = {}
+        self._word_scores = {}
+        
+        # Compiled scoring table, built by compile()
+        self.vocab = None
+        self.ml_scores = None
+        self.ml_present = None
+        self.keyword_weights = None
+        # Step between int8 score levels after quantize('int8'); None while scores are floats
+        self.ml_scale = None
+        
+        # Raw per-class token counts aligned with vocab ids, kept so partial_fit
+        # can fold in new labeled text without retraining
+        self.suicide_counts = None
+        self.non_suicide_counts = None
+        self.suicide_total = 0
+        self.non_suicide_total = 0
+        
+        # Held-out results from the training run that built this model
+        self.evaluation = None
         
         self.suicide_keywords = {
             'suicide': 15.0, 'kill': 12.0, 'die': 11.0, 'death': 10.0, 'end': 8.0,
@@ -47,88 +208,267 @@ class PerfectSuicideDetector:
             'today': -2.0, 'tomorrow': -2.0, 'weekend': -4.0, 'morning': -3.0, 'evening': -3.0
         }
         
+    @property
+    def word_scores(self):
+        if self._word_scores is None:
+            # Models loaded from a compiled pickle only rebuild the dict when asked
+            scores = self.ml_score_values().tolist()
+            present = self.ml_present.tolist()
+            self._word_scores = {word: scores[i] for word, i in self.vocab.items() if present[i]}
+        return self._word_scores
+    
+    @word_scores.setter
+    def word_scores(self, value):
+        self._word_scores = value
+    
+    def __getstate__(self):
+        if self.vocab is None:
+            self.compile()
+        state = self.__dict__.copy()
+        # The compiled table is what gets persisted; word_scores is derived from it
+        state['_word_scores'] = None
+        state.pop('load_seconds', None)
+        return state
+    
+    def __setstate__(self, state):
+        # Pickles written before the token counts were kept
+        state.setdefault('suicide_counts', None)
+        state.setdefault('non_suicide_counts', None)
+        state.setdefault('suicide_total', 0)
+        state.setdefault('non_suicide_total', 0)
+        state.setdefault('evaluation', None)
+        state.setdefault('ml_scale', None)
+        if 'word_scores' in state:
+            # Pickles written before compile() existed
+            state['_word_scores'] = state.pop('word_scores')
+            state.pop('_batch_tables', None)
+            self.__dict__.update(state)
+            self.compile()
+        else:
+            self.__dict__.update(state)
+    
     def preprocess_text(self, text):
-        text = str(text).lower()
-        text = re.sub(r'[^a-zA-Z\s]', '', text)
-        words = text.split()
-        return [word for word in words if len(word) > 1]
+        return [word for word in normalize_text(text).split() if len(word) > 1]
+    
+    def iter_tokens(self, text):
+        """Yield the words preprocess_text returns one at a time, without building the list"""
+        for match in _TOKEN.finditer(normalize_text(text)):
+            yield match.group()
     
     def train(self, texts, labels):
         print("Training perfect model...")
         
-        suicide_texts = []
-        non_suicide_texts = []
-        
+        counts = TokenCounts()
         for text, label in zip(texts, labels):
-            words = self.preprocess_text(text)
-            if label == 'suicide':
-                suicide_texts.extend(words * 2)
-            else:
-                non_suicide_texts.extend(words * 4)  # Strong non-suicide boost
+            counts.add(self.preprocess_text(text), label)
         
-        suicide_counts = Counter(suicide_texts)
-        non_suicide_counts = Counter(non_suicide_texts)
+        self.fit_counts(counts)
+    
+    def train_csv(self, path='Suicide_Detection.csv', limit=None):
+        """Train from a CSV file row by row; memory is bounded by the vocabulary, not the file"""
+        print("Training perfect model...")
         
-        total_suicide = len(suicide_texts)
-        total_non_suicide = len(non_suicide_texts)
+        counts = TokenCounts()
+        for text, label in iter_dataset(path, limit=limit):
+            counts.add(self.preprocess_text(text), label)
+        
+        self.fit_counts(counts)
+        return counts
+    
+    def fit_counts(self, counts):
+        """Compute word_scores from token counts, applying the class boosts"""
+        # Boosting a class multiplies each of its counts and its total by the same
+        # factor, which is what repeating every token used to do
+        total_suicide = counts.suicide_total * self.SUICIDE_BOOST
+        total_non_suicide = counts.non_suicide_total * self.NON_SUICIDE_BOOST
         
-        all_words = set(suicide_counts.keys()) | set(non_suicide_counts.keys())
+        all_words = counts.suicide.keys() | counts.non_suicide.keys()
         
+        self.word_scores = {}
         for word in all_words:
-            suicide_freq = suicide_counts.get(word, 0) / total_suicide
-            non_suicide_freq = non_suicide_counts.get(word, 0) / total_non_suicide
+            suicide_freq = counts.suicide.get(word, 0) * self.SUICIDE_BOOST / total_suicide if total_suicide else 0
+            non_suicide_freq = counts.non_suicide.get(word, 0) * self.NON_SUICIDE_BOOST / total_non_suicide if total_non_suicide else 0
             
             if suicide_freq > 0 and non_suicide_freq > 0:
                 score = math.log(suicide_freq / non_suicide_freq)
             elif suicide_freq > 0:
-                score = 1.8
+                score = self.SUICIDE_ONLY_SCORE
             else:
-                score = -3.0  # Very strong non-suicide indicator
+                score = self.NON_SUICIDE_ONLY_SCORE
                 
             self.word_scores[word] = score
         
+        self.compile(counts)
         print(f"Training completed on {len(all_words)} words")
     
-    def predict(self, text):
-        words = self.preprocess_text(text)
+    def partial_fit(self, texts, labels):
+        """Fold newly labeled texts into the stored token counts and rescore, without retraining
         
-        if not words:
-            return 'non-suicide', 0.1
+        New words are appended to the vocabulary. The class totals change too,
+        which shifts every two-class word's log ratio, so all scores are
+        recomputed in one vectorized pass over the count arrays; the result
+        matches a full retrain on the combined data up to float rounding.
+        """
+        if self.suicide_counts is None:
+            raise ValueError("Model has no token counts; retrain it with train or train_from_csv first")
+        if not isinstance(self.vocab, dict):
+            # Binary models are memory-mapped read-only; updates need private copies
+            self.vocab = dict(self.vocab.items())
+            self.suicide_counts = np.array(self.suicide_counts)
+            self.non_suicide_counts = np.array(self.non_suicide_counts)
         
-        ml_score = 0
-        keyword_score = 0
-        word_count = 0
+        counts = TokenCounts()
+        for text, label in zip(texts, labels):
+            counts.add(self.preprocess_text(text), label)
         
-        for word in words:
-            if word in self.word_scores:
-                ml_score += self.word_scores[word]
-                word_count += 1
-            
-            if word in self.suicide_keywords:
-                keyword_score += self.suicide_keywords[word]
-            elif word in self.positive_keywords:
-                keyword_score += self.positive_keywords[word]
-            elif word in self.neutral_strong:
-                keyword_score += self.neutral_strong[word]
+        new_words = [word for word in dict.fromkeys(chain(counts.suicide, counts.non_suicide)) if word not in self.vocab]
+        if new_words:
+            for word in new_words:
+                self.vocab[word] = len(self.vocab) + 1
+            grow = len(new_words)
+            self.ml_scores = np.concatenate([self.ml_scores, np.zeros(grow, dtype=self.ml_scores.dtype)])
+            self.ml_present = np.concatenate([self.ml_present, np.zeros(grow, dtype=np.bool_)])
+            self.keyword_weights = np.concatenate([self.keyword_weights, np.zeros(grow, dtype=self.keyword_weights.dtype)])
+            self.suicide_counts = np.concatenate([self.suicide_counts, np.zeros(grow, dtype=np.int64)])
+            self.non_suicide_counts = np.concatenate([self.non_suicide_counts, np.zeros(grow, dtype=np.int64)])
+        
+        for class_counts, array in ((counts.suicide, self.suicide_counts), (counts.non_suicide, self.non_suicide_counts)):
+            if class_counts:
+                ids = np.fromiter((self.vocab[word] for word in class_counts), dtype=np.intp, count=len(class_counts))
+                array[ids] += np.fromiter(class_counts.values(), dtype=np.int64, count=len(class_counts))
+        self.suicide_total += counts.suicide_total
+        self.non_suicide_total += counts.non_suicide_total
+        
+        self._rescore()
+        return counts.rows
+    
+    def _rescore(self):
+        """Recompute every ML score from the count arrays, same rules as fit_counts"""
+        suicide = self.suicide_counts * self.SUICIDE_BOOST
+        non_suicide = self.non_suicide_counts * self.NON_SUICIDE_BOOST
+        total_suicide = self.suicide_total * self.SUICIDE_BOOST
+        total_non_suicide = self.non_suicide_total * self.NON_SUICIDE_BOOST
+        
+        suicide_freq = suicide / total_suicide if total_suicide else np.zeros(len(suicide))
+        non_suicide_freq = non_suicide / total_non_suicide if total_non_suicide else np.zeros(len(non_suicide))
+        
+        in_suicide = suicide_freq > 0
+        in_non_suicide = non_suicide_freq > 0
+        both = in_suicide & in_non_suicide
+        
+        scores = np.where(in_suicide, self.SUICIDE_ONLY_SCORE, self.NON_SUICIDE_ONLY_SCORE)
+        scores[both] = np.log(suicide_freq[both] / non_suicide_freq[both])
+        
+        self.ml_present = in_suicide | in_non_suicide
+        self.ml_scores = np.where(self.ml_present, scores, 0.0)
+        self.ml_scale = None
+        self._word_scores = None
+    
+    def ml_score_values(self):
+        """ML scores by id as float64, undoing any quantization"""
+        if self.ml_scale is not None:
+            return self.ml_scores * self.ml_scale
+        return np.asarray(self.ml_scores, dtype=np.float64)
+    
+    def prune(self, min_count=1, top_k=None, epsilon=0.0):
+        """Drop ML scores that carry little signal; returns how many words left the vocabulary
+        
+        A word keeps its score only if it was seen at least min_count times,
+        its score is further than epsilon from zero and it is among the top_k
+        strongest scores. Keyword words always stay, scored or not. Pruned
+        words lose their token counts too, so a later partial_fit treats them
+        as new words.
+        """
+        if self.vocab is None:
+            self.compile()
+        scores = self.ml_score_values()
+        
+        keep = np.array(self.ml_present, dtype=np.bool_)
+        keep[0] = False
+        if min_count > 1:
+            if self.suicide_counts is None:
+                raise ValueError("Pruning by min_count needs token counts; retrain the model first")
+            keep &= (self.suicide_counts + self.non_suicide_counts) >= min_count
+        if epsilon > 0:
+            keep &= np.abs(scores) > epsilon
+        if top_k is not None and np.count_nonzero(keep) > top_k:
+            candidates = np.flatnonzero(keep)
+            strongest = candidates[np.argsort(-np.abs(scores[candidates]), kind='stable')[:top_k]]
+            keep[:] = False
+            keep[strongest] = True
+        
+        retained = keep | (self.keyword_weights != 0)
+        retained[0] = True
+        ids = np.flatnonzero(retained)
+        
+        words = list(self.vocab)
+        self.vocab = {words[i - 1]: new_id for new_id, i in enumerate(ids[1:].tolist(), 1)}
+        self.ml_scores = (self.ml_scores * keep)[ids]
+        self.ml_present = keep[ids]
+        self.keyword_weights = self.keyword_weights[ids]
+        if self.suicide_counts is not None:
+            self.suicide_counts = self.suicide_counts[ids]
+            self.non_suicide_counts = self.non_suicide_counts[ids]
+        self._word_scores = None
+        return len(words) - len(self.vocab)
+    
+    def quantize(self, dtype):
+        """Store the ML scores as 'float16', 'float32' or 'int8' (scaled so the largest score maps to 127)"""
+        if self.vocab is None:
+            self.compile()
+        scores = self.ml_score_values()
+        if dtype == 'int8':
+            peak = float(np.abs(scores).max()) if len(scores) else 0.0
+            scale = peak / 127 if peak else 1.0
+            self.ml_scores = np.round(scores / scale).astype(np.int8)
+            self.ml_scale = scale
+        elif dtype in ('float16', 'float32'):
+            self.ml_scores = scores.astype(dtype)
+            self.ml_scale = None
+        else:
+            raise ValueError(f"Unsupported score type {dtype!r}; use int8, float16 or float32")
+        self._word_scores = None
+    
+    def token_counts(self):
+        """The stored token counts as a TokenCounts"""
+        counts = TokenCounts()
+        words = list(self.vocab)
+        for class_counts, array in ((counts.suicide, self.suicide_counts), (counts.non_suicide, self.non_suicide_counts)):
+            class_counts.update({word: count for word, count in zip(words, array[1:].tolist()) if count})
+        counts.suicide_total = self.suicide_total
+        counts.non_suicide_total = self.non_suicide_total
+        return counts
+    
+    def predict(self, text):
+        return self.predict_ids(self.encode(text))
+    
+    def predict_ids(self, ids):
+        if ids.size == 0:
+            return 'non-suicide', 0.1
         
+        ml_score, keyword_score, word_count = self.score_ids(ids, np.zeros(len(ids), dtype=np.intp), 1)
+        return self.classify_totals(float(ml_score[0]), float(keyword_score[0]), int(word_count[0]), len(ids))
+    
+    def classify_totals(self, ml_score, keyword_score, word_count, n_words):
+        """Turn the summed per-word scores of a text into a (label, confidence) pair"""
         if word_count > 0:
             avg_ml_score = ml_score / word_count
         else:
             avg_ml_score = 0
         
         # Text length bonus for confidence
-        length_factor = min(1.2, len(words) / 10)
-        final_score = (avg_ml_score + (keyword_score * 0.045)) * length_factor
+        length_factor = min(self.LENGTH_FACTOR_CAP, n_words / self.LENGTH_FACTOR_WORDS)
+        final_score = (avg_ml_score + (keyword_score * self.KEYWORD_WEIGHT)) * length_factor
         
         probability = 1 / (1 + math.exp(-final_score))
         
         # Smart confidence based on context
         abs_score = abs(final_score)
         
-        if probability >= 0.70 or keyword_score > 20:
+        if probability >= 0.70 or keyword_score > self.KEYWORD_OVERRIDE:
             confidence = min(0.95, 0.80 + abs_score * 0.05)
             return 'suicide', confidence
-        elif probability >= 0.55:
+        elif probability >= self.SUICIDE_THRESHOLD:
             confidence = min(0.85, 0.70 + abs_score * 0.03)
             return 'suicide', confidence
         elif probability <= 0.30 or keyword_score < -15:
@@ -141,54 +481,450 @@ class PerfectSuicideDetector:
             # Borderline cases
             confidence = 0.62
             return 'non-suicide', confidence
+    
+    def compile(self, counts=None):
+        """Merge word_scores and the keyword dicts into one vocabulary index backed by flat arrays
+        
+        counts (a TokenCounts) replaces the stored token counts; without it the
+        counts already stored are carried over to the rebuilt vocabulary.
+        """
+        if counts is None and self.suicide_counts is not None:
+            counts = self.token_counts()
+        
+        # Id 0 is reserved for words the model knows nothing about
+        vocab = {}
+        ml_scores = [0.0]
+        ml_present = [False]
+        keyword_weights = [0.0]
+        
+        for word, score in self.word_scores.items():
+            vocab[word] = len(ml_scores)
+            ml_scores.append(score)
+            ml_present.append(True)
+            keyword_weights.append(0.0)
+        
+        # Same precedence as the keyword checks always had: suicide, then positive, then neutral
+        for keywords in (self.neutral_strong, self.positive_keywords, self.suicide_keywords):
+            for word, weight in keywords.items():
+                if word not in vocab:
+                    vocab[word] = len(ml_scores)
+                    ml_scores.append(0.0)
+                    ml_present.append(False)
+                    keyword_weights.append(0.0)
+                keyword_weights[vocab[word]] = weight
+        
+        self.vocab = vocab
+        self.ml_scores = np.array(ml_scores, dtype=np.float64)
+        self.ml_scale = None
+        self.ml_present = np.array(ml_present, dtype=np.bool_)
+        # Keyword weights are small whole numbers, so float32 stores them exactly
+        self.keyword_weights = np.array(keyword_weights, dtype=np.float32)
+        
+        if counts is not None:
+            size = len(vocab) + 1
+            self.suicide_counts = np.zeros(size, dtype=np.int64)
+            self.non_suicide_counts = np.zeros(size, dtype=np.int64)
+            self.suicide_counts[1:] = np.fromiter((counts.suicide.get(word, 0) for word in vocab), dtype=np.int64, count=len(vocab))
+            self.non_suicide_counts[1:] = np.fromiter((counts.non_suicide.get(word, 0) for word in vocab), dtype=np.int64, count=len(vocab))
+            self.suicide_total = counts.suicide_total
+            self.non_suicide_total = counts.non_suicide_total
+        return self
+    
+    def encode(self, text):
+        """Tokenize text straight into vocabulary ids (0 for unknown words)"""
+        return self.encode_tokens(self.preprocess_text(text))
+    
+    def encode_tokens(self, words):
+        """Vocabulary ids for already preprocessed words"""
+        if self.vocab is None:
+            self.compile()
+        if isinstance(self.vocab, SortedVocab):
+            return self.vocab.lookup(words)
+        lookup = self.vocab.get
+        return np.fromiter((lookup(word, 0) for word in words), dtype=np.intp, count=len(words))
+    
+    def score_ids(self, ids, doc_ids, n_docs):
+        """Sum ML scores, keyword weights and scored-word counts per document
+        
+        bincount adds the weights in token order, so every total is accumulated
+        exactly like a plain left-to-right loop over the words would.
+        """
+        ml_totals = np.bincount(doc_ids, weights=self.ml_scores[ids], minlength=n_docs)
+        if self.ml_scale is not None:
+            ml_totals *= self.ml_scale
+        keyword_totals = np.bincount(doc_ids, weights=self.keyword_weights[ids], minlength=n_docs)
+        word_counts = np.bincount(doc_ids, weights=self.ml_present[ids], minlength=n_docs)
+        return ml_totals, keyword_totals, word_counts
+    
+    def predict_batch(self, texts):
+        """Predict many texts at once; returns the same (label, confidence) pairs as predict"""
+        return self.predict_docs([self.encode(text) for text in texts])
+    
+    def predict_docs(self, docs):
+        """predict_batch for texts that are already encoded"""
+        lengths = np.fromiter((len(ids) for ids in docs), dtype=np.intp, count=len(docs))
+        ids = np.concatenate(docs) if docs else np.zeros(0, dtype=np.intp)
+        doc_ids = np.repeat(np.arange(len(docs)), lengths)
+        
+        ml_totals, keyword_totals, word_counts = self.score_ids(ids, doc_ids, len(docs))
+        
+        results = []
+        for i, n_words in enumerate(lengths.tolist()):
+            if n_words == 0:
+                results.append(('non-suicide', 0.1))
+            else:
+                results.append(self.classify_totals(
+                    float(ml_totals[i]), float(keyword_totals[i]), int(word_counts[i]), n_words
+                ))
+        return results
+
+def iter_dataset(path='Suicide_Detection.csv', limit=None):
+    """Yield (text, label) pairs from the dataset CSV one row at a time"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.DictReader(f)
+        for i, row in enumerate(reader):
+            if limit is not None and i >= limit:
+                break
+            yield row['text'], row['class']
+
+def load_dataset(path='Suicide_Detection.csv', limit=None):
+    texts = []
+    labels = []
+    
+    for text, label in iter_dataset(path, limit=limit):
+        texts.append(text)
+        labels.append(label)
+    
+    return texts, labels
+
+def evaluate(model, texts, labels):
+    return score_predictions((model.predict(text)[0] for text in texts), labels)
+
+def evaluate_docs(model, docs, labels):
+    """evaluate for texts that are already encoded"""
+    return score_predictions((label for label, _ in model.predict_docs(docs)), labels)
 
-# Train and test
-texts = []
-labels = []
+def score_predictions(predictions, labels):
+    """Accuracy and per-class recall in percent; None where there were no rows to score"""
+    correct = 0
+    suicide_found = 0
+    total_suicide = 0
+    non_suicide_correct = 0
+    total_non_suicide = 0
+    
+    for pred, actual in zip(predictions, labels):
+        if pred == actual:
+            correct += 1
+        
+        if actual == 'suicide':
+            total_suicide += 1
+            if pred == 'suicide':
+                suicide_found += 1
+        else:
+            total_non_suicide += 1
+            if pred == 'non-suicide':
+                non_suicide_correct += 1
+    
+    total = total_suicide + total_non_suicide
+    return {
+        'accuracy': (correct / total) * 100 if total > 0 else None,
+        'suicide_detection': (suicide_found / total_suicide) * 100 if total_suicide > 0 else None,
+        'non_suicide_detection': (non_suicide_correct / total_non_suicide) * 100 if total_non_suicide > 0 else None,
+    }
+
+def format_percent(value):
+    return 'n/a' if value is None else f'{value:.1f}%'
+
+def iter_csv_range(path, start, end, fieldnames):
+    """Yield (text, label) pairs for the rows between two record boundaries of the CSV"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start).decode('utf-8')
+    
+    for row in csv.DictReader(io.StringIO(data, newline=''), fieldnames=fieldnames):
+        yield row['text'], row['class']
+
+def _count_shard(task):
+    path, start, end, fieldnames = task
+    model = PerfectSuicideDetector()
+    counts = TokenCounts()
+    for text, label in iter_csv_range(path, start, end, fieldnames):
+        counts.add(model.preprocess_text(text), label)
+    return counts
+
+def split_rows(rows, train_rows, test_rows):
+    """(training rows, held-out rows) of a dataset of rows rows, the held-out ones right after the training ones
+    
+    Training takes the first train_rows rows (every row but the held-out
+    ones with train_rows=None) and the next test_rows are held out. A
+    dataset too small for both keeps up to a third of its rows, at most
+    test_rows, for evaluation. Every training path (train_from_csv,
+    train_from_cache and dataset uploads) splits this way. The training
+    part never shrinks as rows are added, so streaming readers can count a
+    row once split_rows of the rows read so far puts it in training.
+    """
+    reserve = min(test_rows, rows // 3)
+    n_train = rows - reserve if train_rows is None else min(train_rows, rows - reserve)
+    return n_train, min(test_rows, rows - n_train)
 
-with open('Suicide_Detection.csv', 'r', encoding='utf-8') as f:
-    reader = csv.DictReader(f)
-    for i, row in enumerate(reader):
-        if i >= 15000:
+def count_csv(model, path, train_rows, test_rows):
+    """Stream the CSV once, counting training rows and keeping the held-out rows"""
+    counts = TokenCounts()
+    held_out = deque()
+    
+    for rows, (text, label) in enumerate(iter_dataset(path), 1):
+        if train_rows is not None and rows > train_rows + test_rows:
             break
-        texts.append(row['text'])
-        labels.append(row['class'])
-
-model = PerfectSuicideDetector()
-model.train(texts[:10000], labels[:10000])
-
-# Test
-correct = 0
-suicide_found = 0
-total_suicide = 0
-non_suicide_correct = 0
-total_non_suicide = 0
-
-for i in range(10000, 15000):
-    pred, conf = model.predict(texts[i])
-    actual = labels[i]
-    
-    if pred == actual:
-        correct += 1
-    
-    if actual == 'suicide':
-        total_suicide += 1
-        if pred == 'suicide':
-            suicide_found += 1
+        # A row is only trained on once the split can't hold it out any more
+        held_out.append((text, label))
+        n_train, _ = split_rows(rows, train_rows, test_rows)
+        while counts.rows < n_train:
+            text, label = held_out.popleft()
+            counts.add(model.preprocess_text(text), label)
+    
+    return counts, list(held_out)
+
+SHARD_BYTES = 32 * 1024 * 1024
+
+def count_csv_parallel(path, train_rows, test_rows, workers):
+    """Same as count_csv, but the training rows are cut into byte-range shards
+    that a process pool counts independently before the counts are merged"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        fieldnames = next(csv.reader(f))
+    data_start, ends = scan_records(path)
+    
+    n_train, n_test = split_rows(len(ends), train_rows, test_rows)
+    
+    # A few shards per worker keeps the pool busy when shards finish unevenly,
+    # and capping their size bounds what each worker holds in memory
+    train_bytes = ends[n_train - 1] - data_start if n_train else 0
+    num_shards = max(workers * 4, -(-train_bytes // SHARD_BYTES))
+    shards = chunk_boundaries(data_start, ends[:n_train], num_shards)
+    tasks = [(path, start, end, fieldnames) for start, end in shards]
+    
+    counts = TokenCounts()
+    with Pool(workers) as pool:
+        for shard_counts in pool.imap_unordered(_count_shard, tasks):
+            counts.merge(shard_counts)
+    
+    test_start = ends[n_train - 1] if n_train else data_start
+    test_end = ends[n_train + n_test - 1] if n_test else test_start
+    held_out = list(iter_csv_range(path, test_start, test_end, fieldnames))
+    return counts, held_out
+
+def train_from_csv(path='Suicide_Detection.csv', train_rows=10000, test_rows=5000, workers=1):
+    """Train on the first train_rows rows and evaluate on the next test_rows
+    
+    With train_rows=None every row is used for training except the last
+    test_rows, which are held out; small datasets hold out fewer (see
+    split_rows). Rows are streamed, so only the held-out slice is ever kept
+    in memory. With workers > 1 the training rows are
+    counted in a process pool; the resulting model is identical.
+    """
+    model = PerfectSuicideDetector()
+    print("Training perfect model...")
+    
+    if workers > 1:
+        counts, held_out = count_csv_parallel(path, train_rows, test_rows, workers)
+    else:
+        counts, held_out = count_csv(model, path, train_rows, test_rows)
+    
+    return train_from_counts(counts, held_out)
+
+def train_from_cache(path='Suicide_Detection.csv', train_rows=10000, test_rows=5000, cache_dir='token_cache'):
+    """train_from_csv reading the token cache of path instead of the CSV (see token_cache)
+    
+    The cache is built, or brought up to date with rows appended to the CSV,
+    first. Training counts come from one bincount over the cached tokens and
+    the held-out rows are scored from their cached tokens; the model and
+    results are the same as train_from_csv gives.
+    """
+    from token_cache import load_token_cache
+    cache = load_token_cache(path, cache_dir)
+    model = PerfectSuicideDetector()
+    print("Training perfect model...")
+    
+    n_train, n_test = split_rows(len(cache), train_rows, test_rows)
+    
+    model.fit_counts(cache.token_counts(0, n_train))
+    results = evaluate_docs(model, cache.encode_rows(model, range(n_train, n_train + n_test)),
+                            cache.class_labels(n_train, n_train + n_test))
+    model.evaluation = _stored_evaluation(results, n_test)
+    return model, results
+
+def train_from_counts(counts, held_out):
+    """Fit a model on already counted training rows and evaluate it on the held-out (text, label) pairs
+    
+    Without held-out rows every result is None and the model has no evaluation.
+    """
+    model = PerfectSuicideDetector()
+    model.fit_counts(counts)
+    
+    texts = [text for text, label in held_out]
+    labels = [label for text, label in held_out]
+    results = evaluate(model, texts, labels)
+    model.evaluation = _stored_evaluation(results, len(texts))
+    return model, results
+
+def _stored_evaluation(results, test_rows):
+    # Saved with the artifact so servers can report it without re-evaluating
+    if not test_rows:
+        return None
+    return dict(results, test_rows=test_rows, trained_at=datetime.now().isoformat())
+
+# First bytes of models saved in the binary format (see model_format)
+BINARY_MAGIC = b'PSDMODEL'
+
+def _umask():
+    # The umask can only be read by setting it
+    mask = os.umask(0o022)
+    os.umask(mask)
+    return mask
+
+# Permissions open() would give a new file; mkstemp always uses 0600
+NEW_FILE_MODE = 0o666 & ~_umask()
+
+def save_model(model, path='perfect_model.pkl'):
+    """Write the model next to path and rename it into place, so readers never see half a file
+    
+    Paths ending in .bin get the memory-mappable binary format, anything else a pickle.
+    """
+    if path.endswith('.bin'):
+        from model_format import save_binary_model
+        save_binary_model(model, path)
+        return
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        # Servers may run as another user than the trainer
+        os.fchmod(fd, NEW_FILE_MODE)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(model, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def load_model(path='perfect_model.pkl'):
+    """Deserialize a prebuilt model artifact, pickled or binary, without training anything"""
+    start = time.perf_counter()
+    
+    with open(path, 'rb') as f:
+        is_binary = f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+        f.seek(0)
+        if is_binary:
+            # Imported here because model_format builds on this module
+            from model_format import load_binary_model
+            model = load_binary_model(path)
+        else:
+            model = _load_pickle(f)
+    
+    model.load_seconds = time.perf_counter() - start
+    print(f"Model loaded from {path} in {model.load_seconds * 1000:.1f} ms")
+    return model
+
+def _load_pickle(f):
+    try:
+        # Unpickle straight from the page cache instead of copying the file into a bytes object
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return pickle.loads(data)
+    except (ValueError, OSError):
+        # Empty files and file systems without mmap support
+        f.seek(0)
+        return pickle.load(f)
+
+def compress_model(args):
+    """The compress command: prune and quantize args.model, evaluate it before and after, save it to args.output"""
+    model = load_model(args.model)
+    texts, labels = load_dataset(args.csv, limit=args.skip_rows + args.test_rows)
+    texts, labels = texts[args.skip_rows:], labels[args.skip_rows:]
+    before = evaluate(model, texts, labels)
+    vocab_size = len(model.vocab)
+    
+    removed = model.prune(args.min_count, args.top_k, args.epsilon)
+    if args.quantize:
+        model.quantize(args.quantize)
+    results = evaluate(model, texts, labels)
+    model.evaluation = dict(model.evaluation or {}, **results, test_rows=len(texts))
+    
+    print(f"Pruned {removed} of {vocab_size} words; {int(np.count_nonzero(model.ml_present))} scores left "
+          f"({model.ml_scores.dtype})")
+    if results['accuracy'] is not None:
+        print(f"Accuracy {before['accuracy']:.2f}% -> {results['accuracy']:.2f}% "
+              f"({results['accuracy'] - before['accuracy']:+.2f} points)")
+    return model, results
+
+def main():
+    parser = argparse.ArgumentParser(description='Train and evaluate the perfect suicide detection model')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    train_parser = subparsers.add_parser('train', help='train on the dataset, evaluate and save the model')
+    train_parser.add_argument('--csv', default='Suicide_Detection.csv')
+    train_parser.add_argument('--train-rows', type=int, default=10000)
+    train_parser.add_argument('--test-rows', type=int, default=5000)
+    train_parser.add_argument('--full', action='store_true',
+                              help='train on every row except the last --test-rows, which are held out')
+    train_parser.add_argument('--workers', type=int, default=1,
+                              help='count training rows in this many processes')
+    train_parser.add_argument('--output', default='perfect_model.pkl')
+    train_parser.add_argument('--cache', nargs='?', const='token_cache',
+                              help='read rows from this token cache (default token_cache), updating it from --csv first')
+    
+    eval_parser = subparsers.add_parser('evaluate', help='evaluate a saved model on a slice of the dataset')
+    eval_parser.add_argument('--csv', default='Suicide_Detection.csv')
+    eval_parser.add_argument('--model', default='perfect_model.pkl')
+    eval_parser.add_argument('--skip-rows', type=int, default=10000)
+    eval_parser.add_argument('--test-rows', type=int, default=5000)
+    eval_parser.add_argument('--cache', nargs='?', const='token_cache',
+                             help='read rows from this token cache (default token_cache), updating it from --csv first')
+    
+    compress_parser = subparsers.add_parser('compress', help='prune and quantize a saved model, reporting the accuracy cost')
+    compress_parser.add_argument('--csv', default='Suicide_Detection.csv')
+    compress_parser.add_argument('--model', default='perfect_model.pkl')
+    compress_parser.add_argument('--output', required=True, help='.bin for the binary format, anything else for a pickle')
+    compress_parser.add_argument('--min-count', type=int, default=1, help='drop scores of words seen fewer times')
+    compress_parser.add_argument('--top-k', type=int, help='keep only this many of the strongest scores')
+    compress_parser.add_argument('--epsilon', type=float, default=0.0, help='drop scores this close to zero')
+    compress_parser.add_argument('--quantize', choices=['int8', 'float16', 'float32'])
+    compress_parser.add_argument('--skip-rows', type=int, default=10000)
+    compress_parser.add_argument('--test-rows', type=int, default=5000)
+    
+    args = parser.parse_args()
+    
+    if args.command == 'train':
+        train_rows = None if args.full else args.train_rows
+        if args.cache:
+            model, results = train_from_cache(args.csv, train_rows, args.test_rows, args.cache)
+        else:
+            model, results = train_from_csv(args.csv, train_rows, args.test_rows, args.workers)
+    elif args.command == 'compress':
+        model, results = compress_model(args)
+    elif args.cache:
+        from token_cache import load_token_cache
+        model = load_model(args.model)
+        cache = load_token_cache(args.csv, args.cache)
+        end = min(args.skip_rows + args.test_rows, len(cache))
+        results = evaluate_docs(model, cache.encode_rows(model, range(args.skip_rows, end)),
+                                cache.class_labels(args.skip_rows, end))
     else:
-        total_non_suicide += 1
-        if pred == 'non-suicide':
-            non_suicide_correct += 1
-
-accuracy = (correct / 5000) * 100
-suicide_rate = (suicide_found / total_suicide) * 100 if total_suicide > 0 else 0
-non_suicide_rate = (non_suicide_correct / total_non_suicide) * 100 if total_non_suicide > 0 else 0
-
-print(f"\nPERFECT MODEL RESULTS:")
-print(f"ACCURACY: {accuracy:.1f}%")
-print(f"SUICIDE DETECTION: {suicide_rate:.1f}%")
-print(f"NON-SUICIDE DETECTION: {non_suicide_rate:.1f}%")
-
-with open('perfect_model.pkl', 'wb') as f:
-    pickle.dump(model, f)
-print("Perfect model saved!")
\ No newline at end of file
+        model = load_model(args.model)
+        texts, labels = load_dataset(args.csv, limit=args.skip_rows + args.test_rows)
+        results = evaluate(model, texts[args.skip_rows:], labels[args.skip_rows:])
+    
+    print(f"\nPERFECT MODEL RESULTS:")
+    print(f"ACCURACY: {format_percent(results['accuracy'])}")
+    print(f"SUICIDE DETECTION: {format_percent(results['suicide_detection'])}")
+    print(f"NON-SUICIDE DETECTION: {format_percent(results['non_suicide_detection'])}")
+    
+    if args.command in ('train', 'compress'):
+        save_model(model, args.output)
+        print("Perfect model saved!")
+    if args.command == 'compress':
+        print(f"{args.model}: {os.path.getsize(args.model) / 1e6:.2f} MB -> {args.output}: {os.path.getsize(args.output) / 1e6:.2f} MB")
+
+if __name__ == '__main__':
+    # Go through the importable module so pickles reference
+    # perfect_model.PerfectSuicideDetector rather than __main__
+    import perfect_model
+    perfect_model.main()
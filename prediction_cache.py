@@ -0,0 +1,110 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+def cache_key(tokens, version):
+    """Hash of the normalized token stream and the model version that scores it
+
+    Tokens never contain whitespace, so joining them on spaces is unambiguous;
+    texts that differ only in case, punctuation or spacing share a key.
+    """
+    digest = hashlib.blake2b(str(version).encode('utf-8'), digest_size=16)
+    digest.update(b'\0')
+    digest.update(' '.join(tokens).encode('utf-8'))
+    return digest.digest()
+
+class PredictionCache:
+    """Bounded LRU of (label, confidence) results, optionally expiring after ttl seconds
+
+    Each worker process keeps its own cache. Keys include the model version,
+    so once a retrained model is hot-swapped in, old entries are never hit
+    again and age out of the LRU.
+    """
+
+    def __init__(self, max_entries=50000, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires = entry
+            if expires is not None and expires <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def predict(self, model, text, version):
+        return self.predict_tokens(model, model.preprocess_text(text), version)
+
+    def predict_tokens(self, model, tokens, version):
+        key = cache_key(tokens, version)
+        result = self.get(key)
+        if result is None:
+            result = model.predict_ids(model.encode_tokens(tokens))
+            self.put(key, result)
+        return result
+
+    def predict_batch(self, model, texts, version):
+        """Like model.predict_batch, scoring only the texts that miss in one vectorized pass"""
+        return self.predict_token_batch(model, [model.preprocess_text(text) for text in texts], version)
+
+    def predict_token_batch(self, model, token_lists, version):
+        """predict_batch for texts that are already preprocessed"""
+        results = [None] * len(token_lists)
+        missed = []
+        for i, tokens in enumerate(token_lists):
+            key = cache_key(tokens, version)
+            results[i] = self.get(key)
+            if results[i] is None:
+                missed.append((i, key, tokens))
+
+        if missed:
+            scored = model.predict_docs([model.encode_tokens(tokens) for _, _, tokens in missed])
+            for (i, key, _), result in zip(missed, scored):
+                results[i] = result
+                self.put(key, result)
+        return results
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'pid': os.getpid(),
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
@@ -1,7 +1,9 @@
 from flask import Flask, render_template, request, jsonify
 import os
 import pickle
+import time
 from datetime import datetime
+from metrics import evaluation_stats, serving_stats, worker_metrics
 
 app = Flask(__name__)
 
@@ -26,6 +28,7 @@ class SimpleModel:
 
 # Initialize model
 model = SimpleModel()
+serving_metrics = worker_metrics
 
 @app.route('/')
 def index():
@@ -33,6 +36,7 @@ def index():
 
 @app.route('/predict', methods=['POST'])
 def predict():
+    start = time.perf_counter()
     try:
         data = request.get_json()
         text = data.get('text', '').strip()
@@ -44,6 +48,7 @@ def predict():
             return jsonify({'error': 'Please enter at least 10 characters'})
         
         prediction, confidence = model.predict(text)
+        serving_metrics.observe(time.perf_counter() - start, [prediction])
         confidence_percent = f'{confidence * 100:.1f}%'
         
         if prediction == 'suicide':
@@ -64,6 +69,7 @@ def predict():
         return jsonify(result)
         
     except Exception as e:
+        serving_metrics.observe_error()
         return jsonify({'error': f'Analysis failed: {str(e)}'})
 
 @app.route('/feedback', methods=['POST'])
@@ -72,20 +78,16 @@ def feedback():
 
 @app.route('/stats')
 def get_stats():
-    return jsonify({
-        'overall_accuracy': 84.3,
-        'suicide_detection': 87.8,
-        'non_suicide_detection': 80.9
-    })
+    # The keyword model was never evaluated, so only the serving counters are real
+    stats = evaluation_stats(model)
+    stats['serving'] = serving_stats(serving_metrics.collect())
+    return jsonify(stats)
 
 @app.route('/upload-dataset', methods=['POST'])
 def upload_dataset():
     return jsonify({
-        'success': True,
-        'accuracy': 84.3,
-        'suicide_detection': 87.8,
-        'non_suicide_detection': 80.9,
-        'message': 'Model updated successfully'
+        'success': False,
+        'error': 'The simple app uses a fixed keyword model and cannot retrain; run app.py instead'
     })
 
 if __name__ == '__main__':
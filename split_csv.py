@@ -1,14 +1,121 @@
-import pandas as pd
+import argparse
 import os
+from array import array
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-def split_csv(file_path, chunk_size_mb=20, output_dir="data_chunks"):
+def iter_record_ends(f):
+    """
+    Yields the byte offset just past each CSV record of a binary file object.
+
+    A record ends at a newline outside double quotes, so quoted fields that
+    span several lines stay in one record. Escaped quotes ("") come in pairs
+    and never change the quoting state. Blank lines between records are
+    skipped the way csv readers skip them, so every yielded offset ends a
+    row csv.DictReader returns; the blank bytes go with the next record.
+    """
+    position = f.tell()
+    in_quotes = False
+    for line in f:
+        position += len(line)
+        if not in_quotes and line in (b'\n', b'\r\n'):
+            continue
+        if line.count(b'"') % 2:
+            in_quotes = not in_quotes
+        if not in_quotes:
+            yield position
+
+def scan_records(file_path):
+    """
+    Returns the offset where the data rows start (just past the header)
+    and an array with the end offset of every data row.
+    """
+    with open(file_path, 'rb') as f:
+        ends = iter_record_ends(f)
+        data_start = next(ends, 0)
+        return data_start, array('q', ends)
+
+def chunk_boundaries(data_start, ends, num_chunks):
+    """
+    Picks record boundaries that cut the rows ending at `ends` into at most
+    num_chunks byte ranges of similar size. Returns (start, end) pairs.
+    """
+    if not ends:
+        return []
+    data_end = ends[-1]
+    cuts = [data_start]
+    for i in range(1, num_chunks):
+        target = data_start + (data_end - data_start) * i // num_chunks
+        cut = ends[min(bisect_left(ends, target), len(ends) - 1)]
+        if cut > cuts[-1]:
+            cuts.append(cut)
+    if cuts[-1] != data_end:
+        cuts.append(data_end)
+    return list(zip(cuts, cuts[1:]))
+
+# Bytes read or copied at a time; memory use depends on this, not on the file size
+BLOCK_SIZE = 1024 * 1024
+
+def iter_parts(f, data_start, max_bytes):
+    """
+    Yields (start, end, rows) byte ranges of whole records, reading f from
+    data_start. Each range is as long as possible while header plus range
+    stays within max_bytes; a single record longer than that gets a range
+    of its own.
+    """
+    budget = max_bytes - data_start
+    start = last_end = data_start
+    rows = 0
+    for end in iter_record_ends(f):
+        if rows and end - start > budget:
+            yield start, last_end, rows
+            start, rows = last_end, 0
+        last_end = end
+        rows += 1
+    if rows:
+        yield start, last_end, rows
+
+def _open_part(path, compress):
+    if compress == 'gzip':
+        import gzip
+        return gzip.open(path, 'wb', compresslevel=6)
+    if compress == 'zstd':
+        import zstandard
+        return zstandard.ZstdCompressor().stream_writer(open(path, 'wb'), closefd=True)
+    return open(path, 'wb')
+
+def _write_part(file_path, header, start, end, output_file, compress):
+    """Copies the header and bytes [start, end) of file_path into output_file, a block at a time"""
+    with open(file_path, 'rb') as src, _open_part(output_file, compress) as dst:
+        dst.write(header)
+        src.seek(start)
+        remaining = end - start
+        while remaining:
+            block = src.read(min(BLOCK_SIZE, remaining))
+            if not block:
+                break
+            dst.write(block)
+            remaining -= len(block)
+    return os.path.getsize(output_file)
+
+def split_csv(file_path, chunk_size_mb=20, output_dir="data_chunks", compress=None, workers=1):
     """
     Splits a large CSV file into multiple smaller CSV files.
 
+    The file is streamed in blocks and cut only at record boundaries, so
+    quoted multi-line text fields are never split. Every part repeats the
+    header and, uncompressed, is at most chunk_size_mb (unless a single
+    record is larger). Peak memory does not depend on the file size.
+
     Args:
         file_path (str): Path to the large CSV file.
         chunk_size_mb (int): Maximum size of each output CSV file in MB.
         output_dir (str): Directory to save the smaller CSV files.
+        compress (str): None, 'gzip' or 'zstd' (needs the zstandard package).
+        workers (int): Parts written at the same time while the input is scanned.
+
+    Returns a list of (output_file, rows, bytes_on_disk) tuples.
     """
     if not os.path.exists(output_dir):
         print(f"Creating directory: {output_dir}")
@@ -16,58 +123,55 @@ def split_csv(file_path, chunk_size_mb=20, output_dir="data_chunks"):
     else:
         print(f"Directory already exists: {output_dir}")
 
+    max_bytes = int(chunk_size_mb * 1024 * 1024)
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    suffix = {None: '.csv', 'gzip': '.csv.gz', 'zstd': '.csv.zst'}[compress]
+
     try:
-        df = pd.read_csv(file_path)
+        f = open(file_path, 'rb', buffering=BLOCK_SIZE)
     except FileNotFoundError:
         print(f"Error: The file '{file_path}' was not found.")
-        return
-    except Exception as e:
-        print(f"Error reading CSV file: {e}")
-        return
-    total_rows = len(df)
-    
-    # Estimate rows per chunk. This is an approximation as actual file size depends on data.
-    # We'll aim for slightly less than 25MB to be safe, e.g., 20MB.
-    # This calculation is a heuristic; actual file size will vary.
-    # A more robust solution would involve writing chunks and checking their size.
-    
-    # Let's assume a rough average row size. We'll read a small sample to estimate.
-    sample_df = df.head(1000)
-    sample_file_path = "temp_sample.csv"
-    sample_df.to_csv(sample_file_path, index=False)
-    sample_size_bytes = os.path.getsize(sample_file_path)
-    os.remove(sample_file_path)
-
-    if sample_size_bytes == 0:
-        print("Error: Sample file size is 0. Cannot estimate row size.")
-        return
-
-    avg_row_size_bytes = sample_size_bytes / 1000
-    
-    chunk_size_bytes = chunk_size_mb * 1024 * 1024
-    rows_per_chunk = int(chunk_size_bytes / avg_row_size_bytes)
-    
-    if rows_per_chunk == 0:
-        print("Error: Rows per chunk is 0. Chunk size might be too small or row size too large.")
-        return
-
-    num_chunks = (total_rows + rows_per_chunk - 1) // rows_per_chunk
-
-    print(f"Splitting {file_path} into {num_chunks} chunks of approximately {chunk_size_mb}MB each.")
-    print(f"Estimated rows per chunk: {rows_per_chunk}")
-
-    for i in range(num_chunks):
-        start_row = i * rows_per_chunk
-        end_row = min((i + 1) * rows_per_chunk, total_rows)
-        chunk_df = df.iloc[start_row:end_row]
-        
-        output_file = os.path.join(output_dir, f"Suicide_Detection_part_{i+1}.csv")
-        try:
-            chunk_df.to_csv(output_file, index=False)
-            print(f"Created {output_file} with {len(chunk_df)} rows.")
-        except Exception as e:
-            print(f"Error writing chunk to {output_file}: {e}")
+        return []
+
+    print(f"Splitting {file_path} into parts of at most {chunk_size_mb}MB each.")
+    written = []
+    # Writers copy finished ranges while the scan continues; a bounded
+    # queue keeps at most a few parts in flight
+    with f, ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        header_end = next(iter_record_ends(f), 0)
+        f.seek(0)
+        header = f.read(header_end)
+        if header_end >= max_bytes:
+            print(f"Error: The header alone is larger than {chunk_size_mb}MB.")
+            return []
+
+        pending = deque()
+        for i, (start, end, rows) in enumerate(iter_parts(f, header_end, max_bytes), 1):
+            output_file = os.path.join(output_dir, f"{stem}_part_{i}{suffix}")
+            if header_end + end - start > max_bytes:
+                print(f"Warning: {output_file} holds a single record larger than {chunk_size_mb}MB.")
+            future = pool.submit(_write_part, file_path, header, start, end, output_file, compress)
+            pending.append((output_file, rows, future))
+            while len(pending) > 2 * max(1, workers):
+                written.append(_finish_part(*pending.popleft()))
+        while pending:
+            written.append(_finish_part(*pending.popleft()))
+    return written
+
+def _finish_part(output_file, rows, future):
+    size = future.result()
+    print(f"Created {output_file} with {rows} rows ({size} bytes).")
+    return output_file, rows, size
+
+def main():
+    parser = argparse.ArgumentParser(description='Split a large CSV into parts small enough to commit')
+    parser.add_argument('file', nargs='?', default='Suicide_Detection.csv')
+    parser.add_argument('--chunk-size-mb', type=float, default=20)
+    parser.add_argument('--output-dir', default='data_chunks')
+    parser.add_argument('--compress', choices=['gzip', 'zstd'])
+    parser.add_argument('--workers', type=int, default=1, help='parts written in parallel')
+    args = parser.parse_args()
+    split_csv(args.file, args.chunk_size_mb, args.output_dir, args.compress, args.workers)
 
 if __name__ == "__main__":
-    original_csv_path = "Suicide_Detection.csv"
-    split_csv(original_csv_path)
+    main()
@@ -0,0 +1,247 @@
+"""Sweep the constants classify_totals uses and report the recall trade-offs they give.
+
+    python sweep.py --model perfect_model.pkl
+    python sweep.py --threshold 0.4,0.5,0.55,0.6 --keyword-weight 0,0.03,0.045 --output pareto.csv
+
+A text's label only depends on a handful of per-text sums, so those are
+computed once for the held-out rows (read from the token cache, see
+token_cache.py) and every combination of constants is then scored as numpy
+operations over all rows at once:
+
+    n_words           tokens in the text
+    word_count        tokens with an ML score
+    two_class_sum     summed log-ratio scores of words seen in both classes
+    suicide_only      tokens of words only seen in suicide rows
+    non_suicide_only  tokens of words only seen in non-suicide rows
+    keyword_sum       summed keyword weights
+
+so the ML total for one-class scores a and b is two_class_sum +
+a * suicide_only + b * non_suicide_only. The class boosts are not swept:
+they scale a word's count and its class total by the same factor, so they
+cancel out of every frequency ratio. The 0.70/0.45/0.30 cutoffs only pick
+the confidence, never the label, so they aren't swept either.
+
+The output is the Pareto front of suicide recall against non-suicide
+recall: every combination no other combination beats on both.
+"""
+import argparse
+import csv
+import itertools
+import time
+
+import numpy as np
+
+from perfect_model import PerfectSuicideDetector, load_model
+from token_cache import TOKEN_CACHE_DIR, load_token_cache
+
+# Swept constant -> PerfectSuicideDetector attribute
+PARAMETERS = {
+    'suicide_only_score': 'SUICIDE_ONLY_SCORE',
+    'non_suicide_only_score': 'NON_SUICIDE_ONLY_SCORE',
+    'keyword_weight': 'KEYWORD_WEIGHT',
+    'length_factor_cap': 'LENGTH_FACTOR_CAP',
+    'length_factor_words': 'LENGTH_FACTOR_WORDS',
+    'threshold': 'SUICIDE_THRESHOLD',
+    'keyword_override': 'KEYWORD_OVERRIDE',
+}
+
+DEFAULT_GRID = {
+    'suicide_only_score': [0.6, 1.2, 1.8, 2.4, 3.0],
+    'non_suicide_only_score': [-1.5, -3.0, -4.5, -6.0],
+    'keyword_weight': [0.0, 0.015, 0.03, 0.045, 0.06, 0.09],
+    'length_factor_cap': [0.8, 1.2, 2.0],
+    'length_factor_words': [5, 10, 20],
+    'threshold': [0.45, 0.5, 0.55, 0.6, 0.7],
+    'keyword_override': [10, 20, 30, float('inf')],
+}
+
+# Constants that fix a row's average ML score and length factor
+GROUP_PARAMETERS = ('suicide_only_score', 'non_suicide_only_score', 'length_factor_cap', 'length_factor_words')
+
+# classify_totals calls anything at or above this probability suicide whatever the threshold
+ALWAYS_SUICIDE_PROBABILITY = 0.70
+# Row-by-combination cells evaluated per numpy call
+CHUNK_CELLS = 4_000_000
+
+def is_stored_score(model, value):
+    """Which of the model's ML scores equal value stored the way it stores them (float32, float16 or int8 levels)"""
+    stored = np.asarray(model.ml_scores)
+    if model.ml_scale is not None:
+        return stored == np.round(value / model.ml_scale)
+    return stored == np.asarray(value, dtype=stored.dtype)
+
+def doc_sums(model, docs):
+    """The per-text sums listed in the module docstring, as float64 arrays over docs"""
+    if model.vocab is None:
+        model.compile()
+    scores = model.ml_score_values()
+    present = np.asarray(model.ml_present, dtype=np.bool_)
+    if model.suicide_counts is not None:
+        suicide_only = present & (model.non_suicide_counts == 0)
+        non_suicide_only = present & (model.suicide_counts == 0)
+    else:
+        # Older models without counts: one-class words are the ones with the fixed scores
+        suicide_only = present & is_stored_score(model, model.SUICIDE_ONLY_SCORE)
+        non_suicide_only = present & is_stored_score(model, model.NON_SUICIDE_ONLY_SCORE)
+    two_class = np.where(present & ~suicide_only & ~non_suicide_only, scores, 0.0)
+
+    lengths = np.fromiter((len(ids) for ids in docs), dtype=np.intp, count=len(docs))
+    ids = np.concatenate(docs) if docs else np.zeros(0, dtype=np.intp)
+    doc_ids = np.repeat(np.arange(len(docs)), lengths)
+
+    def per_doc(weights):
+        return np.bincount(doc_ids, weights=weights[ids], minlength=len(docs))
+
+    return {
+        'n_words': lengths.astype(np.float64),
+        'word_count': per_doc(present.astype(np.float64)),
+        'two_class_sum': per_doc(two_class),
+        'suicide_only': per_doc(suicide_only.astype(np.float64)),
+        'non_suicide_only': per_doc(non_suicide_only.astype(np.float64)),
+        'keyword_sum': per_doc(np.asarray(model.keyword_weights, dtype=np.float64)),
+    }
+
+def parameter_grid(grid):
+    """Every combination of the grid's values, one array per parameter"""
+    names = list(PARAMETERS)
+    combos = np.array(list(itertools.product(*(grid[name] for name in names))), dtype=np.float64)
+    return {name: combos[:, i] for i, name in enumerate(names)}
+
+def sweep(sums, actual, params):
+    """True positives and true negatives of every combination in params, against actual (True for suicide)
+
+    Combinations are grouped by the four constants that fix each row's average
+    ML score and length factor, and each group is scored in one broadcast
+    over rows and its keyword weights, thresholds and overrides. The
+    probability cutoff is applied as the equivalent cutoff on the score's
+    logit, which saves an exp per cell.
+    """
+    n_combos = len(params['threshold'])
+    true_pos = np.zeros(n_combos, dtype=np.int64)
+    true_neg = np.zeros(n_combos, dtype=np.int64)
+
+    # Texts without words are always non-suicide; score the rest with suicide rows first
+    has_words = sums['n_words'] > 0
+    true_neg += int((~actual & ~has_words).sum())
+    order = np.concatenate([np.flatnonzero(actual & has_words), np.flatnonzero(~actual & has_words)])
+    n_suicide = int((actual & has_words).sum())
+    n_non_suicide = len(order) - n_suicide
+    rows = {name: values[order] for name, values in sums.items()}
+    scored = rows['word_count'] > 0
+    word_count = np.where(scored, rows['word_count'], 1.0)
+    keyword_sum = rows['keyword_sum']
+
+    threshold = np.minimum(params['threshold'], ALWAYS_SUICIDE_PROBABILITY)
+    with np.errstate(divide='ignore'):
+        cutoff = np.log(threshold) - np.log1p(-threshold)
+
+    group_keys = np.stack([params[name] for name in GROUP_PARAMETERS], axis=1)
+    groups, group_of = np.unique(group_keys, axis=0, return_inverse=True)
+    group_of = group_of.reshape(-1)
+    for g, (suicide_only_score, non_suicide_only_score, cap, words) in enumerate(groups.tolist()):
+        ml_score = rows['two_class_sum'] + suicide_only_score * rows['suicide_only'] \
+            + non_suicide_only_score * rows['non_suicide_only']
+        avg_ml_score = np.where(scored, ml_score / word_count, 0.0)
+        length_factor = np.minimum(cap, rows['n_words'] / words)
+
+        members = np.flatnonzero(group_of == g)
+        step = max(1, CHUNK_CELLS // max(1, len(order)))
+        for start in range(0, len(members), step):
+            combos = members[start:start + step]
+            final_score = (avg_ml_score + keyword_sum * params['keyword_weight'][combos, None]) * length_factor
+            suicide = (final_score >= cutoff[combos, None]) | (keyword_sum > params['keyword_override'][combos, None])
+            true_pos[combos] = suicide[:, :n_suicide].sum(axis=1)
+            true_neg[combos] += n_non_suicide - suicide[:, n_suicide:].sum(axis=1)
+    return true_pos, true_neg
+
+def pareto_front(suicide_recall, non_suicide_recall):
+    """Indices of the combinations no other one beats on both recalls, by falling suicide recall"""
+    order = np.lexsort((-non_suicide_recall, -suicide_recall))
+    front = []
+    best = -1.0
+    for i in order.tolist():
+        if non_suicide_recall[i] > best:
+            front.append(i)
+            best = non_suicide_recall[i]
+    return front
+
+def format_value(value):
+    return 'inf' if value == float('inf') else f'{value:g}'
+
+def main():
+    parser = argparse.ArgumentParser(description='Sweep the scoring constants of a saved model and print the Pareto front')
+    parser.add_argument('--csv', default='Suicide_Detection.csv')
+    parser.add_argument('--cache', default=TOKEN_CACHE_DIR, help='token cache directory, built from --csv if stale')
+    parser.add_argument('--model', default='perfect_model.pkl')
+    parser.add_argument('--skip-rows', type=int, default=10000)
+    parser.add_argument('--test-rows', type=int, default=5000)
+    for name, values in DEFAULT_GRID.items():
+        parser.add_argument('--' + name.replace('_', '-'), default=','.join(format_value(v) for v in values),
+                            help='comma-separated values to try')
+    parser.add_argument('--output', help='also write the Pareto front to this CSV file')
+    args = parser.parse_args()
+
+    model = load_model(args.model)
+    cache = load_token_cache(args.csv, args.cache)
+    rows = np.arange(args.skip_rows, min(args.skip_rows + args.test_rows, len(cache)))
+    actual = np.asarray(cache.labels[rows]) == 1
+
+    start = time.perf_counter()
+    docs = cache.encode_rows(model, rows.tolist())
+    sums = doc_sums(model, docs)
+    precompute_seconds = time.perf_counter() - start
+
+    grid = {name: [float(value) for value in getattr(args, name).split(',')] for name in PARAMETERS}
+    current = {name: float(getattr(model, attribute)) for name, attribute in PARAMETERS.items()}
+    params = parameter_grid(grid)
+    # The model's own constants go last, as a baseline and a check against predict
+    params = {name: np.append(values, current[name]) for name, values in params.items()}
+
+    start = time.perf_counter()
+    true_pos, true_neg = sweep(sums, actual, params)
+    sweep_seconds = time.perf_counter() - start
+
+    n_suicide = max(1, int(actual.sum()))
+    n_non_suicide = max(1, int((~actual).sum()))
+    suicide_recall = true_pos / n_suicide * 100
+    non_suicide_recall = true_neg / n_non_suicide * 100
+    accuracy = (true_pos + true_neg) / max(1, len(actual)) * 100
+
+    n_combos = len(true_pos) - 1
+    print(f"Precomputed sums for {len(rows)} rows in {precompute_seconds:.2f}s; swept {n_combos} combinations "
+          f"in {sweep_seconds:.2f}s ({n_combos / sweep_seconds if sweep_seconds else 0:.0f}/sec)")
+
+    # How many rows the baseline labels like predict does; float sums in another order can flip a borderline row
+    results = model.predict_docs(docs)
+    predicted = np.array([label == 'suicide' for label, _ in results])
+    baseline_pos = int((predicted & actual).sum())
+    baseline_neg = int((~predicted & ~actual).sum())
+    print(f"Current constants: accuracy {accuracy[-1]:.2f}%, suicide {suicide_recall[-1]:.2f}%, "
+          f"non-suicide {non_suicide_recall[-1]:.2f}% (predict: {baseline_pos} / {baseline_neg} correct, "
+          f"sweep: {true_pos[-1]} / {true_neg[-1]})")
+
+    names = list(PARAMETERS)
+    front = pareto_front(suicide_recall, non_suicide_recall)
+    header = ['suicide_recall', 'non_suicide_recall', 'accuracy'] + names
+    table = []
+    for i in front:
+        table.append([f'{suicide_recall[i]:.2f}', f'{non_suicide_recall[i]:.2f}', f'{accuracy[i]:.2f}']
+                     + [format_value(params[name][i]) for name in names])
+
+    print(f"\nPareto front, {len(front)} of {n_combos} combinations:")
+    widths = [max(len(column), *(len(row[j]) for row in table)) for j, column in enumerate(header)]
+    print('  '.join(column.rjust(width) for column, width in zip(header, widths)))
+    for row in table:
+        print('  '.join(value.rjust(width) for value, width in zip(row, widths)))
+    print(f"\nApply a row by setting the matching {PerfectSuicideDetector.__name__} attributes "
+          f"({', '.join(PARAMETERS.values())}); the one-class scores take effect when the model is trained")
+
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(table)
+        print(f"Pareto front written to {args.output}")
+
+if __name__ == '__main__':
+    main()
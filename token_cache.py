@@ -0,0 +1,259 @@
+"""The dataset tokenized once and kept on disk as flat, append-only columns.
+
+    token_cache/
+        meta.json     source CSV and how much of it is cached; written last
+        vocab.txt     one word per line; a word's id is its line number
+        tokens.i32    word ids of every row, back to back
+        offsets.i64   row i's tokens are tokens[offsets[i]:offsets[i + 1]]
+        labels.i8     1 for suicide and 0 for non-suicide
+
+The columns are raw arrays opened with np.memmap, so loading is instant and
+processes working on the same cache share its pages. When rows are
+appended to the CSV only the new rows are tokenized: their tokens, offsets,
+labels and new words are appended to the files and meta.json, which holds
+the lengths readers map, is replaced last. A crash in between leaves
+trailing bytes that the next update cuts off. Any other change to the CSV
+(a different header, or edited bytes before the cached end) rebuilds the
+cache from scratch.
+"""
+import csv
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+from array import array
+from itertools import islice
+
+import numpy as np
+
+from perfect_model import PerfectSuicideDetector, TokenCounts
+from split_csv import iter_parts, iter_record_ends
+
+TOKEN_CACHE_DIR = 'token_cache'
+FORMAT_VERSION = 2
+# Bytes of the CSV parsed at a time while building or updating
+PART_BYTES = 16 * 1024 * 1024
+# Bytes at the end of the cached part hashed to detect edits rather than appends
+TAIL_BYTES = 4096
+# Rows counted per numpy call
+CHUNK_ROWS = 20000
+
+class TokenCache:
+    def __init__(self, directory, words, tokens, offsets, labels, meta):
+        self.directory = directory
+        self.words = words
+        self.tokens = tokens
+        self.offsets = offsets
+        self.labels = labels
+        self.meta = meta
+
+    def __len__(self):
+        return len(self.labels)
+
+    def doc(self, i):
+        return self.tokens[self.offsets[i]:self.offsets[i + 1]]
+
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def id_map(self, model):
+        """Array mapping this cache's word ids to model's vocabulary ids (0 for words it lacks)"""
+        if isinstance(model.vocab, dict) or model.vocab is None:
+            return model.encode_tokens(self.words)
+        return model.vocab.lookup(self.words)
+
+    def encode_rows(self, model, rows):
+        """The given rows as arrays of model vocabulary ids, like model.encode on their texts"""
+        id_map = self.id_map(model)
+        return [id_map[self.doc(i)] for i in rows]
+
+    def class_labels(self, start, end):
+        return ['suicide' if label else 'non-suicide' for label in self.labels[start:end].tolist()]
+
+    def token_counts(self, start, end):
+        """TokenCounts of rows start to end, the same a TokenCounts.add loop over them gives"""
+        n_words = len(self.words)
+        counts = np.zeros(2 * n_words, dtype=np.int64)
+        for chunk_start in range(start, end, CHUNK_ROWS):
+            chunk_end = min(chunk_start + CHUNK_ROWS, end)
+            tokens = self.tokens[self.offsets[chunk_start]:self.offsets[chunk_end]]
+            non_suicide = np.repeat(1 - self.labels[chunk_start:chunk_end].astype(np.int64),
+                                    np.diff(self.offsets[chunk_start:chunk_end + 1]))
+            counts += np.bincount(non_suicide * n_words + tokens, minlength=len(counts))
+        return counts_from_arrays(self.words, counts[:n_words], counts[n_words:], end - start)
+
+def counts_from_arrays(words, suicide, non_suicide, rows):
+    """TokenCounts for per-word count arrays aligned with words"""
+    counts = TokenCounts()
+    for counter, column in ((counts.suicide, suicide), (counts.non_suicide, non_suicide)):
+        present = np.flatnonzero(column)
+        counter.update(dict(zip([words[i] for i in present.tolist()], column[present].tolist())))
+    counts.suicide_total = int(suicide.sum())
+    counts.non_suicide_total = int(non_suicide.sum())
+    counts.rows = rows
+    return counts
+
+def _map(path, dtype, count):
+    if count == 0:
+        # mmap can't map an empty file
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+
+def _digest(path, start, end):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return hashlib.sha1(f.read(end - start)).hexdigest()
+
+def _write_meta(directory, meta):
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(directory, 'meta.json'))
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def _read_meta(directory):
+    with open(os.path.join(directory, 'meta.json')) as f:
+        return json.load(f)
+
+def _iter_range(csv_path, start, end, columns):
+    """Yield (text, label) for the records between two boundaries; label is None without a class column"""
+    with open(csv_path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start).decode('utf-8')
+    for row in csv.DictReader(io.StringIO(data, newline=''), fieldnames=columns):
+        yield row.get('text') or '', row.get('class')
+
+def _append_rows(directory, csv_path, meta):
+    """Tokenize the CSV past meta['size'] onto the cache files in directory; returns the new meta"""
+    paths = {name: os.path.join(directory, name) for name in ('vocab.txt', 'tokens.i32', 'offsets.i64', 'labels.i8')}
+    # Cut off anything a crashed update wrote past what meta.json covers
+    sizes = {'vocab.txt': meta['vocab_bytes'], 'tokens.i32': meta['tokens'] * 4,
+             'offsets.i64': (meta['rows'] + 1) * 8, 'labels.i8': meta['rows']}
+    for name, size in sizes.items():
+        os.truncate(paths[name], size)
+
+    with open(paths['vocab.txt'], encoding='utf-8') as f:
+        words = f.read().split('\n')[:-1]
+    vocab = {word: i for i, word in enumerate(words)}
+    assign = vocab.setdefault
+
+    tokenizer = PerfectSuicideDetector()
+    rows = meta['rows']
+    n_tokens = meta['tokens']
+    vocab_bytes = meta['vocab_bytes']
+    end = meta['size']
+    # Each part's columns are written as soon as it is tokenized, so memory
+    # holds one part's tokens and the vocabulary, not the whole range
+    with open(csv_path, 'rb') as f, open(paths['vocab.txt'], 'ab') as vocab_file, \
+            open(paths['tokens.i32'], 'ab') as tokens_file, open(paths['offsets.i64'], 'ab') as offsets_file, \
+            open(paths['labels.i8'], 'ab') as labels_file:
+        f.seek(end)
+        for part_start, part_end, _ in iter_parts(f, end, end + PART_BYTES):
+            tokens = array('i')
+            offsets = array('q')
+            labels = array('b')
+            known_words = len(vocab)
+            for text, label in _iter_range(csv_path, part_start, part_end, meta['columns']):
+                tokens.extend([assign(word, len(vocab)) for word in tokenizer.preprocess_text(text)])
+                offsets.append(n_tokens + len(tokens))
+                labels.append(1 if label == 'suicide' else 0)
+            new_words = ''.join(word + '\n' for word in islice(vocab, known_words, None)).encode('utf-8')
+
+            vocab_file.write(new_words)
+            tokens_file.write(tokens.tobytes())
+            offsets_file.write(offsets.tobytes())
+            labels_file.write(labels.tobytes())
+            rows += len(labels)
+            n_tokens += len(tokens)
+            vocab_bytes += len(new_words)
+            end = part_end
+
+        for out in (vocab_file, tokens_file, offsets_file, labels_file):
+            out.flush()
+            os.fsync(out.fileno())
+
+    stat = os.stat(csv_path)
+    return dict(meta, size=end, mtime_ns=stat.st_mtime_ns, tail_sha1=_digest(csv_path, max(0, end - TAIL_BYTES), end),
+                rows=rows, tokens=n_tokens, words=len(vocab), vocab_bytes=vocab_bytes)
+
+def build_token_cache(csv_path='Suicide_Detection.csv', directory=TOKEN_CACHE_DIR):
+    """Tokenize every row of csv_path into directory, replacing any older cache there"""
+    with open(csv_path, 'rb') as f:
+        data_start = next(iter_record_ends(f), 0)
+        f.seek(0)
+        header = f.read(data_start)
+    columns = next(csv.reader(io.StringIO(header.decode('utf-8'), newline='')), [])
+    meta = {'format': FORMAT_VERSION, 'source': os.path.abspath(csv_path), 'columns': columns,
+            'data_start': len(header), 'head_sha1': hashlib.sha1(header).hexdigest(),
+            'size': len(header), 'rows': 0, 'tokens': 0, 'words': 0, 'vocab_bytes': 0}
+
+    # Built next to the target and swapped in, so readers never see a partial cache
+    parent = os.path.dirname(os.path.abspath(directory))
+    tmp_dir = tempfile.mkdtemp(dir=parent, prefix='.token_cache-')
+    try:
+        for name in ('vocab.txt', 'tokens.i32', 'labels.i8'):
+            open(os.path.join(tmp_dir, name), 'wb').close()
+        with open(os.path.join(tmp_dir, 'offsets.i64'), 'wb') as f:
+            f.write(np.zeros(1, dtype=np.int64).tobytes())
+        meta = _append_rows(tmp_dir, csv_path, meta)
+        _write_meta(tmp_dir, meta)
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.replace(tmp_dir, directory)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    print(f"Cached {meta['rows']} rows, {meta['tokens']} tokens, {meta['words']} words in {directory}")
+
+def update_token_cache(csv_path='Suicide_Detection.csv', directory=TOKEN_CACHE_DIR):
+    """Append the rows added to csv_path since the cache was written"""
+    before = _read_meta(directory)
+    meta = _append_rows(directory, csv_path, before)
+    _write_meta(directory, meta)
+    print(f"Appended {meta['rows'] - before['rows']} rows, {meta['tokens'] - before['tokens']} tokens, "
+          f"{meta['words'] - before['words']} new words to {directory}")
+
+def cache_state(csv_path, directory=TOKEN_CACHE_DIR):
+    """'fresh', 'appended' (only new rows at the end of the CSV), 'stale' or 'missing'"""
+    try:
+        meta = _read_meta(directory)
+    except (FileNotFoundError, ValueError):
+        return 'missing'
+    if meta.get('format') != FORMAT_VERSION or meta.get('source') != os.path.abspath(csv_path):
+        return 'stale'
+    stat = os.stat(csv_path)
+    if stat.st_size == meta['size'] and stat.st_mtime_ns == meta['mtime_ns']:
+        return 'fresh'
+    if (stat.st_size > meta['size']
+            and _digest(csv_path, 0, meta['data_start']) == meta['head_sha1']
+            and _digest(csv_path, max(0, meta['size'] - TAIL_BYTES), meta['size']) == meta['tail_sha1']):
+        return 'appended'
+    return 'stale'
+
+def open_token_cache(directory=TOKEN_CACHE_DIR):
+    """Map an existing cache without checking its source"""
+    meta = _read_meta(directory)
+    with open(os.path.join(directory, 'vocab.txt'), 'rb') as f:
+        words = f.read(meta['vocab_bytes']).decode('utf-8').split('\n')[:-1]
+    tokens = _map(os.path.join(directory, 'tokens.i32'), np.int32, meta['tokens'])
+    offsets = _map(os.path.join(directory, 'offsets.i64'), np.int64, meta['rows'] + 1)
+    labels = _map(os.path.join(directory, 'labels.i8'), np.int8, meta['rows'])
+    return TokenCache(directory, words, tokens, offsets, labels, meta)
+
+def load_token_cache(csv_path='Suicide_Detection.csv', directory=TOKEN_CACHE_DIR):
+    """The cache of csv_path, tokenizing whatever of the CSV it doesn't cover yet first"""
+    state = cache_state(csv_path, directory)
+    if state == 'appended':
+        update_token_cache(csv_path, directory)
+    elif state != 'fresh':
+        if state == 'stale':
+            print(f"{directory} is out of date with {csv_path}; rebuilding it")
+        build_token_cache(csv_path, directory)
+    return open_token_cache(directory)
@@ -0,0 +1,108 @@
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime
+
+from metrics import SLOW_DURATION_BUCKETS, round_percent, worker_metrics
+from model_store import file_version
+from perfect_model import save_model, train_from_counts, train_from_csv
+
+JOBS_DIR = 'training_jobs'
+
+_JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+def _job_path(job_id):
+    return os.path.join(JOBS_DIR, f'{job_id}.json')
+
+def _write_status(job_id, **fields):
+    """Merge fields into the job's status file, replacing it atomically
+
+    Status lives on disk rather than in memory so that whichever worker
+    receives the status request can answer it.
+    """
+    status = get_job(job_id) or {'id': job_id}
+    status.update(fields)
+    status['updated'] = datetime.now().isoformat()
+    
+    fd, tmp_path = tempfile.mkstemp(dir=JOBS_DIR, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(status, f)
+    os.replace(tmp_path, _job_path(job_id))
+    return status
+
+def get_job(job_id):
+    if not _JOB_ID.match(job_id):
+        return None
+    try:
+        with open(_job_path(job_id), 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def update_job(job_id, **fields):
+    """Record the state of a job before it is started, e.g. an upload still arriving"""
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    return _write_status(job_id, **fields)
+
+def new_job_id():
+    return uuid.uuid4().hex
+
+def start_retraining(csv_path, model_path='perfect_model.pkl', dataset_path='Suicide_Detection.csv',
+                     workers=1, job_id=None):
+    """Retrain from csv_path in a background thread and return the job id
+
+    On success the CSV becomes the new dataset_path and the model is saved
+    atomically to model_path, where every worker's ModelHandle picks it up.
+    """
+    return _start_job(lambda: train_from_csv(csv_path, workers=workers), csv_path, model_path, dataset_path, job_id)
+
+def start_training_from_counts(counts, held_out, csv_path, model_path='perfect_model.pkl',
+                               dataset_path='Suicide_Detection.csv', job_id=None):
+    """Like start_retraining for an upload whose rows were already counted as it streamed in
+
+    Only fitting and evaluating are left to do; csv_path is the saved copy
+    of the upload that becomes the new dataset_path.
+    """
+    return _start_job(lambda: train_from_counts(counts, held_out), csv_path, model_path, dataset_path, job_id)
+
+def _start_job(train, csv_path, model_path, dataset_path, job_id):
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    job_id = job_id or new_job_id()
+    _write_status(job_id, status='queued', created=datetime.now().isoformat())
+    
+    thread = threading.Thread(
+        target=_run_retraining,
+        args=(job_id, train, csv_path, model_path, dataset_path),
+        name=f'retrain-{job_id}',
+        daemon=True,
+    )
+    thread.start()
+    return job_id
+
+def _run_retraining(job_id, train, csv_path, model_path, dataset_path):
+    try:
+        _write_status(job_id, status='running', started=datetime.now().isoformat())
+        start = time.perf_counter()
+        model, results = train()
+        worker_metrics.observe_duration('train', time.perf_counter() - start, bounds=SLOW_DURATION_BUCKETS)
+        save_model(model, model_path)
+        if os.path.abspath(csv_path) != os.path.abspath(dataset_path):
+            os.replace(csv_path, dataset_path)
+        _write_status(
+            job_id,
+            status='done',
+            finished=datetime.now().isoformat(),
+            model_version=file_version(model_path),
+            accuracy=round_percent(results['accuracy']),
+            suicide_detection=round_percent(results['suicide_detection']),
+            non_suicide_detection=round_percent(results['non_suicide_detection']),
+        )
+        print(f"Retraining job {job_id} finished")
+    except Exception as e:
+        traceback.print_exc()
+        _write_status(job_id, status='failed', finished=datetime.now().isoformat(), error=str(e))
@@ -0,0 +1,338 @@
+import csv
+import io
+import os
+import struct
+import zlib
+from collections import deque
+
+from perfect_model import PerfectSuicideDetector, TokenCounts, split_rows
+
+LABELS = ('suicide', 'non-suicide')
+
+# Decompressed output is produced at most this much at a time
+BLOCK_SIZE = 1024 * 1024
+
+class UploadError(Exception):
+    """The uploaded dataset is malformed or too large
+
+    Deliberately not a ValueError: werkzeug's form parser silently drops
+    ValueErrors raised while it streams a file.
+    """
+
+class RecordSplitter:
+    """Cuts a CSV byte stream into whole records as it arrives
+
+    A record ends at a newline outside double quotes, the same rule as
+    split_csv.iter_record_ends; each line is scanned once, however the
+    stream is chunked.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.scanned = 0
+        self.in_quotes = False
+
+    def feed(self, data):
+        """Add data; returns the bytes of every record it completed"""
+        buffer = self.buffer
+        buffer += data
+        record_end = 0
+        position = self.scanned
+        while True:
+            newline = buffer.find(b'\n', position)
+            if newline < 0:
+                break
+            if buffer.count(b'"', position, newline) % 2:
+                self.in_quotes = not self.in_quotes
+            position = newline + 1
+            if not self.in_quotes:
+                record_end = position
+        complete = bytes(buffer[:record_end])
+        del buffer[:record_end]
+        self.scanned = position - record_end
+        return complete
+
+    def finish(self):
+        """The last record, which may lack a trailing newline"""
+        if (self.buffer.count(b'"', self.scanned) % 2) != self.in_quotes:
+            raise UploadError('CSV ends inside a quoted field')
+        rest = bytes(self.buffer)
+        self.buffer.clear()
+        return rest
+
+class ZipMemberStream:
+    """Decompresses the first .csv member of a ZIP archive as the archive streams in
+
+    Local file headers are parsed as they arrive, so nothing is extracted to
+    disk and member names are never used as paths. Members before the CSV
+    are skipped. The CSV's CRC is checked against its header or data
+    descriptor.
+    """
+
+    LOCAL_HEADER = struct.Struct('<4sHHHHHIIIHH')
+
+    def __init__(self, max_bytes, sink):
+        self.max_bytes = max_bytes
+        # Called with each decompressed chunk of the CSV member as soon as it is produced
+        self.sink = sink
+        self.buffer = bytearray()
+        self.state = 'header'
+        self.current = None
+        self.has_descriptor = False
+        self.member = None
+        self.done = False
+
+    def feed(self, data):
+        """Add archive bytes, passing any CSV data they complete to sink"""
+        self.buffer += data
+        while not self.done:
+            if self.state == 'header':
+                if not self._read_header():
+                    break
+            elif self.state == 'skip':
+                if not self._skip():
+                    break
+            elif self.state == 'data':
+                if not self._read_data():
+                    break
+            elif self.state == 'descriptor':
+                if not self._read_descriptor():
+                    break
+
+    def finish(self):
+        if not self.done:
+            if self.member is None:
+                raise UploadError('ZIP file contains no CSV file')
+            raise UploadError('ZIP file is truncated')
+
+    def _read_header(self):
+        size = self.LOCAL_HEADER.size
+        if len(self.buffer) < 4:
+            return False
+        if self.buffer[:4] != b'PK\x03\x04':
+            # Central directory reached without a CSV member
+            raise UploadError('ZIP file contains no CSV file')
+        if len(self.buffer) < size:
+            return False
+        (_, _, flags, method, _, _, crc, compressed_size, _, name_length,
+         extra_length) = self.LOCAL_HEADER.unpack_from(self.buffer)
+        if len(self.buffer) < size + name_length + extra_length:
+            return False
+        name = bytes(self.buffer[size:size + name_length]).decode('utf-8', 'replace')
+        del self.buffer[:size + name_length + extra_length]
+
+        if flags & 0x1:
+            raise UploadError('Encrypted ZIP files are not supported')
+        if method not in (0, 8):
+            raise UploadError(f'Unsupported ZIP compression method {method}')
+        has_descriptor = bool(flags & 0x8)
+        if method == 0 and has_descriptor:
+            raise UploadError('Stored ZIP members without sizes are not supported')
+
+        is_csv = name.endswith('.csv') and not name.startswith('__MACOSX/')
+        self.current = {
+            'name': name,
+            'method': method,
+            'crc': None if has_descriptor else crc,
+            'remaining': None if has_descriptor else compressed_size,
+            'inflate': zlib.decompressobj(-15) if method == 8 else None,
+            'out_crc': 0,
+            'out_bytes': 0,
+        }
+        if is_csv:
+            self.member = name
+            self.state = 'data'
+        else:
+            self.state = 'skip'
+        self.has_descriptor = has_descriptor
+        return True
+
+    def _take(self):
+        """Pops the buffered bytes that belong to the current member"""
+        remaining = self.current['remaining']
+        count = len(self.buffer) if remaining is None else min(remaining, len(self.buffer))
+        data = bytes(self.buffer[:count])
+        del self.buffer[:count]
+        if remaining is not None:
+            self.current['remaining'] -= count
+        return data
+
+    def _member_finished(self, inflate):
+        if self.current['remaining'] is not None:
+            return self.current['remaining'] == 0
+        return inflate.eof
+
+    def _skip(self):
+        inflate = self.current['inflate']
+        if self.current['remaining'] is not None:
+            self._take()
+        else:
+            # No size in the header: inflate (and drop) until the stream ends
+            data = self._take()
+            while data and not inflate.eof:
+                inflate.decompress(data, BLOCK_SIZE)
+                data = inflate.unconsumed_tail
+            self.buffer[:0] = inflate.unused_data
+        if not self._member_finished(inflate):
+            return False
+        self.state = 'descriptor' if self.has_descriptor else 'header'
+        return True
+
+    def _emit(self, chunk):
+        if chunk:
+            self.current['out_crc'] = zlib.crc32(chunk, self.current['out_crc'])
+            self.current['out_bytes'] += len(chunk)
+            if self.current['out_bytes'] > self.max_bytes:
+                raise UploadError(f'Dataset is larger than {self.max_bytes // (1024 * 1024)}MB once extracted')
+            self.sink(chunk)
+
+    def _read_data(self):
+        inflate = self.current['inflate']
+        data = self._take()
+        if inflate is None:
+            self._emit(data)
+        else:
+            # Bounded output per call, so a zip bomb can't balloon memory before the size check
+            while data and not inflate.eof:
+                self._emit(inflate.decompress(data, BLOCK_SIZE))
+                data = inflate.unconsumed_tail
+            if inflate.eof:
+                self.buffer[:0] = inflate.unused_data
+        if not self._member_finished(inflate):
+            return False
+        if self.has_descriptor:
+            self.state = 'descriptor'
+        else:
+            self._check_crc(self.current['crc'])
+        return True
+
+    def _read_descriptor(self):
+        # Optional signature, then CRC-32 and the two sizes (4 or 8 bytes each)
+        if len(self.buffer) < 16:
+            return False
+        offset = 4 if self.buffer[:4] == b'PK\x07\x08' else 0
+        crc = struct.unpack_from('<I', self.buffer, offset)[0]
+        if self.current['name'] == self.member:
+            self._check_crc(crc)
+            return True
+        # Skipped member: drop the descriptor up to the next local header
+        next_header = self.buffer.find(b'PK\x03\x04', offset + 4)
+        if next_header < 0:
+            next_header = self.buffer.find(b'PK\x01\x02', offset + 4)
+        if next_header < 0:
+            return False
+        del self.buffer[:next_header]
+        self.state = 'header'
+        return True
+
+    def _check_crc(self, crc):
+        if self.current['out_crc'] != crc:
+            raise UploadError(f"ZIP member {self.member} is corrupt (CRC mismatch)")
+        self.done = True
+
+class UploadIngest:
+    """Writable sink for one uploaded dataset that trains on it while it arrives
+
+    werkzeug writes each chunk of the file part into write(). The bytes are
+    unzipped if needed and saved to csv_path, and every completed record
+    is validated and counted right away, split the way train_from_csv
+    splits (see split_rows): the first train_rows rows are counted and the
+    next test_rows are held out for evaluation, fewer for small uploads. A
+    row is counted once enough rows came after it that it can't be held
+    out any more. When the upload ends only fitting is left.
+    """
+
+    def __init__(self, csv_path, is_zip, max_bytes, train_rows=10000, test_rows=5000,
+                 job_id=None, progress=None, progress_bytes=4 * 1024 * 1024):
+        self.csv_path = csv_path
+        self.job_id = job_id
+        self.max_bytes = max_bytes
+        self.train_rows = train_rows
+        self.test_rows = test_rows
+        self.progress = progress
+        self.progress_bytes = progress_bytes
+        self.zip = ZipMemberStream(max_bytes, self._accept) if is_zip else None
+        self.splitter = RecordSplitter()
+        self.tokenizer = PerfectSuicideDetector()
+        self.counts = TokenCounts()
+        # Rows after the ones counted so far that may still be held out
+        self.held_out = deque()
+        self.columns = None
+        self.rows = 0
+        self.bytes_received = 0
+        self.csv_bytes = 0
+        self._next_progress = progress_bytes
+        self._file = open(csv_path, 'wb')
+
+    def write(self, data):
+        self.bytes_received += len(data)
+        if self.zip is not None:
+            self.zip.feed(data)
+        else:
+            self._accept(data)
+        if self.progress is not None and self.bytes_received >= self._next_progress:
+            self._next_progress += self.progress_bytes
+            self.progress(status='uploading', bytes_received=self.bytes_received, rows_received=self.rows)
+        return len(data)
+
+    def _accept(self, chunk):
+        self.csv_bytes += len(chunk)
+        if self.csv_bytes > self.max_bytes:
+            raise UploadError(f'Dataset is larger than {self.max_bytes // (1024 * 1024)}MB')
+        self._file.write(chunk)
+        records = self.splitter.feed(chunk)
+        if records:
+            self._parse(records)
+
+    def _parse(self, records):
+        try:
+            text = records.decode('utf-8')
+        except UnicodeDecodeError:
+            raise UploadError(f'Dataset is not valid UTF-8 (after row {self.rows})')
+        reader = csv.reader(io.StringIO(text, newline=''))
+        if self.columns is None:
+            header = next(reader, None)
+            if header is None:
+                return
+            if 'text' not in header or 'class' not in header:
+                raise UploadError("CSV must have 'text' and 'class' columns")
+            self.columns = (header.index('text'), header.index('class'), len(header))
+        text_index, class_index, width = self.columns
+
+        for row in reader:
+            if not row:
+                continue
+            if len(row) != width or row[class_index] not in LABELS:
+                raise UploadError(f"Row {self.rows + 1}: expected {width} columns with class 'suicide' or 'non-suicide'")
+            self.rows += 1
+            if self.rows <= self.train_rows + self.test_rows:
+                self.held_out.append((row[text_index], row[class_index]))
+        # The training part only grows as rows arrive, so these rows are settled
+        train_rows, _ = split_rows(self.rows, self.train_rows, self.test_rows)
+        while self.counts.rows < train_rows:
+            text, label = self.held_out.popleft()
+            self.counts.add(self.tokenizer.preprocess_text(text), label)
+
+    def finish(self):
+        """Checks the upload was complete and returns (counts, held_out)"""
+        if self.zip is not None:
+            self.zip.finish()
+        self._parse(self.splitter.finish())
+        self._file.close()
+        if self.columns is None or self.counts.rows == 0:
+            raise UploadError('Dataset has no rows')
+        return self.counts, list(self.held_out)
+
+    def abort(self):
+        """Drops the partial copy of a failed upload"""
+        self._file.close()
+        if os.path.exists(self.csv_path):
+            os.remove(self.csv_path)
+
+    # werkzeug treats the sink as a file: it rewinds it when the part ends
+    # and closes it when the request is torn down
+    def seek(self, offset, whence=0):
+        return 0
+
+    def close(self):
+        self._file.close()